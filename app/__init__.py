@@ -17,6 +17,10 @@ from flask_whooshee import Whooshee
 from flask_login import LoginManager
 from flask_session import Session
 from app.debugging import mail_logger, logging_to_file
+from app.oembed import init_oembed
+from app.renderer import init_renderer
+from app.memo import init_memo
+from app.page_cache import init_page_cache
 
 
 db = SQLAlchemy()
@@ -54,6 +58,10 @@ def create_app(config_class=Config):
     whooshee.init_app(blog)
     login.init_app(blog)
     sess.init_app(blog)
+    init_oembed(blog)
+    init_renderer(blog)
+    init_memo(blog)
+    init_page_cache(blog)
 
     # Non logged in users trying to reach page protected by @login_required
     # will be redirected to the 'login' page.
@@ -83,6 +91,9 @@ def create_app(config_class=Config):
     blog.register_blueprint(content_widgets_bp,
                             url_prefix=config_class.URL_PREFIX)
 
+    from app.commands import register_commands
+    register_commands(blog)
+
     mail_logger(blog)
     logging_to_file(blog)
 
@@ -6,7 +6,7 @@ from werkzeug.urls import url_parse
 from app.auth.forms import LoginForm, RegistrationForm
 from app.auth import bp
 from flask_login import current_user, login_user, login_required, logout_user
-from app.models import User
+from app.models import User, cached_admin
 from app import db
 
 
@@ -15,7 +15,7 @@ def register():
     """The route a user go to register as the blog admin.
     """
     title = 'Register'
-    if User.query.first():
+    if cached_admin():
         flash("Someone has already registered as the owner of this blog and as"
               " a result no more registration are accepted.", 'info')
         return redirect(url_for('main.index'))
@@ -38,13 +38,15 @@ def login():
     if current_user.is_authenticated:
         flash('You are already logged in.', 'info')
         return redirect(url_for('main.index'))
-    user = User.query.first()
+    user = cached_admin()
     if not user:
         flash('You need to register before using the functionality of '
               'this blog.', 'warning')
         return redirect(url_for('auth.register'))
     form = LoginForm()
     if form.validate_on_submit():
+        # The password is checked against the database, not the cache.
+        user = cached_admin(reload=True)
         if user.check_password(form.pass_field.data):
             login_user(user, remember=form.remember_me.data)
             # or request.form.get('next')
@@ -1,37 +1,59 @@
-from flask import render_template, request, url_for, current_app, abort
+from flask import current_app, render_template, abort, url_for
+from sqlalchemy.orm import selectinload
 from app.categories import bp
-from app.models import Category, Post, CategoriesControls
+from app.feeds import feed_response
+from app.page_cache import cached_page
+from app.pagination import paginate_listing
+from app.models import Category, Post
+from app.controls.template_helpers import categories_presence
+
+
+def category_listing(slug):
+    """Finds the posts listed under a category.
+
+    Parameters
+    ----------
+    slug : str
+        Slug of the category, or ``uncategorized``.
+
+    Returns
+    -------
+    tuple
+        The name of the category and the query of its published posts.
+    """
+    if categories_presence() == 'no_categories':
+        abort(404)
+    if slug == 'uncategorized':
+        return slug, Post.query.filter_by(categories=None, is_published=True,
+                                          is_page=False)
+    c = Category.query.filter_by(slug=slug).first_or_404()
+    return c.name, (Post.query.join(Category.posts)
+                    .filter(Category.id == c.id, Post.is_published == True))
 
 
 @bp.route('/<slug>/category')
+@cached_page('category:{slug}')
 def index(slug):
     """The route a user go to see all blog entries posted under a certain
     category.
     """
-    if CategoriesControls.query.filter_by(presence='no_categories').first():
-        abort(404)
-    page = request.args.get('page', 1, type=int)
-    if slug == 'uncategorized':
-        category_slug = slug
-        title = "Category: uncategorized"
-        posts = (Post.query
-                 .filter_by(categories=None, is_published=True, is_page=False)
-                 .order_by(Post.timestamp.desc())
-                 .paginate(page, current_app.config['POSTS_PER_PAGE'], False))
-    else:
-        c = Category.query.filter_by(slug=slug).first_or_404()
-        category_slug = c.slug
-        title = f"Category: {c.name}"
-        posts = (Post.query.join(Category.posts)
-                 .filter(Category.id == c.id, Post.is_published == True)
-                 .order_by(Post.timestamp.desc())
-                 .paginate(page, current_app.config['POSTS_PER_PAGE'], False))
-    next_url = url_for('categories.index', slug=slug,
-                       page=posts.next_num) if posts.has_next else None
-    prev_url = url_for('categories.index', slug=slug,
-                       page=posts.prev_num) if posts.has_prev else None
-    return render_template('index.html', posts=posts.items, title=title,
+    name, query = category_listing(slug)
+    title = f"Category: {name}"
+    posts, next_url, prev_url = paginate_listing(
+        query.options(selectinload(Post.category_list)), 'categories.index',
+        slug=slug)
+    return render_template('index.html', posts=posts, title=title,
                            next_url=next_url, prev_url=prev_url,
-                           category_slug=category_slug)
+                           category_slug=slug)
 
 
+@bp.route('/<slug>/category/feed')
+@cached_page('category:{slug}', layout=False)
+def feed(slug):
+    """Atom feed of the latest posts of a category.
+    """
+    name, query = category_listing(slug)
+    return feed_response(query,
+                         f"{current_app.config['SITE_NAME']} - {name}",
+                         url_for('categories.index', slug=slug,
+                                 _external=True))
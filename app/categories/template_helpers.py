@@ -1,25 +1,30 @@
 """Integrates global functions for use in our templates.
 """
+from app import db
 from app.categories import bp
+from app.memo import version_cached
 from app.models import Category, Post
 
 
 @bp.app_template_global()
+@version_cached('posts')
 def categories_w_post_count():
     """Tells us how many blog entries were posted under each category.
 
+    Counts are read from the counter maintained on each category and are
+    kept in memory until a post or a category is written.
+
     return
     ------
     dic : dictionary
         Contains categories names along with their post count.
     """
     dic = {}
-    categories = Category.query.all()
-    for c in categories:
-        posts = (Post.query.join(Category.posts)
-                 .filter(Category.id == c.id, Post.is_published == True).all())
-        if posts:
-            dic[c.name] = (c.slug, len(posts))
+    counts = (db.session.query(Category.name, Category.slug,
+                               Category.published_post_count)
+              .filter(Category.published_post_count > 0))
+    for name, slug, count in counts:
+        dic[name] = (slug, count)
     post_count = Post.query.filter_by(categories=None, is_published=True,
                                       is_page=False).count()
     if post_count > 0:
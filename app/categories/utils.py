@@ -39,8 +39,12 @@ def set_categories(fields):
 
 def del_unused_categories():
     """Will delete from the db all the category names not attached to a post.
+
+    Only the categories without published posts, according to their
+    counter, need to be checked for drafts still using them.
     """
-    Category.query.filter_by(posts=None).delete(synchronize_session=False)
+    (Category.query.filter_by(published_post_count=0, posts=None)
+     .delete(synchronize_session=False))
     db.session.commit()
 
 
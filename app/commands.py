@@ -0,0 +1,87 @@
+"""Commands added to the ``flask`` command line interface.
+
+Example, to bring the schema of a database created by an older version of
+the app up to date, once per deploy:
+
+flask upgrade-schema
+
+Or to recompute the counters of the categories:
+
+flask repair-counters
+
+Or to export the blog to static files:
+
+flask export-static /srv/flaskypress
+
+Or to render again the html of every entry after upgrading Markdown:
+
+flask rerender
+"""
+import os
+import click
+from app import db
+from app.models import update_published_post_counts
+
+
+def register_commands(app):
+    """Attaches our commands to the application.
+
+    Parameters
+    ----------
+    app : Flask
+        The application object.
+    """
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """Add the missing columns and indexes to the database."""
+        # Imported here since it needs the models of the app.
+        from app.schema import upgrade_schema
+        db.create_all()
+        upgrade_schema()
+        click.echo('Schema of the database is up to date.')
+
+    @app.cli.command('repair-counters')
+    def repair_counters():
+        """Recompute the number of published posts of every category."""
+        update_published_post_counts()
+        db.session.commit()
+        click.echo('Post counts of the categories were recomputed.')
+
+    @app.cli.command('export-static')
+    @click.argument('directory')
+    @click.option('--post', 'slugs', multiple=True,
+                  help='Slug of a modified post. Only the pages showing it '
+                       'are exported again. Can be repeated.')
+    @click.option('--workers', type=int, default=os.cpu_count(),
+                  help='Number of processes rendering the pages.')
+    @click.option('--base-url', default='http://localhost/',
+                  help='Scheme and host of the site, used by the sitemap.')
+    def export_static(directory, slugs, workers, base_url):
+        """Export the public pages of the blog to DIRECTORY."""
+        # Imported here since it needs the models of the app.
+        from app.export import export_site
+        full, written = export_site(directory, slugs=list(slugs) or None,
+                                    workers=workers, base_url=base_url)
+        kind = 'Whole blog' if full else 'Modified posts'
+        click.echo(f'{kind} exported, {len(written)} files written.')
+
+    @app.cli.command('rerender')
+    @click.option('--all', 'force', is_flag=True,
+                  help='Render every entry, not only the stale ones.')
+    @click.option('--workers', type=int, default=os.cpu_count(),
+                  help='Number of processes rendering the entries.')
+    @click.option('--batch-size', type=int, default=100,
+                  help='Number of entries rendered and written at once.')
+    def rerender(force, workers, batch_size):
+        """Render again the stale html of the posts, pages and widgets.
+
+        An interrupted run is resumed by running the same command again.
+        """
+        # Imported here since it needs the models of the app.
+        from app.rerender import pending_count, rerender_all
+        total = pending_count(force=force)
+        with click.progressbar(length=total, label='Rendering') as bar:
+            counts = rerender_all(workers=workers, batch_size=batch_size,
+                                  force=force, progress=bar.update)
+        click.echo(f"{counts['post']} posts and pages, {counts['widget']} "
+                   f"content widgets rendered.")
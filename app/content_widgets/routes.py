@@ -38,6 +38,7 @@ def create():
                            is_published=form.publish.data
                            )
         cw.slugify_title()
+        cw.refresh_html()
         try:
             db.session.add(cw)
             db.session.commit()
@@ -76,6 +77,7 @@ def edit(slug):
         cw.is_published = form.publish.data
         cw.is_page = True
         cw.slugify_title()
+        cw.refresh_html()
         try:
             db.session.commit()
         except exc.IntegrityError:
@@ -1,10 +1,14 @@
 """Integrates global functions and filters for use in our templates.
 """
+from flask import Markup, render_template
 from app.content_widgets import bp
+from app.controls.template_helpers import ordered_widgets
+from app.memo import request_memoized, version_cached
 from app.models import ContentWidget
 
 
 @bp.app_template_global()
+@request_memoized
 def content_widget_exists():
     """Used to verify if any sidebar content widget exists in our db.
     """
@@ -23,6 +27,34 @@ def get_content_widget(widget_title):
     return ContentWidget.query.filter_by(title=widget_title).first()
 
 
+@bp.app_template_global()
+@request_memoized
+def sidebar_content_widgets():
+    """Get the html of all the published content widgets placed in the
+    sidebar with a single query.
+
+    return
+    ------
+    widgets : dictionary
+        Contains the pre-rendered html of the widgets keyed by their title.
+    """
+    query = ContentWidget.query.filter(
+        ContentWidget.title.in_(ordered_widgets()),
+        ContentWidget.is_published == True)
+    return {cw.title: cw.html_content for cw in query}
 
 
+@bp.app_template_global()
+@version_cached('settings', 'posts', 'widgets')
+def sidebar_html():
+    """Renders the sidebar.
 
+    The html is kept in memory until the widgets, their order or the posts
+    counted by the categories widget change.
+
+    return
+    ------
+    Markup
+        Html of all the widgets placed in the sidebar.
+    """
+    return Markup(render_template('sidebar.html'))
@@ -91,8 +91,8 @@ def position_choices():
         This list is made of tuples each containing a (value/label) pair.
     """
     choices = []
-    for wo in WidgetOrder.query.all():
-        choices.append((wo.position, wo.position))
+    for wo in WidgetOrder.query.order_by(WidgetOrder.position):
+        choices.append((wo.position, str(wo.position)))
     return choices
 
 
@@ -132,7 +132,7 @@ def widgets_order_form():
 
     for wo in WidgetOrder.query.all():
         slug = slugify(wo.name, lowercase=True, separator="_")
-        sf = SelectField(wo.name, choices=position_choices(),
+        sf = SelectField(wo.name, choices=position_choices(), coerce=int,
                          validators=[prevent_identical],
                          render_kw={'class': 'form-control'})
         setattr(Form, slug, sf)
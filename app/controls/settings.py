@@ -0,0 +1,66 @@
+"""Keeps in memory a snapshot of the settings configured at ``/controls``.
+
+The settings are read on every page but change only when the admin submits
+one of the forms of the ``controls`` blueprint or edits a content widget.
+Each process keeps a snapshot of them and reloads it only when the
+``settings`` version stored in the database has changed, which happens every
+time one of the underlying models is written (see ``app.models``). This way
+every worker process sees the changes made by the others.
+"""
+from collections import namedtuple
+from flask import current_app
+from app import db
+from app.memo import request_memoized
+from app.models import (SearchBarControls, CategoriesControls, Social,
+                        WidgetOrder, get_version)
+
+SiteSettings = namedtuple('SiteSettings', ['version', 'search_bar_placement',
+                                           'categories_presence', 'socials',
+                                           'widgets'])
+
+
+def load_site_settings(version):
+    """Read the settings from the db.
+
+    parameter
+    ---------
+    version : int
+        Version of the settings at the moment they are read.
+
+    return
+    ------
+    SiteSettings
+        ``socials`` maps the names of the services to their addresses and
+        ``widgets`` holds the names of the sidebar widgets, ordered by
+        position.
+    """
+    sbc = SearchBarControls.query.first()
+    cc = CategoriesControls.query.first()
+    socials = {s.name: s.address for s in Social.query.all()}
+    widgets = (db.session.query(WidgetOrder.name)
+               .order_by(WidgetOrder.position))
+    return SiteSettings(version=version,
+                        search_bar_placement=sbc.placement if sbc else None,
+                        categories_presence=cc.presence if cc else None,
+                        socials=socials,
+                        widgets=tuple(name for name, in widgets))
+
+
+@request_memoized
+def site_settings():
+    """Get the settings snapshot of the application, reloading it first if it
+    is outdated.
+
+    The version is checked once per request.
+
+    return
+    ------
+    SiteSettings
+        See ``load_site_settings``.
+    """
+    version = get_version('settings')
+    snapshot = current_app.extensions.get('site_settings')
+    if snapshot is None or snapshot.version != version:
+        snapshot = load_site_settings(version)
+        current_app.extensions['site_settings'] = snapshot
+    return snapshot
@@ -2,34 +2,32 @@
 """
 
 from app.controls import bp
-from app.models import (SearchBarControls, CategoriesControls,
-                        WidgetOrder)
+from app.controls.settings import site_settings
 
 
 @bp.app_template_global()
 def search_bar_placement():
-    """Query the actual search bar placement from the db.
+    """Get the actual search bar placement from the settings snapshot.
 
     return
     ------
-    sbc.placement : str
+    str
         Name the choice of placement.
     """
-    sbc = SearchBarControls.query.first()
-    return sbc.placement
+    return site_settings().search_bar_placement
 
 
 @bp.app_template_global()
 def categories_presence():
-    """Query from the db where in the layout the categories are displayed.
+    """Get from the settings snapshot where in the layout the categories are
+    displayed.
 
     return
     ------
-    cc.presence : str
+    str
         Name where the categories should be displayed.
     """
-    cc = CategoriesControls.query.first()
-    return cc.presence
+    return site_settings().categories_presence
 
 
 @bp.app_template_global()
@@ -38,10 +36,10 @@ def sidebar_widget_count():
 
     return
     ------
-    WidgetOrder.query.count() : int
+    int
         Number representing the qty of widgets assigned to the sidebar.
     """
-    return WidgetOrder.query.count()
+    return len(site_settings().widgets)
 
 
 @bp.app_template_global()
@@ -57,15 +55,6 @@ def ordered_widgets():
         Contains names of the widgets assigned to the sidebar and ordered
         according to our need.
     """
-    wo = WidgetOrder.query
-    widgets_count = wo.count()
-    widgets = []
-    num = 0
-    for i in range(widgets_count):
-        num += 1
-        for w in wo.all():
-            if w.position == str(num):
-                widgets.append(w.name)
-    return widgets
+    return list(site_settings().widgets)
 
 
@@ -0,0 +1,332 @@
+"""Exports the public pages of the blog to a directory of static files.
+
+Every published post and page, the listings of the categories, the
+paginated index and the sitemap are rendered, as an anonymous visitor would
+see them, and written under the directory. The URLs are mapped to files like
+this:
+
+- ``/`` and ``/index``: ``index.html``
+- ``/<slug>``: ``<slug>.html``
+- ``/<slug>/category``: ``<slug>/category.html``
+- ``?page=N``: ``<path>/page/N.html``
+- ``/sitemap.xml``: ``sitemap.xml``, and its chunks ``sitemap-N.xml`` when
+  it is a sitemap index
+
+The ``URL_PREFIX`` is not part of the paths, so nginx can serve the directory
+at the same location the app was using. For instance::
+
+    location /subfolder/ {
+        alias /srv/flaskypress/;
+        if ($arg_page) {
+            rewrite ^(.*?)/?$ $1/page/$arg_page.html? last;
+        }
+        try_files $uri $uri.html $uri/index.html =404;
+    }
+
+The posts found at the time of the export are recorded in a manifest kept in
+the directory. It allows to only render again the pages showing a given post
+(see ``export_site``).
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+import shutil
+from urllib.parse import parse_qs, urlsplit
+from flask import current_app, url_for
+from app import db, create_app
+from app.models import Category, Post
+from app.controls.template_helpers import categories_presence
+
+MANIFEST = '.export.json'
+
+# Test client of the worker processes, created once per process.
+_worker_client = None
+
+
+def export_path(url, prefix=''):
+    """Path of the file, relative to the export directory, serving an URL.
+
+    Parameters
+    ----------
+    url : str
+        Path of the URL, its query string included.
+    prefix : str
+        The ``URL_PREFIX`` of the app, removed from the path.
+    """
+    parts = urlsplit(url)
+    path = parts.path
+    if prefix and path.startswith(prefix):
+        path = path[len(prefix):]
+    path = path.strip('/') or 'index'
+    page = parse_qs(parts.query).get('page')
+    if page:
+        path = f'{path}/page/{page[0]}'
+    if not path.endswith(('.xml', '.xml.gz')):
+        path += '.html'
+    return path
+
+
+def published_state():
+    """Describes the published posts and pages.
+
+    Returns
+    -------
+    dict
+        Maps each slug to a list. For pages it holds their title, shown in the
+        navbar of every page. For posts it holds the slugs of their
+        categories, ``uncategorized`` if they have none.
+    """
+    state = {}
+    rows = (db.session.query(Post.slug, Post.is_page, Post.title)
+            .filter_by(is_published=True))
+    for slug, is_page, title in rows:
+        state[slug] = ['page', title] if is_page else ['post']
+    rows = (db.session.query(Post.slug, Category.slug)
+            .join(Post.categories)
+            .filter(Post.is_published == True, Post.is_page == False)
+            .order_by(Category.slug))
+    for post_slug, category_slug in rows:
+        state[post_slug].append(category_slug)
+    for value in state.values():
+        if value == ['post']:
+            value.append('uncategorized')
+    return state
+
+
+def listing_urls(endpoint, count, **values):
+    """URLs of every page of a paginated listing.
+
+    Parameters
+    ----------
+    endpoint : str
+        Endpoint of the listing.
+    count : int
+        Number of posts in the listing.
+    values :
+        Arguments of the endpoint.
+    """
+    pages = max(1, math.ceil(count / current_app.config['POSTS_PER_PAGE']))
+    urls = [url_for(endpoint, **values)]
+    urls.extend(url_for(endpoint, page=n, **values)
+                for n in range(1, pages + 1))
+    return urls
+
+
+def category_urls(slugs=None):
+    """URLs of the listings of the categories.
+
+    Parameters
+    ----------
+    slugs : list
+        Slugs of the categories. All of them when ``None``.
+    """
+    if categories_presence() == 'no_categories':
+        return []
+    counts = dict(db.session.query(Category.slug,
+                                   Category.published_post_count)
+                  .filter(Category.published_post_count > 0))
+    counts['uncategorized'] = (Post.query
+                               .filter_by(categories=None, is_published=True,
+                                          is_page=False)
+                               .count())
+    if slugs is None:
+        slugs = counts
+    urls = []
+    for slug in slugs:
+        if counts.get(slug):
+            urls.extend(listing_urls('categories.index', counts[slug],
+                                     slug=slug))
+    return urls
+
+
+def index_urls(state):
+    """URLs of the home page, every page of the index and the sitemap.
+
+    Parameters
+    ----------
+    state : dict
+        See ``published_state``.
+    """
+    prefix = current_app.config['URL_PREFIX']
+    posts = sum(1 for value in state.values() if value[0] == 'post')
+    urls = [f'{prefix}/', f'{prefix}/sitemap.xml']
+    chunks = math.ceil(len(state) / current_app.config['SITEMAP_CHUNK_SIZE'])
+    if chunks > 1:
+        extension = 'xml.gz' if current_app.config['SITEMAP_GZIP'] else 'xml'
+        urls.extend(f'{prefix}/sitemap-{n}.{extension}'
+                    for n in range(1, chunks + 1))
+    return urls + listing_urls('main.index', posts)
+
+
+def site_urls(state):
+    """URLs of every page of the export.
+
+    Parameters
+    ----------
+    state : dict
+        See ``published_state``.
+    """
+    urls = index_urls(state)
+    urls.extend(url_for('main.detail', slug=slug) for slug in state)
+    urls.extend(category_urls())
+    return urls
+
+
+def post_urls(slug, state):
+    """URLs of the pages showing a post or a page.
+
+    Parameters
+    ----------
+    slug : str
+        Slug of the post.
+    state : dict
+        See ``published_state``.
+    """
+    urls = [url_for('main.detail', slug=slug)]
+    if state[slug][0] == 'post':
+        urls.extend(index_urls(state))
+        urls.extend(category_urls(state[slug][1:]))
+    else:
+        urls.append(f"{current_app.config['URL_PREFIX']}/sitemap.xml")
+    return urls
+
+
+def render_urls(client, directory, urls, base_url):
+    """Requests some URLs and writes the responses to the export directory.
+
+    Parameters
+    ----------
+    client : FlaskClient
+        Test client of the app.
+    directory : str
+        The export directory.
+    urls : list
+        The URLs to render.
+    base_url : str
+        Scheme and host the pages are rendered for, used by the sitemap.
+
+    Returns
+    -------
+    list
+        Paths of the written files, relative to the directory.
+    """
+    prefix = client.application.config['URL_PREFIX']
+    written = []
+    for url in urls:
+        response = client.get(url, base_url=base_url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned the status code '
+                               f'{response.status_code}.')
+        path = export_path(url, prefix)
+        full_path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(response.get_data())
+        written.append(path)
+    return written
+
+
+def _init_worker(config):
+    """Creates the app used by a worker process.
+
+    Each process needs its own connections to the database.
+    """
+    global _worker_client
+    _worker_client = create_app(type('ExportConfig', (), config)).test_client()
+
+
+def _render_in_worker(directory, urls, base_url):
+    return render_urls(_worker_client, directory, urls, base_url)
+
+
+def render_all(directory, urls, workers, base_url):
+    """Renders the URLs, dividing them between worker processes.
+
+    With a single worker, the pages are rendered by the current process.
+    Otherwise the database must be one the worker processes can connect to,
+    not an in-memory SQLite database.
+    """
+    if workers <= 1:
+        return render_urls(current_app.test_client(), directory, urls,
+                           base_url)
+    chunks = [urls[i::workers * 4] for i in range(workers * 4)]
+    written = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dict(current_app.config),)) as pool:
+        futures = [pool.submit(_render_in_worker, directory, chunk, base_url)
+                   for chunk in chunks if chunk]
+        for future in futures:
+            written.extend(future.result())
+    return written
+
+
+def read_manifest(directory):
+    """Returns the manifest of a previous export, or ``None``.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_site(directory, slugs=None, workers=1,
+                base_url='http://localhost/'):
+    """Exports the blog, or only the pages showing some posts, to a
+    directory.
+
+    Only the pages of the given posts are rendered again when the previous
+    export recorded them with the same published state, categories and page
+    title. Otherwise the change affects the sidebar or the navbar of every
+    page and the whole blog is exported. Changes to anything else than the
+    given posts, like the settings or the content widgets, need a full
+    export.
+
+    Parameters
+    ----------
+    directory : str
+        Where the files are written. Created if missing.
+    slugs : list
+        Slugs of the modified posts. The whole blog is exported when
+        ``None``.
+    workers : int
+        Number of processes rendering the pages.
+    base_url : str
+        Scheme and host of the site, used by the sitemap.
+
+    Returns
+    -------
+    tuple
+        Whether the whole blog was exported and the paths of the written
+        files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    state = published_state()
+    manifest = read_manifest(directory)
+    full = (slugs is None or manifest is None or
+            any(manifest['posts'].get(s) != state.get(s) for s in slugs))
+    # url_for needs a request context to build the URLs.
+    with current_app.test_request_context(base_url=base_url):
+        if full:
+            urls = site_urls(state)
+        else:
+            urls = [url for slug in slugs if slug in state
+                    for url in post_urls(slug, state)]
+    written = render_all(directory, list(dict.fromkeys(urls)), workers,
+                         base_url)
+    files = set(written)
+    if full:
+        static_dir = os.path.join(directory, 'static')
+        shutil.rmtree(static_dir, ignore_errors=True)
+        shutil.copytree(current_app.static_folder, static_dir)
+        for path in set(manifest['files'] if manifest else []) - files:
+            try:
+                os.remove(os.path.join(directory, path))
+            except FileNotFoundError:
+                pass
+    else:
+        files.update(manifest['files'])
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump({'posts': state, 'files': sorted(files)}, f)
+    return full, sorted(set(written))
@@ -0,0 +1,58 @@
+"""Atom feeds of the published posts.
+
+The blog publishes a feed of its latest posts at ``/feed`` and one per
+category at ``/<slug>/category/feed``. They are built from the queries of
+the matching listings, reading only the columns shown in the feed and the
+html stored by ``RenderedContentMixin``, so the Markdown of the posts is not
+converted again.
+
+The feeds are served through ``cached_page`` with the tags of their
+listings, so publishing or editing a post invalidates them, and feed readers
+sending ``If-None-Match`` or ``If-Modified-Since`` get a 304 answer.
+"""
+from datetime import datetime
+from flask import current_app, render_template, Response
+from sqlalchemy.orm import load_only
+from app.models import Post
+
+# Columns read for each entry. ``content`` is loaded later only if the
+# stored html of a post is stale.
+FEED_COLUMNS = ('id', 'title', 'slug', 'timestamp', 'rendered_html',
+                'content_hash', 'renderer_version')
+
+
+def feed_entries(query):
+    """The latest posts of a listing, as shown in its feed.
+
+    Parameters
+    ----------
+    query : flask_sqlalchemy.BaseQuery
+        The posts of the listing, without ``order_by``.
+
+    Returns
+    -------
+    list
+        At most ``FEED_SIZE`` posts, from the newest.
+    """
+    return (query.options(load_only(*FEED_COLUMNS))
+            .order_by(Post.timestamp.desc(), Post.id.desc())
+            .limit(current_app.config['FEED_SIZE']).all())
+
+
+def feed_response(query, title, page_url):
+    """Renders the Atom feed of a listing.
+
+    Parameters
+    ----------
+    query : flask_sqlalchemy.BaseQuery
+        The posts of the listing, without ``order_by``.
+    title : str
+        Title of the feed.
+    page_url : str
+        External URL of the listing the feed follows.
+    """
+    posts = feed_entries(query)
+    updated = posts[0].timestamp if posts else datetime.utcnow()
+    return Response(render_template('feed.xml', posts=posts, title=title,
+                                    page_url=page_url, updated=updated),
+                    content_type='application/atom+xml')
@@ -1,49 +1,89 @@
+import math
+import zlib
 from flask import (render_template, flash, redirect, url_for, request,
-                   current_app, make_response, session, abort)
+                   session, abort, Response, stream_with_context,
+                   current_app)
 from flask_login import login_required, current_user
 from app import db
 from app.main.forms import PostForm
-from app.models import Post, SearchBarControls
+from app.models import Post, update_published_post_counts
+from app.controls.template_helpers import search_bar_placement
 from app.main import bp
-from sqlalchemy import exc
-from datetime import datetime
+from app.feeds import feed_response
+from app.page_cache import cached_page, invalidate_pages, post_tags
+from app.pagination import paginate_listing
+from sqlalchemy import exc, func
+from sqlalchemy.orm import selectinload
 from app.categories.utils import (set_categories, del_unused_categories,
                                   disassociate_categories)
 
 
+def stream_template(template_name, **context):
+    """Renders a template piece by piece, to be sent as a streamed response.
+
+    Parameters
+    ----------
+    template_name : str
+        Name of the template.
+    context :
+        Variables made available in the template.
+
+    Returns
+    -------
+    generator
+        Yields the rendered template in several strings.
+    """
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    return template.generate(context)
+
+
+def gzip_stream(pieces):
+    """Compresses with gzip the strings yielded by a generator, as they are
+    yielded.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @bp.route('/')
 @bp.route('/index')
+@cached_page('index')
 def index():
     """The Homepage. Published posts are listed here by date.
     """
     title = 'Home'
-    page = request.args.get('page', 1, type=int)
-    posts = (Post.query.filter_by(is_published=True, is_page=False)
-             .order_by(Post.timestamp.desc())
-             .paginate(page, current_app.config['POSTS_PER_PAGE'], False))
-    next_url = url_for('main.index',
-                       page=posts.next_num) if posts.has_next else None
-    prev_url = url_for('main.index',
-                       page=posts.prev_num) if posts.has_prev else None
-    return render_template('index.html', posts=posts.items,
+    posts, next_url, prev_url = paginate_listing(
+        Post.query.filter_by(is_published=True, is_page=False)
+        .options(selectinload(Post.category_list)), 'main.index')
+    return render_template('index.html', posts=posts,
                            title=title, next_url=next_url, prev_url=prev_url)
 
 
+@bp.route('/feed')
+@cached_page('index', layout=False)
+def feed():
+    """Atom feed of the latest published posts.
+    """
+    return feed_response(
+        Post.query.filter_by(is_published=True, is_page=False),
+        current_app.config['SITE_NAME'], url_for('main.index', _external=True))
+
+
 @bp.route('/drafts')
 @login_required
 def drafts():
     """Posts saved as drafts are listed here by date.
     """
     title = 'Drafts'
-    page = request.args.get('page', 1, type=int)
-    posts = (Post.query.filter_by(is_published=False, is_page=False)
-             .order_by(Post.timestamp.desc())
-             .paginate(page, current_app.config['POSTS_PER_PAGE'], False))
-    next_url = url_for('main.drafts',
-                       page=posts.next_num) if posts.has_next else None
-    prev_url = url_for('main.drafts',
-                       page=posts.prev_num) if posts.has_prev else None
-    return render_template('index.html', posts=posts.items,
+    posts, next_url, prev_url = paginate_listing(
+        Post.query.filter_by(is_published=False, is_page=False)
+        .options(selectinload(Post.category_list)), 'main.drafts')
+    return render_template('index.html', posts=posts,
                            title=title, next_url=next_url, prev_url=prev_url)
 
 
@@ -54,26 +94,23 @@ def search():
     This route becomes disabled if the admin decides to remove the search bar
     from the site interface.
     """
-    if SearchBarControls.query.filter_by(placement='no_search').first():
+    if search_bar_placement() == 'no_search':
         abort(404)
     title = 'Search'
     search_query = request.args.get('q')
-    page = request.args.get('page', 1, type=int)
     try:
-        posts = (Post.query.whooshee_search(search_query,
-                                            match_substrings=False)
-                 .filter_by(is_published=True)
-                 .paginate(page, current_app.config['POSTS_PER_PAGE'], False))
+        # Results are kept in their order of relevance.
+        posts, next_url, prev_url = paginate_listing(
+            Post.query.whooshee_search(search_query, match_substrings=False)
+            .filter_by(is_published=True)
+            .options(selectinload(Post.category_list)),
+            'main.search', ordered=False, q=search_query)
     except ValueError:
         flash('Search string must have at least 3 characters.', 'warning')
         return redirect(url_for('main.index'))
-    if not posts.items:
+    if not posts:
         flash('Sorry, your search query did not return any results.', 'info')
-    next_url = url_for('main.search', page=posts.next_num,
-                       q=search_query) if posts.has_next else None
-    prev_url = url_for('main.search', page=posts.prev_num,
-                       q=search_query) if posts.has_prev else None
-    return render_template('index.html', posts=posts.items,
+    return render_template('index.html', posts=posts,
                            title=title, next_url=next_url, prev_url=prev_url)
 
 
@@ -97,12 +134,17 @@ def create():
                     categories=categories)
         post.slugify_title()
         if request.form.get('preview'):
-            post.timestamp = datetime.utcnow()
-            session['post'] = post
+            session['preview'] = post.preview_data(categories)
             return redirect(url_for('main.preview', slug=post.slug))
         else:
+            post.refresh_html()
             try:
                 db.session.add(post)
+                db.session.flush()
+                update_published_post_counts(categories)
+                if post.is_published:
+                    invalidate_pages('sidebar',
+                                     *post_tags(post.slug, categories))
                 db.session.commit()
             except exc.IntegrityError:
                 db.session.rollback()
@@ -117,22 +159,82 @@ def create():
     return render_template('create.html', form=form, title=title)
 
 
+def published_entries():
+    """Slug and timestamp of the published posts and pages, ordered by id so
+    the entries of a sitemap chunk stay the same when posts are added.
+    """
+    return (db.session.query(Post.slug, Post.timestamp)
+            .filter_by(is_published=True)
+            .order_by(Post.id))
+
+
+def urlset_response(posts, compress):
+    """Streams the ``urlset`` of a sitemap, compressed with gzip or not.
+
+    Parameters
+    ----------
+    posts : sqlalchemy.orm.Query
+        Entries of the sitemap, see ``published_entries``. They are read a
+        thousand at a time.
+    compress : bool
+        Whether to send the sitemap compressed.
+    """
+    rendered = stream_template('sitemap.xml', posts=posts.yield_per(1000))
+    if compress:
+        return Response(stream_with_context(gzip_stream(rendered)),
+                        content_type='application/gzip')
+    return Response(stream_with_context(rendered),
+                    content_type='application/xml')
+
+
 @bp.route('/sitemap.xml')
 @bp.route('/sitemap')
+@cached_page('index', layout=False)
 def sitemap():
     """Display the sitemap.
+
+    Only the slug and timestamp of the posts are read and the sitemap is
+    sent while it is rendered. When there are more entries than
+    ``SITEMAP_CHUNK_SIZE``, a sitemap index is sent instead, pointing at the
+    chunks served by ``sitemap_chunk``.
     """
-    posts = Post.query.filter_by(is_published=True).all()
-    template = render_template('sitemap.xml', posts=posts)
-    response = make_response(template)
-    response.headers['Content-Type'] = 'application/xml'
-    return response
+    size = current_app.config['SITEMAP_CHUNK_SIZE']
+    count = (db.session.query(func.count(Post.id))
+             .filter_by(is_published=True).scalar())
+    if count <= size:
+        return urlset_response(published_entries(), compress=False)
+    extension = 'xml.gz' if current_app.config['SITEMAP_GZIP'] else 'xml'
+    sitemaps = [url_for('main.sitemap_chunk', chunk=n, extension=extension,
+                        _external=True)
+                for n in range(1, math.ceil(count / size) + 1)]
+    return Response(render_template('sitemap_index.xml', sitemaps=sitemaps),
+                    content_type='application/xml')
+
+
+@bp.route('/sitemap-<int:chunk>.<any("xml", "xml.gz"):extension>')
+@cached_page('index', layout=False)
+def sitemap_chunk(chunk, extension):
+    """Display one of the chunks of the sitemap listed by the sitemap index.
+
+    Parameters
+    ----------
+    chunk : int
+        Number of the chunk, starting from 1.
+    extension : str
+        ``xml.gz`` to get the chunk compressed with gzip, else ``xml``.
+    """
+    size = current_app.config['SITEMAP_CHUNK_SIZE']
+    posts = published_entries().offset((chunk - 1) * size).limit(size)
+    if chunk < 1 or posts.first() is None:
+        abort(404)
+    return urlset_response(posts, compress=extension == 'xml.gz')
 
 
 # The slug route must be placed after all the other routes, or else their
 # respective names will be misinterpreted as slugs. For example in
 # http://127.0.0.1:5000/create 'create' would be seen as a slug.
 @bp.route('/<slug>')
+@cached_page('post:{slug}')
 def detail(slug):
     """This route show a post in full, whether it is a draft or a post.
 
@@ -172,6 +274,8 @@ def edit(slug):
     post = Post.query.filter_by(slug=slug, is_page=False).first_or_404()
     form = PostForm()
     if form.validate_on_submit():
+        previous_categories = post.categories.all()
+        was_published = post.is_published
         categories = set_categories(form.categories_field.data)
         post.title = form.title_field.data
         post.content = form.content_field.data
@@ -180,11 +284,20 @@ def edit(slug):
         post.categories = categories
         post.slugify_title()
         if request.form.get('preview'):
-            session['post'] = post
-            session['categories'] = categories
+            session['preview'] = post.preview_data(categories)
             return redirect(url_for('main.preview', slug=post.slug))
         else:
+            post.refresh_html()
             try:
+                db.session.flush()
+                update_published_post_counts(previous_categories +
+                                             categories)
+                if was_published or post.is_published:
+                    invalidate_pages(*post_tags(slug, previous_categories),
+                                     *post_tags(post.slug, categories))
+                    if was_published != post.is_published or \
+                            set(previous_categories) != set(categories):
+                        invalidate_pages('sidebar')
                 db.session.commit()
             except exc.IntegrityError:
                 db.session.rollback()
@@ -218,14 +331,11 @@ def preview(slug):
         The slug is the part of the URL which identifies a particular post
         on our blog in an easy to read form.
     """
-    post = session['post']
-    # When I put the post object for the edit route in a session I am not
-    # capable to retrieve the categories from the stored post object.
-    # `post.categories.all()` returns an empty list. So I decided to create a
-    # separate session key containing the categories.
-    if 'categories' in session:
-        post.categories = session['categories']
-        session['categories'] = ''
+    # Only plain values are kept in the session, see ``Post.preview_data``.
+    data = session.get('preview')
+    if data is None:
+        abort(404)
+    post = Post.from_preview_data(data)
     title = f'Preview of "{post.title}"'
     return render_template('detail.html', post=post, title=title)
 
@@ -244,8 +354,13 @@ def delete(slug):
     title = 'Delete Post'
     p = Post.query.filter_by(slug=slug, is_page=False)
     if request.method == 'POST':
+        categories = p.first_or_404().categories.all()
+        if p.first().is_published:
+            invalidate_pages('sidebar', *post_tags(slug, categories))
         disassociate_categories(p)
         p.delete()
+        db.session.flush()
+        update_published_post_counts(categories)
         db.session.commit()
         del_unused_categories()
         flash('Post deleted.', 'success')
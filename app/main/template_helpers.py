@@ -2,11 +2,14 @@
 """
 
 from app.main import bp
-from app.models import Post, Social
-import re
+from app.memo import request_memoized
+from app.controls.settings import site_settings
+from app.models import Post
+from app.renderer import split_read_more
 
 
 @bp.app_template_global()
+@request_memoized
 def draft_exists():
     """Query the db to find if any draft post exist.
     """
@@ -24,10 +27,9 @@ def get_socials():
         Contains the names of the services and their addresses.
     """
     socials = {}
-    social_entries = Social.query.all()
-    for s in social_entries:
-        if s.address != '':
-            socials[s.name] = s.address
+    for name, address in site_settings().socials.items():
+        if address != '':
+            socials[name] = address
     return socials
 
 
@@ -35,8 +37,10 @@ def get_socials():
 def read_more(html, anchor):
     """Will truncate the text at the place the user left a [read_more] tag.
 
-    This truncation will appear in the /index, /drafts and /search pages.
-    The purpose is to make the listing of posts more brief.
+    The purpose is to make the listing of posts more brief. Our listings no
+    longer need it since the excerpt of the posts is stored when they are
+    saved (see ``Post.listing_content``). It is kept for any html holding
+    the tag.
 
     Parameters
     ----------
@@ -47,16 +51,16 @@ def read_more(html, anchor):
 
     Returns
     -------
-    f'{splitted_html[0]}{anchor}' : str
+    f'{excerpt}{anchor}' : str
         Returns the html of the truncated post including the hyperlink
         leading to the detail of the post in full.
     html : class 'markupsafe.Markup'
         Returns the html of the post in full. Happens when no [read_more] tag
         is found.
     """
-    splitted_html = re.split('\[read_more\]', html, maxsplit=1)
-    if len(splitted_html) > 1:
-        return f'{splitted_html[0]}{anchor}'
+    excerpt, html = split_read_more(html)
+    if excerpt is not None:
+        return f'{excerpt}{anchor}'
     return html
 
 
@@ -64,6 +68,9 @@ def read_more(html, anchor):
 def remove_read_more(html):
     """Will remove the [read_more] tag from the detail of a post.
 
+    The stored html of the posts is already free of the tag, see
+    ``Post.render_html``.
+
     Parameters
     ----------
     html : class 'markupsafe.Markup'
@@ -71,13 +78,10 @@ def remove_read_more(html):
 
     Returns
     -------
-    splitted_html[0] + splitted_html[1] : str
+    excerpt + rest : str
         Returns the html of the post after having removed the [read_more] tag.
     html : class 'markupsafe.Markup'
         Returns the html of the post without doing any operation on it.
         Happens when no [read_more] tag is found.
     """
-    splitted_html = re.split('\[read_more\]', html, maxsplit=1)
-    if len(splitted_html) > 1:
-        return splitted_html[0] + splitted_html[1]
-    return html
+    return split_read_more(html)[1]
@@ -0,0 +1,103 @@
+"""Memoization for the functions used by our templates.
+
+Several template globals are called more than once while a single page is
+rendered (once per post, once in the navbar and again in the sidebar, etc.)
+and every call used to query the database. Results are now kept on
+``flask.g`` for the duration of the request.
+
+Results that are expensive to compute can also be kept in the memory of the
+process for as long as the data they are built from does not change (see
+``version_cached``).
+"""
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+
+
+def request_memoized(func):
+    """Decorator caching the result of a function until the end of the
+    request.
+
+    Results are keyed by the name of the function and its arguments, which
+    must be hashable. Outside of a request the function is always called.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+        memo = g.setdefault('memo', {})
+        key = (func.__module__, func.__name__, args,
+               tuple(sorted(kwargs.items())))
+        if key in memo:
+            g.memo_hits = g.get('memo_hits', 0) + 1
+            return memo[key]
+        memo[key] = func(*args, **kwargs)
+        return memo[key]
+    return wrapper
+
+
+def version_cached(*names):
+    """Decorator keeping the result of a function without arguments in the
+    memory of the process until one of the given versions changes.
+
+    The versions are read from the ``CacheVersion`` table, once per request,
+    so every worker process notices the changes made by the others.
+
+    Parameters
+    ----------
+    names : str
+        Names of the versioned data the result is built from. See
+        ``VERSIONED_MODELS`` in ``app.models``.
+    """
+    def decorator(func):
+        key = f'{func.__module__}.{func.__name__}'
+
+        @wraps(func)
+        def wrapper():
+            from app.models import get_versions
+            versions = get_versions(*names)
+            cache = current_app.extensions.setdefault('version_cache', {})
+            cached = cache.get(key)
+            if cached is None or cached[0] != versions:
+                cached = (versions, func())
+                cache[key] = cached
+            return cached[1]
+        return request_memoized(wrapper)
+    return decorator
+
+
+def clear_memo():
+    """Forgets every result memoized during the current request.
+
+    To be used when a route changes data after a memoized function has
+    already been called.
+    """
+    g.pop('memo', None)
+
+
+def init_memo(app):
+    """Makes sure the memo lives only as long as the request.
+
+    ``flask.g`` can outlive a request when an application context was
+    already pushed, as it is the case in our tests, so the memo is emptied
+    at both ends of the request.
+
+    In debug mode the number of queries saved by the memo is logged and sent
+    in the ``X-Queries-Saved`` header of the response.
+    """
+    @app.before_request
+    def reset_memo():
+        clear_memo()
+        g.memo_hits = 0
+
+    @app.teardown_request
+    def drop_memo(exception):
+        clear_memo()
+
+    @app.after_request
+    def report_memo_hits(response):
+        if app.debug:
+            saved = g.get('memo_hits', 0)
+            response.headers['X-Queries-Saved'] = str(saved)
+            app.logger.debug(f'{saved} queries saved by memoization on '
+                             f'{request.path}')
+        return response
@@ -1,17 +1,18 @@
 """Contains the models that will be used to define our database tables.
 """
-from flask import Markup
+from flask import Markup, current_app
 from app import db, whooshee, login
 from datetime import datetime
+from hashlib import sha1
+import time
+from sqlalchemy import bindparam, case, event, func, inspect, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import defer, query_expression, with_expression
+from sqlalchemy.orm.attributes import set_committed_value
 from slugify import slugify
-from markdown import markdown
-from markdown.extensions.codehilite import CodeHiliteExtension
-from markdown.extensions.extra import ExtraExtension
-# micawber_bs4_classes is a modified version of the micawber module:
-# https://pypi.org/project/micawber/
-# our version adds bootstrap 4 classes to the embeds and make them responsive.
-from micawber_bs4_classes import bootstrap_basic, parse_html
-from micawber_bs4_classes.cache import Cache as OEmbedCache
+import markdown as markdown_package
+import pygments
+from app.renderer import render, split_read_more
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -58,9 +59,54 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password, password)
 
 
+def cached_admin(reload=False):
+    """Returns the admin of the blog, kept in the memory of the process.
+
+    FlaskyPress has a single user, so once registered it is read from the
+    database at most every ``ADMIN_CACHE_TTL`` seconds. The cached user is
+    detached from the database session, its attributes stay readable after
+    the session is closed.
+
+    Parameters
+    ----------
+    reload : bool
+        Read the user from the database even if it is cached.
+
+    Returns
+    -------
+    class 'app.models.User'
+        The admin, or None if nobody has registered yet.
+    """
+    cache = current_app.extensions.setdefault('admin', {})
+    if (reload or cache.get('user') is None or
+            time.monotonic() - cache['loaded'] >
+            current_app.config['ADMIN_CACHE_TTL']):
+        user = User.query.first()
+        if user is not None:
+            # Loaded before the user is detached from the session.
+            user.password
+            db.session.expunge(user)
+        cache.update(user=user, loaded=time.monotonic())
+    return cache['user']
+
+
+def forget_admin(target, value, oldvalue, initiator):
+    """Drops the cached admin when a password is set.
+
+    Will be called by SQLAlchemy each time the ``password`` attribute of a
+    user is assigned, at registration or when the password is changed. The
+    other worker processes notice the change after ``ADMIN_CACHE_TTL``
+    seconds.
+    """
+    current_app.extensions.pop('admin', None)
+
+
+event.listen(User.password, 'set', forget_admin)
+
+
 @login.user_loader
 def load_user(id):
-    """Reloads a user from a session by querying it's id from the database.
+    """Reloads a user from a session by its id.
 
     Flask-Login keeps track of the logged in user by storing its unique
     identifier in Flask's user session. The module is not capable by itself
@@ -71,6 +117,10 @@ def load_user(id):
     ID stored in the session cookie. Flask-Login makes the loaded user
     accessible via the ``current_user`` proxy.
 
+    The admin is taken from ``cached_admin`` so the requests of a logged in
+    user don't query the database. An unknown id is checked against the
+    database before being rejected.
+
     Parameters
     ----------
     id : str
@@ -81,7 +131,12 @@ def load_user(id):
     class 'app.models.User'
         A user object, or None if the user does not exist.
     """
-    return User.query.get(int(id))
+    user = cached_admin()
+    if user is None or user.id != int(id):
+        user = cached_admin(reload=True)
+    if user is not None and user.id == int(id):
+        return user
+    return None
 
 
 class PostCategory(db.Model):
@@ -97,25 +152,29 @@ class PostCategory(db.Model):
         Id of the post in the association
     category_id : int
         Id of the category in the association
+
+    A post is associated only once with a category. The unique index on the
+    pair also serves the lookups by post, the second index the listings of
+    a category.
     """
     __tablename__ = 'post_category'
+    __table_args__ = (
+        db.Index('uq_post_category_post_id_category_id', 'post_id',
+                 'category_id', unique=True),
+        db.Index('ix_post_category_category_id_post_id', 'category_id',
+                 'post_id'),
+    )
     id = db.Column(db.Integer(), primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'))
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
 
 
-# Configure micawber_bs4_classes with the default OEmbed providers
-# (YouTube, Flickr, etc). We'll use a simple in-memory cache so that
-# multiple requests for the same video don't require multiple network requests.
-oembed_providers = bootstrap_basic(OEmbedCache())
-
-
 def util_html_content(self):
     """Converts markdown into html and media urls into embeds.
 
     Generates HTML representation of the markdown-formatted blog entry, and
     also convert any media URLs into rich media objects such as video
-    players or images.
+    players or images. See ``app.renderer.render``.
 
     Returns
     -------
@@ -123,24 +182,218 @@ def util_html_content(self):
       Returns markup objects so that the passed string can't be double
       escaped.
     """
-    hilite = CodeHiliteExtension(linenums=False)
-    extras = ExtraExtension()
-    markdown_content = markdown(self.content,
-                                extensions=[hilite, extras])
-    oembed_content = parse_html(
-        markdown_content,
-        oembed_providers,
-        urlize_all=True)
-    # If your returned 'oembed_content' without using 'Markup()' the html
-    # would be shown as text on the page instead of being rendered.
-    return Markup(oembed_content)
+    return render(self.content)
+
+
+# Increment this number every time a change made to ``util_html_content``
+# alters the html it returns. Every stored rendering will then be considered
+# stale and will be generated again.
+RENDERER_REVISION = 2
+
+
+def current_renderer_version():
+    """Identifies the renderer that would be used to generate html right now.
+
+    Beside our own revision number, the identifier includes the versions of
+    Markdown and Pygments and the ``STYLE_EMBED`` setting since all of them
+    have an effect on the produced html.
+
+    Returns
+    -------
+    str
+        Short string uniquely describing the rendering pipeline.
+    """
+    return (f'{RENDERER_REVISION}-md{markdown_package.__version__}'
+            f'-pyg{pygments.__version__}'
+            f'-embed{int(bool(current_app.config["STYLE_EMBED"]))}')
+
+
+def content_hash(content):
+    """Returns the sha1 hex digest of a markdown document.
+
+    Parameters
+    ----------
+    content : str
+        Markdown body of a post, a page or a content widget.
+    """
+    return sha1((content or '').encode('utf-8')).hexdigest()
+
+
+class RenderedContentMixin:
+    """Stores the html rendering of a markdown ``content`` column.
+
+    Converting markdown and embedding media are costly operations, so the
+    html is generated once when an entry is created or edited and kept in the
+    database along with the hash of the content and the version of the
+    renderer it came from. Entries saved before this column existed, or
+    rendered by an older version of the renderer, are rendered again the first
+    time their html is requested.
+
+    Attributes
+    ----------
+    rendered_html : str
+        Html generated from ``content``. ``None`` until the first rendering.
+    content_hash : str
+        Hash of the content the html was generated from.
+    renderer_version : str
+        See documentation of ``current_renderer_version``.
+    """
+    rendered_html = db.Column(db.Text)
+    content_hash = db.Column(db.String(40))
+    renderer_version = db.Column(db.String(50))
+
+    @property
+    def html_content(self):
+        """Returns the stored html, rendering it first if needed.
+
+        When the entry is already saved in the database a missing or stale
+        rendering is saved on the spot, so the work is done only once. See
+        ``store_rendering``.
+        """
+        if not self.html_is_stale():
+            return Markup(self.rendered_html)
+        state = inspect(self)
+        if state.persistent and not state.modified:
+            self.store_rendering()
+        else:
+            self.render_html()
+        return Markup(self.rendered_html)
+
+    def html_is_stale(self):
+        """Tells if the stored html can't be served as is.
+
+        The hash of the content is only compared when the content is loaded.
+        The listings and the feeds leave it out and rely on the renderer
+        version, the hash being written along with every rendering.
+
+        Returns
+        -------
+        bool
+            True if the html is missing, was generated by another version of
+            the renderer or from another content.
+        """
+        if (self.rendered_html is None or
+                self.renderer_version != current_renderer_version()):
+            return True
+        if 'content' in inspect(self).unloaded:
+            return False
+        return self.content_hash != content_hash(self.content)
+
+    def rendering_values(self):
+        """Returns the values of the columns holding the rendering, by name.
+        """
+        return {'rendered_html': self.rendered_html,
+                'content_hash': self.content_hash,
+                'renderer_version': self.renderer_version}
+
+    def store_rendering(self):
+        """Renders the html of a saved entry and writes it with a single
+        UPDATE, sent from a connection of its own.
+
+        The session is left untouched: its pending changes are not committed
+        and its objects are not expired. The new values are set on the entry
+        as if they had been loaded. See ``rendering_update`` for the case of
+        a content modified in the meantime. When the database can't be
+        written right now the html is only kept by the entry.
+        """
+        self.render_html()
+        values = self.rendering_values()
+        for key, value in values.items():
+            set_committed_value(self, key, value)
+        values.update(_id=self.id, _content=self.content)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(rendering_update(type(self)), values)
+        except OperationalError:
+            current_app.logger.warning('Rendering of %r was not stored.',
+                                       self)
+
+    def render_html(self):
+        """See documentation of ``util_html_content``.
+
+        The result is stored in the ``rendered_html`` column. When embeds are
+        still being resolved in the background the rendering contains plain
+        links in their place, so it is stored without a renderer version and
+        will be done again on the next request.
+        """
+        providers = current_app.extensions['oembed']
+        deferred = providers.deferred_lookups()
+        self.rendered_html = str(util_html_content(self))
+        self.content_hash = content_hash(self.content)
+        if providers.deferred_lookups() == deferred:
+            self.renderer_version = current_renderer_version()
+        else:
+            self.renderer_version = None
+
+    def refresh_html(self):
+        """Renders the html only if the stored one is stale.
+        """
+        if self.html_is_stale():
+            self.render_html()
+
+
+def rendering_update(model):
+    """UPDATE writing the rendering of an entry of a model.
+
+    The row is left as is if its content is no longer the one the html was
+    generated from. The parameters are the values of ``rendering_values``
+    along with ``_id`` and ``_content``, the id and the rendered content of
+    the entry.
+
+    Parameters
+    ----------
+    model : class
+        ``Post`` or ``ContentWidget``.
+    """
+    table = model.__table__
+    columns = [name for name in RENDERING_COLUMNS if name in table.c]
+    return (table.update()
+            .where(table.c.id == bindparam('_id'))
+            .where(table.c.content == bindparam('_content'))
+            .values({name: bindparam(name) for name in columns}))
+
+
+def discard_renderings_containing(text):
+    """Discards the stored html of every entry whose content contains a given
+    string.
+
+    Used once the embed of a URL is resolved in the background so that the
+    plain link rendered in its place gets replaced.
+
+    Parameters
+    ----------
+    text : str
+        Usually a media URL.
+    """
+    for model, columns in ((Post, {'rendered_html': None,
+                                   'excerpt_html': None}),
+                           (ContentWidget, {'rendered_html': None})):
+        discarded = (model.query.filter(model.content.contains(text))
+                     .update(columns, synchronize_session=False))
+        if discarded and model is ContentWidget:
+            # The sidebar fragment holds the renderings of the widgets.
+            bump_version('widgets')
+    db.session.commit()
+
+
+def invalidate_rendered_html(target, value, oldvalue, initiator):
+    """Discards the stored html when the content of an entry changes.
+
+    Will be called by SQLAlchemy each time a new value is assigned to the
+    ``content`` attribute of a model using ``RenderedContentMixin``. Assigning
+    the same content again keeps the html since their hashes are identical.
+    """
+    if target.content_hash != content_hash(value):
+        target.rendered_html = None
+        if isinstance(target, Post):
+            target.excerpt_html = None
 
 
 # When we pass the name of a model variable to this decorator, the content
 # in the database associated with that variable become indexed and at the same
 # time searchable.
 @whooshee.register_model('title', 'content')
-class Post(db.Model):
+class Post(RenderedContentMixin, db.Model):
     """Model for the table that will accept the content of blog posts.
 
     This model is also used for pages.
@@ -159,7 +412,21 @@ class Post(db.Model):
         Indicate whether the post is published or a draft.
     timestamp : class 'datetime.datetime'
         Time and date of the post creation.
+
+    excerpt_html : str
+        Html found before the ``[read_more]`` tag, ``None`` if the post has
+        no tag. ``rendered_html`` is stored without the tag.
+    listing_html : str
+        Loaded only by ``listing_options``: ``rendered_html`` when the post
+        has no excerpt.
+
+    The listings filter on ``is_page`` and ``is_published`` and order by
+    ``(timestamp, id)``, which ``ix_post_listing`` covers in that order.
     """
+    __table_args__ = (
+        db.Index('ix_post_listing', 'is_page', 'is_published', 'timestamp',
+                 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150))
     content = db.Column(db.String(40000))
@@ -170,28 +437,128 @@ class Post(db.Model):
     categories = db.relationship('Category', secondary='post_category',
                                  backref='post', lazy='dynamic',
                                  order_by='Category.name')
-
-    @property
-    def html_content(self):
-        """See documentation of ``util_html_content``.
-        """
-        return util_html_content(self)
+    # Read-only copy of ``categories`` that can be eager loaded, so listing
+    # pages fetch the categories of all their posts in a single query.
+    category_list = db.relationship('Category', secondary='post_category',
+                                    viewonly=True, order_by='Category.name')
+    excerpt_html = db.Column(db.Text)
+    listing_html = query_expression()
 
     def slugify_title(self):
         """Generates a URL-friendly representation of the entry's title.
         """
         self.slug = slugify(self.title, lowercase=True, separator="_")
 
+    def render_html(self):
+        """See documentation of ``RenderedContentMixin.render_html``.
+
+        The html is split at its ``[read_more]`` tag once, here, rather than
+        each time a post is shown.
+        """
+        super().render_html()
+        self.excerpt_html, self.rendered_html = \
+            split_read_more(self.rendered_html)
+
+    def rendering_values(self):
+        """See documentation of ``RenderedContentMixin.rendering_values``.
+        """
+        values = super().rendering_values()
+        values['excerpt_html'] = self.excerpt_html
+        return values
+
+    def listing_content(self, anchor):
+        """Html of the post shown in the listings: its excerpt followed by a
+        link to the post, or the whole html when there is no excerpt.
+
+        With ``listing_options`` only one of them is read from the database.
+
+        Parameters
+        ----------
+        anchor : class 'markupsafe.Markup'
+            Anchor tag linking to the post detail.
+        """
+        if self.renderer_version == current_renderer_version():
+            if self.excerpt_html is not None:
+                return Markup(self.excerpt_html) + anchor
+            if self.listing_html is not None:
+                return Markup(self.listing_html)
+        # Stale, discarded, or loaded without ``listing_options``.
+        html = self.html_content
+        excerpt = self.excerpt_html
+        if excerpt is not None:
+            return Markup(excerpt) + anchor
+        return html
+
+    def preview_data(self, categories=()):
+        """Describes the entry with plain values, kept in the user session
+        until the entry is previewed.
+
+        Parameters
+        ----------
+        categories : list
+            Categories the entry will be posted under.
+
+        Returns
+        -------
+        dict
+            Title, content, slug, flags, timestamp in ISO format and names of
+            the categories. The current time is used for new entries.
+        """
+        return {'title': self.title,
+                'content': self.content,
+                'slug': self.slug,
+                'is_page': bool(self.is_page),
+                'is_published': bool(self.is_published),
+                'timestamp': (self.timestamp or datetime.utcnow()).isoformat(),
+                'categories': [c.name for c in categories]}
+
+    @classmethod
+    def from_preview_data(cls, data):
+        """Rebuilds an entry described by ``preview_data``.
+
+        The entry and its categories are never added to the database
+        session. The categories are only set on the attribute read by our
+        templates.
+        """
+        post = cls(title=data['title'], content=data['content'],
+                   slug=data['slug'], is_page=data['is_page'],
+                   is_published=data['is_published'],
+                   timestamp=datetime.fromisoformat(data['timestamp']))
+        categories = []
+        for name in data['categories']:
+            c = Category(name=name)
+            c.slugify_name()
+            categories.append(c)
+        set_committed_value(post, 'category_list', categories)
+        return post
+
     def __repr__(self):
         return f'<Post: {self.title}>'
 
 
+event.listen(Post.content, 'set', invalidate_rendered_html)
+
+
+def listing_options():
+    """Query options loading the posts of a listing without their bodies.
+
+    Neither the markdown nor the full html of the posts having an excerpt is
+    read, see ``Post.listing_content``.
+    """
+    return (defer(Post.content), defer(Post.rendered_html),
+            with_expression(Post.listing_html,
+                            case([(Post.excerpt_html.is_(None),
+                                   Post.rendered_html)])))
+
+
 class Category(db.Model):
     """Model for the table that will accept the accepts post's categories.
     """
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(40))
-    slug = db.Column(db.String(45))
+    name = db.Column(db.String(40), index=True)
+    slug = db.Column(db.String(45), index=True)
+    published_post_count = db.Column(db.Integer, default=0, nullable=False,
+                                     server_default='0')
     posts = db.relationship('Post', secondary='post_category',
                             backref='category', lazy='dynamic')
 
@@ -204,6 +571,35 @@ class Category(db.Model):
         return f'<Category: {self.name}>'
 
 
+def update_published_post_counts(categories=None):
+    """Recomputes the ``published_post_count`` of some categories.
+
+    The counts are computed by the database with one aggregate over the
+    ``post_category`` table and written by a single ``UPDATE``. Changes are
+    not committed so they become part of the transaction that modified the
+    posts.
+
+    parameter
+    ---------
+    categories : list
+        Category objects to update, they must have been flushed. All the
+        categories are updated when none is given.
+    """
+    count = (select([func.count(func.distinct(PostCategory.post_id))])
+             .where(PostCategory.category_id == Category.id)
+             .where(PostCategory.post_id == Post.id)
+             .where(Post.is_published == True)
+             .as_scalar())
+    query = Category.query
+    if categories is not None:
+        ids = [c.id for c in categories]
+        if not ids:
+            return
+        query = query.filter(Category.id.in_(ids))
+    query.update({Category.published_post_count: count},
+                 synchronize_session=False)
+
+
 def reorder_widgets():
     """Takes an existing widget order and modify it to remove gaps.
 
@@ -218,12 +614,19 @@ def reorder_widgets():
     "content widget 1" :: 1
     "Search Bar Widget" :: 2
     "Category Widget" :: 3
+
+    All the widgets are renumbered by a single ``UPDATE`` taking their rank
+    from a window function.
     """
-    wo = (WidgetOrder.query.order_by(WidgetOrder.position))
-    if wo:
-        for index, obj in enumerate(wo):
-            obj.position = index + 1
-        db.session.commit()
+    ranks = (db.session.query(WidgetOrder.id.label('id'),
+                              func.row_number().over(
+                                  order_by=(WidgetOrder.position,
+                                            WidgetOrder.id)).label('rank'))
+             .subquery())
+    rank = select([ranks.c.rank]).where(ranks.c.id == WidgetOrder.id)
+    WidgetOrder.query.update({WidgetOrder.position: rank.as_scalar()},
+                             synchronize_session=False)
+    db.session.commit()
 
 
 def add_to_or_remove_from_sidebar_util(status, value, widget_name):
@@ -234,8 +637,9 @@ def add_to_or_remove_from_sidebar_util(status, value, widget_name):
     widgets.
 
     - The function also removes a widget from the sidebar if a user decides to
-    change it's placement. When this action occurs a reordering of the widgets
-    is also triggered to remove gaps between positions.
+    change it's placement. When this action occurs the widgets placed after
+    it are all moved up one position by a single ``UPDATE``, so no gap is
+    left between positions.
 
     parameters
     ----------
@@ -248,19 +652,23 @@ def add_to_or_remove_from_sidebar_util(status, value, widget_name):
     widget_name : str
         Name of the widget.
     """
-    wo = WidgetOrder.query.filter_by(name=widget_name)
+    wo = WidgetOrder.query.filter_by(name=widget_name).first()
     if status == value:
-        if not wo.first():
-            widgets_count = WidgetOrder.query.count()
+        if not wo:
+            last_position = (db.session.query(func.max(WidgetOrder.position))
+                             .scalar())
             new_wo = WidgetOrder(name=widget_name,
-                                 position=widgets_count + 1)
+                                 position=(last_position or 0) + 1)
             db.session.add(new_wo)
             db.session.commit()
     else:
-        if wo.first():
-            wo.delete()
+        if wo:
+            position = wo.position
+            db.session.delete(wo)
+            (WidgetOrder.query.filter(WidgetOrder.position > position)
+             .update({WidgetOrder.position: WidgetOrder.position - 1},
+                     synchronize_session=False))
             db.session.commit()
-            reorder_widgets()
 
 
 class SearchBarControls(db.Model):
@@ -295,22 +703,16 @@ class CategoriesControls(db.Model):
         return f'<Where are displayed categories: {self.presence}>'
 
 
-class ContentWidget(db.Model):
+class ContentWidget(RenderedContentMixin, db.Model):
     """Model for the table that will accept input defining our content widgets.
     """
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(75))
+    title = db.Column(db.String(75), index=True)
     slug = db.Column(db.String(75), unique=True, index=True)
     content = db.Column(db.String(5000))
     is_published = db.Column(db.Boolean)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
 
-    @property
-    def html_content(self):
-        """See documentation of ``util_html_content``.
-        """
-        return util_html_content(self)
-
     def slugify_title(self):
         """Generates a URL-friendly representation of the widget's title.
         """
@@ -345,6 +747,9 @@ class ContentWidget(db.Model):
         return f'<Content widget title: {self.title}>'
 
 
+event.listen(ContentWidget.content, 'set', invalidate_rendered_html)
+
+
 class Social(db.Model):
     """Model for the table that will accept the user social addresses.
     """
@@ -360,9 +765,173 @@ class WidgetOrder(db.Model):
     """This model concerns the order of the widgets in the sidebar.
     """
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(75))
-    position = db.Column(db.String(2))
+    name = db.Column(db.String(75), index=True)
+    position = db.Column(db.Integer, index=True)
 
     def __repr__(self):
         return f'<Widget name and position: {self.name}: {self.position}>'
 
+
+class CacheVersion(db.Model):
+    """Version counters of the data kept in memory by our worker processes.
+
+    Every change to the data cached under a given name increments its
+    counter. A process whose cached copy was built from an older version
+    knows it has to reload it.
+
+    ``modified`` holds the time of the last increment. It is sent as the
+    ``Last-Modified`` header of the pages built from the data.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), unique=True, index=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    modified = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Cache version: {self.name}: {self.version}>'
+
+
+def get_version(name):
+    """Get the actual version of the data cached under a given name.
+
+    parameter
+    ---------
+    name : str
+        Name of the cached data.
+
+    return
+    ------
+    version : int
+        Zero when the data was never modified.
+    """
+    version = (db.session.query(CacheVersion.version)
+               .filter_by(name=name).scalar())
+    return version or 0
+
+
+def get_versions(*names):
+    """Get the actual versions of the data cached under several names with a
+    single query.
+
+    parameter
+    ---------
+    names : str
+        Names of the cached data.
+
+    return
+    ------
+    versions : tuple
+        Versions in the same order as the names, zero for the data never
+        modified.
+    """
+    rows = dict(db.session.query(CacheVersion.name, CacheVersion.version)
+                .filter(CacheVersion.name.in_(names)))
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def get_version_states(*names):
+    """Get the actual versions of the data cached under several names along
+    with the time of their last modification, with a single query.
+
+    parameter
+    ---------
+    names : str
+        Names of the cached data.
+
+    return
+    ------
+    versions : tuple
+        See ``get_versions``.
+    modified : datetime.datetime
+        Time of the most recent modification of the data, ``None`` when none
+        of it was ever modified.
+    """
+    rows = {name: (version, modified) for name, version, modified in
+            db.session.query(CacheVersion.name, CacheVersion.version,
+                             CacheVersion.modified)
+            .filter(CacheVersion.name.in_(names))}
+    versions = tuple(rows.get(name, (0, None))[0] for name in names)
+    modified = [m for v, m in rows.values() if m is not None]
+    return versions, max(modified) if modified else None
+
+
+def bump_version(name, connection=None):
+    """Increments the version of the data cached under a given name.
+
+    The statements are sent through the connection of the ongoing
+    transaction so the new version is committed together with the change of
+    data it signals.
+
+    parameters
+    ----------
+    name : str
+        Name of the cached data.
+    connection : sqlalchemy.engine.Connection
+        Connection to use. Defaults to the one of ``db.session``.
+    """
+    if connection is None:
+        connection = db.session.connection()
+    table = CacheVersion.__table__
+    now = datetime.utcnow()
+    result = connection.execute(table.update()
+                                .where(table.c.name == name)
+                                .values(version=table.c.version + 1,
+                                        modified=now))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(name=name, version=1,
+                                                 modified=now))
+
+
+# Names of the versioned data along with the models they are built from.
+VERSIONED_MODELS = {
+    'settings': (SearchBarControls, CategoriesControls, Social, WidgetOrder),
+    'posts': (Post, Category, PostCategory),
+    'widgets': (ContentWidget,),
+}
+# Columns only holding a cached rendering of the other ones. Writing them
+# does not change the data.
+RENDERING_COLUMNS = {'rendered_html', 'excerpt_html', 'content_hash',
+                     'renderer_version'}
+
+
+def only_renderings_changed(obj):
+    """Tells if the only modified attributes of an instance are the ones
+    holding its rendering.
+    """
+    changed = {a.key for a in inspect(obj).attrs if a.history.has_changes()}
+    return changed <= RENDERING_COLUMNS
+
+
+def bump_versions_on_flush(session, flush_context, instances):
+    """Increments the versions of the data built from the models a flush is
+    about to write.
+    """
+    written = list(session.new) + list(session.deleted)
+    written += [obj for obj in session.dirty
+                if not only_renderings_changed(obj)]
+    for name, models in VERSIONED_MODELS.items():
+        if any(isinstance(obj, models) for obj in written):
+            bump_version(name, session.connection())
+
+
+def bump_versions_on_bulk(context):
+    """Increments the versions of the data built from a model written by a
+    bulk update or delete, ``WidgetOrder.query.delete()`` for instance.
+
+    Bulk updates touching only the rendering columns are ignored.
+    """
+    if context.mapper is None:
+        return
+    values = getattr(context, 'values', None)
+    if values:
+        keys = {getattr(k, 'key', k) for k in values}
+        if keys <= RENDERING_COLUMNS:
+            return
+    for name, models in VERSIONED_MODELS.items():
+        if issubclass(context.mapper.class_, models):
+            bump_version(name, context.session.connection())
+
+
+event.listen(db.session, 'before_flush', bump_versions_on_flush)
+event.listen(db.session, 'after_bulk_update', bump_versions_on_bulk)
+event.listen(db.session, 'after_bulk_delete', bump_versions_on_bulk)
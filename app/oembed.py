@@ -0,0 +1,428 @@
+"""Caches the responses of the oEmbed providers used to embed rich media.
+
+micawber's own cache is an unbounded dictionary living in each process,
+which means every worker fetches the same embeds again and a provider that
+failed is contacted again on every render. The caches below are bounded,
+expire their entries and can be shared by all the workers through a SQLite
+file. Failed lookups are remembered for a shorter period of time.
+
+In asynchronous mode the providers are never contacted while a page is being
+rendered. Unknown URLs are rendered as plain links and resolved by a pool of
+background threads, after which the stored html containing them is discarded.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+from micawber_bs4_classes import bootstrap_basic, ProviderRegistry
+from micawber_bs4_classes.exceptions import (ProviderException,
+                                             ProviderNotFoundException)
+from micawber_bs4_classes.providers import make_key
+
+
+# Stored in place of the provider response when a lookup failed.
+NEGATIVE_RESULT = {'oembed_error': True}
+
+
+class MemoryCache:
+    """Least recently used cache kept in the memory of the process.
+
+    Parameters
+    ----------
+    maxsize : int
+        Number of entries kept before the least recently used is evicted.
+    ttl : int
+        Default number of seconds an entry stays valid. ``None`` or ``0``
+        keeps entries until they are evicted.
+    clock : callable
+        Returns the current time in seconds.
+    """
+    def __init__(self, maxsize=1000, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, k):
+        """Returns the value stored under ``k`` or ``None``.
+        """
+        with self._lock:
+            item = self._cache.get(k)
+            if item is not None and item[1] is not None \
+                    and item[1] <= self.clock():
+                del self._cache[k]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(k)
+            self.hits += 1
+            return item[0]
+
+    def set(self, k, v, ttl=None):
+        """Stores ``v`` under ``k`` for ``ttl`` seconds.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._cache[k] = (v, expires)
+            self._cache.move_to_end(k)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def delete(self, k):
+        """Removes the entry stored under ``k``.
+        """
+        with self._lock:
+            self._cache.pop(k, None)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class SQLiteCache:
+    """Least recently used cache stored in a SQLite file.
+
+    All the processes pointing to the same file share the entries. Values must
+    be serializable to JSON, which is the case of the oEmbed responses.
+
+    Parameters
+    ----------
+    path : str
+        Location of the SQLite file. Created if not existing.
+    maxsize : int
+        Number of entries kept before the least recently used are evicted.
+    ttl : int
+        Default number of seconds an entry stays valid. ``None`` or ``0``
+        keeps entries until they are evicted.
+    clock : callable
+        Returns the current time in seconds.
+    table : str
+        Name of the table holding the entries, so that several caches can
+        share a file.
+    """
+    def __init__(self, path, maxsize=1000, ttl=None, clock=time.time,
+                 table='oembed_cache'):
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires REAL, accessed REAL NOT NULL)')
+
+    @contextmanager
+    def _connection(self):
+        """Opens a connection committing on success and always closing.
+
+        A new connection is used for every operation since the ones of the
+        ``sqlite3`` module can't be shared between threads.
+        """
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, k):
+        """Returns the value stored under ``k`` or ``None``.
+        """
+        now = self.clock()
+        with self._connection() as conn:
+            row = conn.execute(f'SELECT value, expires FROM {self.table} '
+                               'WHERE key = ?', (k,)).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (k,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed = ? '
+                         'WHERE key = ?', (now, k))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, k, v, ttl=None):
+        """Stores ``v`` under ``k`` for ``ttl`` seconds and evicts the least
+        recently used entries above ``maxsize``.
+        """
+        now = self.clock()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        with self._connection() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} '
+                         '(key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                         (k, json.dumps(v), expires, now))
+            conn.execute(f'DELETE FROM {self.table} WHERE key IN ('
+                         f'SELECT key FROM {self.table} '
+                         'ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                         (self.maxsize,))
+
+    def delete(self, k):
+        """Removes the entry stored under ``k``.
+        """
+        with self._connection() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (k,))
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute(
+                f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+class CachingProviderRegistry(ProviderRegistry):
+    """Provider registry remembering successful and failed lookups.
+
+    Parameters
+    ----------
+    cache : MemoryCache or SQLiteCache
+        Where the responses of the providers are stored.
+    negative_ttl : int
+        Number of seconds a failed lookup is remembered. During that time the
+        provider is not contacted again for the same URL.
+    """
+    def __init__(self, cache, negative_ttl=3600):
+        super().__init__(cache)
+        self.negative_ttl = negative_ttl
+        self.negative_hits = 0
+        self._local = threading.local()
+
+    def cache_key(self, url, **params):
+        """Returns the key under which the response for ``url`` is cached.
+        """
+        return make_key(url, params)
+
+    def cached(self, url, **params):
+        """Returns the cached response for ``url`` without contacting the
+        provider.
+
+        Returns
+        -------
+        dict or None
+            The response, ``NEGATIVE_RESULT`` for a failed lookup or ``None``
+            when nothing is cached.
+        """
+        return self.cache.get(self.cache_key(url, **params))
+
+    def fetch(self, url, provider, **params):
+        """Contacts the provider and caches the outcome.
+
+        Raises
+        ------
+        ProviderException
+            When the provider could not return an embed.
+        """
+        key = self.cache_key(url, **params)
+        try:
+            data = provider.request(url, **params)
+        except ProviderException:
+            self.cache.set(key, NEGATIVE_RESULT, self.negative_ttl)
+            raise
+        self.cache.set(key, data)
+        return data
+
+    def request(self, url, **params):
+        """Returns the oEmbed response for ``url``, from the cache if
+        possible.
+
+        Raises
+        ------
+        ProviderNotFoundException
+            When no provider handles the URL.
+        ProviderException
+            When the provider failed, now or recently.
+        """
+        provider = self.provider_for_url(url)
+        if not provider:
+            raise ProviderNotFoundException(f'Provider not found for "{url}"')
+        data = self.cached(url, **params)
+        if data == NEGATIVE_RESULT:
+            self.negative_hits += 1
+            raise ProviderException(f'Recent lookup for "{url}" failed')
+        if data is not None:
+            return data
+        return self.fetch(url, provider, **params)
+
+    def deferred_lookups(self):
+        """Returns how many URLs were left unresolved by the current thread.
+
+        A rendering which saw this number increase contains plain links in
+        place of embeds and should not be kept once they are resolved.
+        """
+        return getattr(self._local, 'deferred', 0)
+
+    def stats(self):
+        """Returns the counters of the cache.
+
+        Counters are kept per process even when the entries are shared.
+
+        Returns
+        -------
+        dict
+            Number of hits, misses, hits on failed lookups and entries.
+        """
+        return {'hits': self.cache.hits,
+                'misses': self.cache.misses,
+                'negative_hits': self.negative_hits,
+                'size': len(self.cache)}
+
+
+class AsyncProviderRegistry(CachingProviderRegistry):
+    """Provider registry resolving unknown URLs in background threads.
+
+    A URL missing from the cache is handed over to a thread pool and, in the
+    meantime, is reported as failed so that it gets rendered as a plain link.
+
+    Parameters
+    ----------
+    cache : MemoryCache or SQLiteCache
+        Where the responses of the providers are stored.
+    negative_ttl : int
+        Number of seconds a failed lookup is remembered.
+    workers : int
+        Maximum number of providers contacted at the same time.
+    max_pending : int
+        Maximum number of URLs waiting to be resolved. URLs found beyond
+        this limit are scheduled again on a later render.
+    on_resolved : callable
+        Called with the URL once its embed is in the cache.
+    """
+    def __init__(self, cache, negative_ttl=3600, workers=2, max_pending=100,
+                 on_resolved=None):
+        super().__init__(cache, negative_ttl)
+        self.max_pending = max_pending
+        self.on_resolved = on_resolved
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='oembed')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def request(self, url, **params):
+        """Returns the cached oEmbed response for ``url`` or schedules its
+        resolution.
+
+        Raises
+        ------
+        ProviderNotFoundException
+            When no provider handles the URL.
+        ProviderException
+            When the provider failed recently or the URL is not resolved yet.
+        """
+        provider = self.provider_for_url(url)
+        if not provider:
+            raise ProviderNotFoundException(f'Provider not found for "{url}"')
+        data = self.cached(url, **params)
+        if data == NEGATIVE_RESULT:
+            self.negative_hits += 1
+            raise ProviderException(f'Recent lookup for "{url}" failed')
+        if data is not None:
+            return data
+        self.schedule(url, provider, **params)
+        self._local.deferred = self.deferred_lookups() + 1
+        raise ProviderException(f'Embed for "{url}" is being resolved')
+
+    def schedule(self, url, provider, **params):
+        """Hands the lookup of ``url`` over to the thread pool.
+
+        Does nothing if the URL is already waiting or too many are.
+        """
+        key = self.cache_key(url, **params)
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                return
+            self._pending[key] = self.executor.submit(self._resolve, key, url,
+                                                      provider, params)
+
+    def _resolve(self, key, url, provider, params):
+        """Contacts the provider from a background thread.
+        """
+        try:
+            self.fetch(url, provider, **params)
+        except ProviderException:
+            return
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        if self.on_resolved:
+            self.on_resolved(url)
+
+    def join(self, timeout=None):
+        """Waits until the URLs scheduled so far are resolved.
+        """
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout)
+
+
+def make_oembed_cache(config):
+    """Creates the cache selected by ``OEMBED_CACHE_TYPE``.
+
+    Parameters
+    ----------
+    config : flask.Config
+        Configuration of the app.
+    """
+    if config['OEMBED_CACHE_TYPE'] == 'sqlite':
+        return SQLiteCache(config['OEMBED_CACHE_PATH'],
+                           maxsize=config['OEMBED_CACHE_MAXSIZE'],
+                           ttl=config['OEMBED_CACHE_TTL'])
+    return MemoryCache(maxsize=config['OEMBED_CACHE_MAXSIZE'],
+                       ttl=config['OEMBED_CACHE_TTL'])
+
+
+def discard_renderings_callback(app):
+    """Returns a function discarding the stored html containing a URL.
+
+    It is used by ``AsyncProviderRegistry`` once an embed is resolved so that
+    the plain link rendered in its place gets replaced.
+    """
+    def discard_renderings(url):
+        # Imported here since the models can't be loaded before the app.
+        from app.models import discard_renderings_containing
+        with app.app_context():
+            discard_renderings_containing(url)
+    return discard_renderings
+
+
+def init_oembed(app):
+    """Registers the default oEmbed providers (YouTube, Flickr, etc) with a
+    cache configured for the app.
+
+    The registry is made available in ``app.extensions['oembed']``. When
+    ``OEMBED_ASYNC`` is set the providers are contacted in background threads.
+
+    The responses are kept in memory in testing mode, whatever the
+    ``OEMBED_CACHE_TYPE``.
+    """
+    if app.testing:
+        cache = MemoryCache(maxsize=app.config['OEMBED_CACHE_MAXSIZE'],
+                            ttl=app.config['OEMBED_CACHE_TTL'])
+    else:
+        cache = make_oembed_cache(app.config)
+    if app.config['OEMBED_ASYNC']:
+        registry = AsyncProviderRegistry(
+            cache,
+            negative_ttl=app.config['OEMBED_NEGATIVE_TTL'],
+            workers=app.config['OEMBED_WORKERS'],
+            max_pending=app.config['OEMBED_MAX_PENDING'],
+            on_resolved=discard_renderings_callback(app))
+    else:
+        registry = CachingProviderRegistry(
+            cache, negative_ttl=app.config['OEMBED_NEGATIVE_TTL'])
+    bootstrap_basic(registry=registry)
+    for regex, provider in registry:
+        provider.socket_timeout = app.config['OEMBED_TIMEOUT']
+    app.extensions['oembed'] = registry
+    return registry
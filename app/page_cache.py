@@ -0,0 +1,445 @@
+"""Caches the pages served to anonymous visitors.
+
+The content of the blog only changes when the admin edits something, yet
+every visit used to render the whole page again. Responses to anonymous
+``GET`` requests are now stored in one of the backends below, keyed by their
+URL.
+
+Every cached page is labeled with tags naming the data it shows, like
+``post:<slug>``, ``category:<slug>``, ``sidebar`` or ``settings``. A tag is a
+version counter of the ``CacheVersion`` table: the write routes increment the
+tags of the pages they modify (see ``invalidate_pages``) and a cached page is
+only served while the versions of its tags are the ones it was rendered with.
+Since the versions are kept in the database, the pages cached by a worker
+process are invalidated by the writes made in the others.
+
+The same versions give the ``ETag`` and ``Last-Modified`` headers of the
+pages, so clients holding an up to date copy are answered with a 304, without
+anything being rendered when the page is in the cache.
+
+The cache is disabled in debug and testing mode. Validators are always sent.
+"""
+from base64 import b64decode, b64encode
+from functools import wraps
+from hashlib import sha1
+import json
+import os
+import tempfile
+import time
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from app.oembed import MemoryCache
+
+# Tags of the parts of the layout shown on every html page: the settings of
+# the ``controls`` blueprint, the content widgets, the post counts of the
+# categories widget and the pages linked in the navbar.
+LAYOUT_TAGS = ('settings', 'widgets', 'sidebar', 'navbar')
+
+
+class FilesystemPageCache:
+    """Cache storing each page in a file of a directory shared by all the
+    worker processes.
+
+    Parameters
+    ----------
+    directory : str
+        Where the files are written. Created if missing.
+    ttl : int
+        Number of seconds a page stays valid. ``None`` or ``0`` keeps pages
+        until they are invalidated.
+    clock : callable
+        Returns the current time in seconds.
+    """
+    def __init__(self, directory, ttl=None, clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, k):
+        return os.path.join(self.directory,
+                            sha1(k.encode('utf-8')).hexdigest())
+
+    def get(self, k):
+        """Returns the value stored under ``k`` or ``None``.
+        """
+        try:
+            with open(self._path(k), encoding='utf-8') as f:
+                expires, value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if expires is not None and expires <= self.clock():
+            self.delete(k)
+            return None
+        return value
+
+    def set(self, k, v, ttl=None):
+        """Stores ``v`` under ``k`` for ``ttl`` seconds.
+
+        The file is written under a temporary name and then renamed, so
+        other processes never read a partly written page.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = self.clock() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump([expires, v], f)
+        os.replace(tmp_path, self._path(k))
+
+    def delete(self, k):
+        """Removes the entry stored under ``k``.
+        """
+        try:
+            os.remove(self._path(k))
+        except FileNotFoundError:
+            pass
+
+
+class RedisPageCache:
+    """Cache storing the pages in a Redis server, or any server speaking its
+    protocol.
+
+    Parameters
+    ----------
+    client : redis.Redis
+        Connection to the server. Only its ``get``, ``set`` and ``delete``
+        methods are used.
+    ttl : int
+        Number of seconds a page stays valid. ``None`` or ``0`` keeps pages
+        until they are invalidated.
+    prefix : str
+        Added to the keys so the server can be shared with other apps.
+    """
+    def __init__(self, client, ttl=None, prefix='flaskypress:page:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, k):
+        """Returns the value stored under ``k`` or ``None``.
+        """
+        data = self.client.get(self.prefix + k)
+        return json.loads(data) if data is not None else None
+
+    def set(self, k, v, ttl=None):
+        """Stores ``v`` under ``k`` for ``ttl`` seconds.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + k, json.dumps(v), ex=ttl or None)
+
+    def delete(self, k):
+        """Removes the entry stored under ``k``.
+        """
+        self.client.delete(self.prefix + k)
+
+
+def make_page_cache(config):
+    """Creates the backend selected by ``PAGE_CACHE_TYPE``.
+
+    Parameters
+    ----------
+    config : flask.Config
+        Configuration of the app.
+
+    Returns
+    -------
+    The backend, or ``None`` when ``PAGE_CACHE_TYPE`` is ``"null"``.
+    """
+    cache_type = config['PAGE_CACHE_TYPE']
+    ttl = config['PAGE_CACHE_TTL']
+    if cache_type == 'filesystem':
+        return FilesystemPageCache(config['PAGE_CACHE_DIR'], ttl=ttl)
+    if cache_type == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The "redis" package must be installed to use '
+                               'PAGE_CACHE_TYPE = "redis".')
+        client = redis.Redis.from_url(config['PAGE_CACHE_REDIS_URL'])
+        return RedisPageCache(client, ttl=ttl)
+    if cache_type == 'memory':
+        return MemoryCache(maxsize=config['PAGE_CACHE_MAXSIZE'], ttl=ttl)
+    return None
+
+
+def files_version(*directories):
+    """Hash of the paths and the modification times of the files found in
+    some directories.
+
+    Parameters
+    ----------
+    directories : str
+        Directories searched recursively. Missing ones are ignored.
+    """
+    stamps = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stamps.append(f'{path}:{os.stat(path).st_mtime_ns}')
+    return sha1('|'.join(stamps).encode('utf-8')).hexdigest()
+
+
+def init_page_cache(app):
+    """Makes the backend of the page cache available in
+    ``app.extensions['page_cache']``, and the version of the templates in
+    ``app.extensions['page_cache_version']``.
+
+    No backend is created in debug and testing mode.
+    """
+    cache = None
+    if not app.debug and not app.testing:
+        cache = make_page_cache(app.config)
+    app.extensions['page_cache'] = cache
+    app.extensions['page_cache_version'] = (
+        app.config['PAGE_CACHE_VERSION'] or
+        files_version(os.path.join(app.root_path, app.template_folder),
+                      app.static_folder))
+    return cache
+
+
+def page_key():
+    """Key under which the page of the current request is cached.
+
+    Made of the URL, its query string included, the ``URL_PREFIX``, the
+    version of the renderer of the posts and the version of the templates
+    (see ``PAGE_CACHE_VERSION``), so a new version of Markdown, Pygments or
+    of the templates doesn't serve pages rendered by the previous one.
+    """
+    # Imported here since the models can't be loaded before the app.
+    from app.models import current_renderer_version
+    return '|'.join([current_app.config['URL_PREFIX'], request.url,
+                     current_renderer_version(),
+                     current_app.extensions['page_cache_version']])
+
+
+def cacheable_request():
+    """Tells if the page of the current request can be served from the cache
+    or stored in it.
+
+    Only ``GET`` requests of anonymous visitors without pending flash
+    messages are concerned.
+    """
+    return (request.method in ('GET', 'HEAD') and
+            not current_user.is_authenticated and
+            '_flashes' not in session)
+
+
+def page_etag(versions):
+    """Strong ETag of the page of the current request.
+
+    Parameters
+    ----------
+    versions : tuple
+        Versions of the tags of the page.
+    """
+    key = '|'.join([page_key()] + [str(v) for v in versions])
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+def not_modified(etag, modified):
+    """Tells if the copy of the page held by the client is still valid.
+
+    ``If-None-Match`` takes precedence over ``If-Modified-Since``, as
+    required by the HTTP specification.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and modified is not None:
+        return modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def not_modified_response(etag, modified):
+    """Empty 304 response telling the client its copy is still valid.
+    """
+    response = current_app.response_class(status=304)
+    set_validators(response, etag, modified)
+    return response
+
+
+def set_validators(response, etag, modified):
+    """Adds the ``ETag`` and ``Last-Modified`` headers to a response.
+
+    ``Cache-Control: no-cache`` makes the browsers check the validators
+    before showing their copy, instead of guessing how long it stays fresh.
+    """
+    response.set_etag(etag)
+    if modified is not None:
+        response.last_modified = modified
+    response.cache_control.no_cache = True
+
+
+def make_entry(data):
+    """Stores the body of a page in an entry of the cache.
+
+    Bodies that aren't text, like the compressed sitemaps, are encoded in
+    base64 since the entries are saved as JSON.
+    """
+    try:
+        return {'body': data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'data': b64encode(data).decode('ascii')}
+
+
+def entry_body(entry):
+    """Body of the page stored in an entry of the cache.
+    """
+    if 'body' in entry:
+        return entry['body']
+    return b64decode(entry['data'])
+
+
+def tee_response(response, callback):
+    """Calls ``callback`` with the whole body of a streamed response once it
+    has been sent.
+
+    The body is gathered while it is sent, so only pages whose size is
+    bounded, like the chunks of the sitemap, should be streamed through the
+    cache. Nothing is stored if the client disconnects before the end.
+    """
+    original = response.response
+    pieces = response.iter_encoded()
+
+    def generate():
+        body = []
+        try:
+            for piece in pieces:
+                body.append(piece)
+                yield piece
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+        callback(b''.join(body))
+    response.response = generate()
+
+
+def cached_page(*tags, layout=True):
+    """Decorator caching the responses of a view for anonymous visitors.
+
+    The responses also get an ``ETag`` and a ``Last-Modified`` header,
+    derived from the versions of the tags. Requests whose validators match
+    are answered with a 304, before the view is called when the page is
+    found in the cache. Otherwise the view must first return a 200, so an
+    URL that doesn't exist, or no longer does, is never answered with a 304.
+
+    Parameters
+    ----------
+    tags : str
+        Tags of the data shown by the page. They can contain fields replaced
+        by the arguments of the view, ``'post:{slug}'`` for instance.
+    layout : bool
+        When True, the default, the page also gets the tags of the layout
+        (``LAYOUT_TAGS``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if not cacheable_request():
+                return view(**kwargs)
+            from app.models import get_version_states
+            page_tags = [t.format(**kwargs) for t in tags]
+            if layout:
+                page_tags.extend(LAYOUT_TAGS)
+            # Versions are read before rendering. A write happening in the
+            # meantime leaves the page with outdated versions, never the
+            # opposite.
+            versions, modified = get_version_states(*page_tags)
+            etag = page_etag(versions)
+            cache = current_app.extensions.get('page_cache')
+            key = page_key()
+            if cache is not None:
+                entry = cache.get(key)
+                if entry is not None:
+                    # Only an URL known to exist is answered with a 304
+                    # before the view is called.
+                    if (entry['versions'] == list(versions) and
+                            entry['status'] == 200):
+                        if not_modified(etag, modified):
+                            return not_modified_response(etag, modified)
+                        response = make_response(entry_body(entry),
+                                                 entry['status'])
+                        response.headers['Content-Type'] = \
+                            entry['content_type']
+                        response.headers['X-Page-Cache'] = 'HIT'
+                        set_validators(response, etag, modified)
+                        return response
+                    cache.delete(key)
+            registry = current_app.extensions['oembed']
+            deferred = registry.deferred_lookups()
+            response = make_response(view(**kwargs))
+            # Pages showing embeds still being resolved in the background
+            # will change without their tags being modified. They get
+            # neither validators nor a place in the cache.
+            if response.status_code == 200 and cacheable_request() and \
+                    registry.deferred_lookups() == deferred:
+                if not_modified(etag, modified):
+                    return not_modified_response(etag, modified)
+                set_validators(response, etag, modified)
+                if cache is not None:
+                    def store(data, response=response):
+                        entry = make_entry(data)
+                        entry.update(status=response.status_code,
+                                     content_type=response.content_type,
+                                     versions=list(versions))
+                        cache.set(key, entry)
+                    if response.is_streamed:
+                        tee_response(response, store)
+                    else:
+                        store(response.get_data())
+            if cache is not None:
+                response.headers['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_pages(*tags):
+    """Increments the versions of some tags so the pages labeled with them
+    are rendered again.
+
+    Changes are not committed, so they become part of the transaction of the
+    write that modified the pages.
+
+    Parameters
+    ----------
+    tags : str
+        Tags of the modified data.
+    """
+    from app.models import bump_version
+    for tag in set(tags):
+        bump_version(tag)
+
+
+def post_tags(slug, categories):
+    """Tags of the pages showing a post.
+
+    ``sidebar`` is not part of them. It only needs to be invalidated when the
+    post counts of the categories change.
+
+    Parameters
+    ----------
+    slug : str
+        Slug of the post.
+    categories : list
+        Categories the post is posted under.
+    """
+    tags = ['index', f'post:{slug}']
+    if categories:
+        tags.extend(f'category:{c.slug}' for c in categories)
+    else:
+        tags.append('category:uncategorized')
+    return tags
+
+
+def page_tags(slug):
+    """Tags of the pages showing a page, the ones created with the ``pages``
+    blueprint.
+
+    Parameters
+    ----------
+    slug : str
+        Slug of the page.
+    """
+    return ['index', 'navbar', f'post:{slug}']
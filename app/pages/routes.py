@@ -4,8 +4,9 @@ from app import db
 from app.pages.forms import PageForm
 from app.models import Post
 from app.pages import bp
+from app.page_cache import invalidate_pages, page_tags
 from sqlalchemy import exc
-from datetime import datetime
+from sqlalchemy.orm import load_only
 
 
 @bp.route('/pages')
@@ -14,9 +15,12 @@ def index():
     """List all the pages we created.
     """
     title = 'Page Index'
+    # Only the titles are listed, the bodies of the pages are not loaded.
     published_pages = (Post.query.filter_by(is_page=True, is_published=True)
+                       .options(load_only('slug', 'title'))
                        .order_by(Post.timestamp.desc())).all()
     draft_pages = (Post.query.filter_by(is_page=True, is_published=False)
+                   .options(load_only('slug', 'title'))
                    .order_by(Post.timestamp.desc())).all()
     return render_template('pages/index.html', published_pages=published_pages,
                            draft_pages=draft_pages,
@@ -37,12 +41,14 @@ def create():
                     is_page=True)
         page.slugify_title()
         if form.preview.data:
-            page.timestamp = datetime.utcnow()
-            session['post'] = page
+            session['preview'] = page.preview_data()
             return redirect(url_for('main.preview', slug=page.slug))
         else:
+            page.refresh_html()
             try:
                 db.session.add(page)
+                if page.is_published:
+                    invalidate_pages(*page_tags(page.slug))
                 db.session.commit()
             except exc.IntegrityError:
                 db.session.rollback()
@@ -69,6 +75,7 @@ def edit(slug):
     """
     title = 'Edit Page'
     page = Post.query.filter_by(slug=slug, is_page=True).first_or_404()
+    was_published = page.is_published
     form = PageForm()
     if form.validate_on_submit():
         page.title = form.title_field.data
@@ -77,10 +84,13 @@ def edit(slug):
         page.is_page = True
         page.slugify_title()
         if form.preview.data:
-            session['post'] = page
+            session['preview'] = page.preview_data()
             return redirect(url_for('main.preview', slug=page.slug))
         else:
+            page.refresh_html()
             try:
+                if was_published or page.is_published:
+                    invalidate_pages(*page_tags(slug), *page_tags(page.slug))
                 db.session.commit()
             except exc.IntegrityError:
                 db.session.rollback()
@@ -113,6 +123,8 @@ def delete(slug):
     title = 'Delete Page'
     page = Post.query.filter_by(slug=slug, is_page=True)
     if request.method == 'POST':
+        if page.first_or_404().is_published:
+            invalidate_pages(*page_tags(slug))
         page.delete()
         db.session.commit()
         flash('Page deleted.', 'success')
@@ -1,10 +1,13 @@
 """Integrates global functions for use in our templates.
 """
+from app import db
 from app.pages import bp
+from app.memo import request_memoized
 from app.models import Post
 
 
 @bp.app_template_global()
+@request_memoized
 def page_exists():
     """Tells us if the db contains pages.
 
@@ -15,16 +18,26 @@ def page_exists():
     return Post.query.filter_by(is_page=True).first()
 
 
-@bp.app_context_processor
-def published_pages():
-    """Get all published pages from the db.
+@request_memoized
+def published_page_links():
+    """Get the slug and title of the published pages, all the navbar needs.
+
+    Only these two columns are read, not the body of the pages.
 
     return
     ------
-        Dictionary containing a list of the pages objects.
+        List of named tuples with ``slug`` and ``title`` attributes.
     """
-    p = Post.query.filter_by(is_page=True, is_published=True).all()
-    return dict(published_pages=p)
+    return (db.session.query(Post.slug, Post.title)
+            .filter_by(is_page=True, is_published=True).all())
 
 
+@bp.app_context_processor
+def published_pages():
+    """Get all published pages from the db.
 
+    return
+    ------
+        Dictionary containing a list of the pages slugs and titles.
+    """
+    return dict(published_pages=published_page_links())
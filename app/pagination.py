@@ -0,0 +1,165 @@
+"""Pagination of the listings of posts.
+
+By default the listings are paginated with ``?page=N``, which needs a COUNT
+query and an OFFSET growing with the page number. With ``PAGINATION`` set to
+``"keyset"`` the links of the listings hold instead the ``(timestamp, id)``
+of the last post shown, ``?after=<cursor>``, or of the first one,
+``?before=<cursor>``. The next page is read from the index on the timestamp,
+wherever it is in the archive, and no COUNT is needed. Links using
+``?page=N`` keep working in both modes.
+"""
+from datetime import datetime
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+from app.models import Post, listing_options
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def make_cursor(post):
+    """Cursor pointing at a post of a listing.
+    """
+    return f'{post.timestamp.strftime(CURSOR_FORMAT)}-{post.id}'
+
+
+def parse_cursor(cursor):
+    """Returns the timestamp and id held by a cursor, or ``None`` if it is
+    malformed.
+    """
+    try:
+        timestamp, post_id = cursor.split('-')
+        return datetime.strptime(timestamp, CURSOR_FORMAT), int(post_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def seek(query, cursor, older):
+    """Reads the posts found after a cursor.
+
+    Parameters
+    ----------
+    query : flask_sqlalchemy.BaseQuery
+        The posts of the listing.
+    cursor : tuple
+        Timestamp and id of the post to start from.
+    older : bool
+        If True reads the older posts, else the more recent ones.
+
+    Returns
+    -------
+    list
+        At most ``POSTS_PER_PAGE + 1`` posts, from the closest to the
+        cursor. The extra post tells if there is another page after them.
+    """
+    timestamp, post_id = cursor
+    per_page = current_app.config['POSTS_PER_PAGE']
+    if older:
+        condition = or_(Post.timestamp < timestamp,
+                        and_(Post.timestamp == timestamp, Post.id < post_id))
+        order = (Post.timestamp.desc(), Post.id.desc())
+    else:
+        condition = or_(Post.timestamp > timestamp,
+                        and_(Post.timestamp == timestamp, Post.id > post_id))
+        order = (Post.timestamp.asc(), Post.id.asc())
+    return query.filter(condition).order_by(*order).limit(per_page + 1).all()
+
+
+def keyset_page(query, endpoint, values):
+    """Reads the page of the listing asked by the current request, in keyset
+    mode. See ``paginate_listing``.
+    """
+    per_page = current_app.config['POSTS_PER_PAGE']
+    after = parse_cursor(request.args.get('after'))
+    before = parse_cursor(request.args.get('before'))
+    page = request.args.get('page', 1, type=int)
+    has_prev = False
+    if before:
+        posts = seek(query, before, older=False)
+        # Near the start of the listing the first page is shown in full.
+        if len(posts) <= per_page:
+            return keyset_page_from_start(query, endpoint, values)
+        posts = posts[per_page - 1::-1]
+        has_next = has_prev = True
+    else:
+        if after:
+            posts = seek(query, after, older=True)
+            has_prev = True
+        else:
+            posts = (query.order_by(Post.timestamp.desc(), Post.id.desc())
+                     .offset((max(page, 1) - 1) * per_page)
+                     .limit(per_page + 1).all())
+            has_prev = page > 1
+        has_next = len(posts) > per_page
+        posts = posts[:per_page]
+    next_url = prev_url = None
+    if has_next and posts:
+        next_url = url_for(endpoint, after=make_cursor(posts[-1]), **values)
+    if has_prev and posts:
+        prev_url = url_for(endpoint, before=make_cursor(posts[0]), **values)
+    return posts, next_url, prev_url
+
+
+def keyset_page_from_start(query, endpoint, values):
+    """First page of a listing, in keyset mode.
+    """
+    per_page = current_app.config['POSTS_PER_PAGE']
+    posts = (query.order_by(Post.timestamp.desc(), Post.id.desc())
+             .limit(per_page + 1).all())
+    next_url = None
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        next_url = url_for(endpoint, after=make_cursor(posts[-1]), **values)
+    return posts, next_url, None
+
+
+def paginate_listing(query, endpoint, ordered=True, **values):
+    """Reads the page of a listing asked by the current request.
+
+    Parameters
+    ----------
+    query : flask_sqlalchemy.BaseQuery
+        The posts of the listing, without ``order_by``. Their bodies are not
+        loaded, see ``listing_options``.
+    endpoint : str
+        Endpoint of the listing, used to build the links to the other pages.
+    ordered : bool
+        When False the posts are kept in the order given by the query, as
+        the search results sorted by relevance are. They have no cursor, so
+        they are paginated with ``?page=N``. In keyset mode the COUNT query
+        is still avoided.
+    values :
+        Other arguments of the endpoint.
+
+    Returns
+    -------
+    posts : list
+        The posts of the page.
+    next_url, prev_url : str
+        Links to the adjacent pages, ``None`` when there is no such page.
+    """
+    per_page = current_app.config['POSTS_PER_PAGE']
+    keyset = current_app.config['PAGINATION'] == 'keyset'
+    query = query.options(*listing_options())
+    if keyset and ordered:
+        return keyset_page(query, endpoint, values)
+    page = max(request.args.get('page', 1, type=int), 1)
+    if ordered:
+        # Same order as in keyset mode, so posts sharing a timestamp keep
+        # their page.
+        query = query.order_by(Post.timestamp.desc(), Post.id.desc())
+    if keyset:
+        posts = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        has_next, has_prev = len(posts) > per_page, page > 1
+        next_num, prev_num = page + 1, page - 1
+        posts = posts[:per_page]
+    else:
+        pagination = query.paginate(page, per_page, False)
+        posts = pagination.items
+        has_next, has_prev = pagination.has_next, pagination.has_prev
+        next_num, prev_num = pagination.next_num, pagination.prev_num
+    next_url = prev_url = None
+    if has_next:
+        next_url = url_for(endpoint, page=next_num, **values)
+    if has_prev:
+        prev_url = url_for(endpoint, page=prev_num, **values)
+    return posts, next_url, prev_url
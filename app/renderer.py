@@ -0,0 +1,374 @@
+"""Converts the markdown of the posts, pages and content widgets to html.
+
+Building a ``markdown.Markdown`` instance registers every extension, which
+compiles their regular expressions and sets up their processors. That work
+used to be done again for each document. Each thread now keeps its own
+instance, built on first use and reset after each document, since an
+instance can't convert two documents at the same time.
+
+The code blocks are highlighted by Pygments, which takes most of the time
+spent on technical posts. The html of each block is kept in a cache keyed by
+a hash of its source and of the highlighting options, so a block already
+seen in a post, a draft or a preview is not highlighted again. The cache is
+selected by ``HIGHLIGHT_CACHE_TYPE``.
+
+Long documents are split into their top-level blocks, separated by blank
+lines, and the final html of each block is kept in the memory of the
+process. Previewing an edited post then only renders the blocks that
+changed. The html is the same as when the document is rendered at once.
+Documents holding constructs that link blocks together, like reference
+links, footnotes, abbreviations, definition lists and raw html, are always
+rendered at once (see ``split_blocks``).
+
+The gains are measured by ``benchmarks/markdown_render.py``.
+"""
+from hashlib import sha1
+import json
+import re
+import threading
+from flask import Markup, current_app, has_app_context
+from markdown import Markdown
+from markdown.extensions.codehilite import (CodeHilite, CodeHiliteExtension,
+                                            HiliteTreeprocessor,
+                                            parse_hl_lines)
+from markdown.extensions.extra import ExtraExtension
+from markdown.extensions.fenced_code import (FencedBlockPreprocessor,
+                                             FencedCodeExtension)
+import pygments
+# micawber_bs4_classes is a modified version of the micawber module:
+# https://pypi.org/project/micawber/
+# our version adds bootstrap 4 classes to the embeds and make them responsive.
+from micawber_bs4_classes import parse_html
+
+from app.oembed import MemoryCache, SQLiteCache
+
+_local = threading.local()
+
+# Lines defining a target usable from any block: reference links, footnotes
+# and abbreviations. Also the lines starting raw html or the definition of a
+# definition list, which can hold or join several blocks.
+LINKING_LINE_RE = re.compile(r'^ {0,3}(\*?\[[^\]]+\]:|<|:[ \t])', re.M)
+READ_MORE_TAG = '[read_more]'
+FENCE_RE = re.compile(r'^(`{3,}|~{3,})')
+# Lines that, even after a blank line, may belong to the previous block: an
+# indented line, a list item or a quote.
+CONTINUATION_RE = re.compile(r'( {4}|\t| {0,3}([*+-]|\d+\.)[ \t]| {0,3}>)')
+
+
+def make_highlight_cache(config):
+    """Creates the cache selected by ``HIGHLIGHT_CACHE_TYPE``, or returns
+    ``None`` when the code blocks are always highlighted.
+
+    Parameters
+    ----------
+    config : flask.Config
+        Configuration of the app.
+    """
+    cache_type = config['HIGHLIGHT_CACHE_TYPE']
+    if cache_type == 'sqlite':
+        return SQLiteCache(config['HIGHLIGHT_CACHE_PATH'],
+                           maxsize=config['HIGHLIGHT_CACHE_MAXSIZE'],
+                           table='highlight_cache')
+    if cache_type == 'memory':
+        return MemoryCache(maxsize=config['HIGHLIGHT_CACHE_MAXSIZE'])
+    return None
+
+
+def init_renderer(app):
+    """Makes the cache of the highlighted code blocks available in
+    ``app.extensions['highlight_cache']`` and the one of the rendered blocks
+    in ``app.extensions['block_cache']``.
+    """
+    cache = make_highlight_cache(app.config)
+    app.extensions['highlight_cache'] = cache
+    maxsize = app.config['BLOCK_CACHE_MAXSIZE']
+    app.extensions['block_cache'] = MemoryCache(maxsize) if maxsize else None
+    return cache
+
+
+def highlight_cache():
+    """Returns the cache of the current app, ``None`` outside of an app
+    context or when disabled.
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('highlight_cache')
+
+
+def split_blocks(text):
+    """Splits a markdown document into blocks that render the same html
+    separately as together.
+
+    A block ends at a blank line followed by a line which can't continue it.
+    Fenced code blocks are never split.
+
+    Parameters
+    ----------
+    text : str
+        The markdown document.
+
+    Returns
+    -------
+    list
+        The blocks, or ``None`` if the document holds a construct linking
+        blocks together and must be rendered at once.
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if LINKING_LINE_RE.search(text):
+        return None
+    blocks, lines, fence, blank = [], [], None, False
+    for line in text.split('\n'):
+        if fence:
+            lines.append(line)
+            if line.rstrip(' ') == fence:
+                fence = None
+            continue
+        if not line.strip():
+            blank = True
+            lines.append(line)
+            continue
+        if blank and any(l.strip() for l in lines) and \
+                not CONTINUATION_RE.match(line):
+            blocks.append('\n'.join(lines))
+            lines = []
+        blank = False
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        lines.append(line)
+    if fence:
+        # An unclosed fence is not a code block, leave it to Markdown.
+        return None
+    if any(l.strip() for l in lines):
+        blocks.append('\n'.join(lines))
+    return blocks
+
+
+class CachedCodeHilite(CodeHilite):
+    """Highlights a code block, reusing the html of an identical block.
+    """
+    def cache_key(self):
+        """Hash of the source and of every option changing the html.
+
+        The language line of the block is part of the source. The blank
+        lines around it are not, as ``hilite`` strips them.
+        """
+        options = [pygments.__version__, self.src.strip('\n'), self.lang,
+                   self.linenums, self.guess_lang, self.css_class,
+                   self.style, self.noclasses, self.tab_length,
+                   self.hl_lines, self.use_pygments]
+        digest = sha1(json.dumps(options).encode('utf-8')).hexdigest()
+        return 'hilite:' + digest
+
+    def hilite(self):
+        cache = highlight_cache()
+        if cache is None:
+            return super().hilite()
+        key = self.cache_key()
+        html = cache.get(key)
+        if html is None:
+            html = super().hilite()
+            cache.set(key, html)
+        return html
+
+
+class CachedHiliteTreeprocessor(HiliteTreeprocessor):
+    """Same as the one of CodeHilite, highlighting with ``CachedCodeHilite``.
+    """
+    def run(self, root):
+        for block in root.iter('pre'):
+            if len(block) == 1 and block[0].tag == 'code':
+                code = CachedCodeHilite(
+                    self.code_unescape(block[0].text),
+                    linenums=self.config['linenums'],
+                    guess_lang=self.config['guess_lang'],
+                    css_class=self.config['css_class'],
+                    style=self.config['pygments_style'],
+                    noclasses=self.config['noclasses'],
+                    tab_length=self.md.tab_length,
+                    use_pygments=self.config['use_pygments'])
+                placeholder = self.md.htmlStash.store(code.hilite())
+                block.clear()
+                block.tag = 'p'
+                block.text = placeholder
+
+
+class CachedCodeHiliteExtension(CodeHiliteExtension):
+    """CodeHilite extension keeping the highlighted code blocks in
+    ``highlight_cache``.
+    """
+    def extendMarkdown(self, md):
+        hiliter = CachedHiliteTreeprocessor(md)
+        hiliter.config = self.getConfigs()
+        md.treeprocessors.register(hiliter, 'hilite', 30)
+        md.registerExtension(self)
+
+
+class CachedFencedBlockPreprocessor(FencedBlockPreprocessor):
+    """Same as the one of FencedCode, highlighting with ``CachedCodeHilite``.
+
+    The highlighter is created in the middle of ``run``, which is copied
+    from Markdown 3.1.
+    """
+    def run(self, lines):
+        if not self.checked_for_codehilite:
+            for ext in self.md.registeredExtensions:
+                if isinstance(ext, CodeHiliteExtension):
+                    self.codehilite_conf = ext.config
+                    break
+            self.checked_for_codehilite = True
+        conf = self.codehilite_conf
+        text = '\n'.join(lines)
+        while True:
+            m = self.FENCED_BLOCK_RE.search(text)
+            if not m:
+                break
+            if conf:
+                code = CachedCodeHilite(
+                    m.group('code'),
+                    linenums=conf['linenums'][0],
+                    guess_lang=conf['guess_lang'][0],
+                    css_class=conf['css_class'][0],
+                    style=conf['pygments_style'][0],
+                    use_pygments=conf['use_pygments'][0],
+                    lang=(m.group('lang') or None),
+                    noclasses=conf['noclasses'][0],
+                    hl_lines=parse_hl_lines(m.group('hl_lines'))).hilite()
+            else:
+                lang = ''
+                if m.group('lang'):
+                    lang = self.LANG_TAG % m.group('lang')
+                code = self.CODE_WRAP % (lang, self._escape(m.group('code')))
+            placeholder = self.md.htmlStash.store(code)
+            text = f'{text[:m.start()]}\n{placeholder}\n{text[m.end():]}'
+        return text.split('\n')
+
+
+class CachedFencedCodeExtension(FencedCodeExtension):
+    """FencedCode extension keeping the highlighted code blocks in
+    ``highlight_cache``.
+
+    Must come after ``ExtraExtension``, whose fenced code preprocessor it
+    replaces.
+    """
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        md.preprocessors.register(CachedFencedBlockPreprocessor(md),
+                                  'fenced_code_block', 25)
+
+
+def new_markdown():
+    """Builds a Markdown converter with the extensions used by the blog.
+    """
+    return Markdown(extensions=[CachedCodeHiliteExtension(linenums=False),
+                                ExtraExtension(),
+                                CachedFencedCodeExtension()])
+
+
+def thread_markdown():
+    """Returns the Markdown converter of the current thread.
+    """
+    md = getattr(_local, 'markdown', None)
+    if md is None:
+        md = _local.markdown = new_markdown()
+    return md
+
+
+def convert(text):
+    """Converts a markdown document to html.
+
+    Parameters
+    ----------
+    text : str
+        The markdown document.
+
+    Returns
+    -------
+    str
+        The html, without the embeds.
+    """
+    md = thread_markdown()
+    try:
+        return md.convert(text)
+    finally:
+        # Footnotes, abbreviations, etc. must not leak into the next document.
+        md.reset()
+
+
+def split_read_more(html):
+    """Splits the html of a post at its ``[read_more]`` tag.
+
+    Parameters
+    ----------
+    html : str
+        Rendered html of the post.
+
+    Returns
+    -------
+    excerpt : str
+        The html found before the tag, shown in the listings. ``None`` if the
+        post has no tag.
+    html : str
+        The html without the tag.
+    """
+    excerpt, tag, rest = html.partition(READ_MORE_TAG)
+    if not tag:
+        return None, html
+    return excerpt, excerpt + rest
+
+
+def render_block(text):
+    """Converts markdown into html and media urls into embeds, at once.
+    """
+    # The OEmbed providers are registered by ``app.oembed.init_oembed`` with
+    # a cache so that multiple requests for the same video don't require
+    # multiple network requests.
+    return parse_html(convert(text), current_app.extensions['oembed'],
+                      urlize_all=True)
+
+
+def cached_block(cache, text):
+    """Returns the html of a block, rendering it if it is not cached.
+
+    A block showing embeds still being resolved in the background is not
+    cached, its plain links will be replaced later.
+    """
+    from app.models import current_renderer_version
+    key = 'block:' + sha1(json.dumps([current_renderer_version(), text])
+                          .encode('utf-8')).hexdigest()
+    html = cache.get(key)
+    if html is None:
+        providers = current_app.extensions['oembed']
+        deferred = providers.deferred_lookups()
+        html = render_block(text)
+        if providers.deferred_lookups() == deferred:
+            cache.set(key, html)
+    return html
+
+
+def render(text):
+    """Converts markdown into html and media urls into embeds.
+
+    Documents made of several blocks are rendered block by block, reusing
+    the html of the unchanged blocks (see ``split_blocks``).
+
+    Parameters
+    ----------
+    text : str
+        The markdown document.
+
+    Returns
+    -------
+    class 'flask.Markup'
+        The html, with media URLs turned into embeds and the other URLs into
+        links.
+    """
+    cache = current_app.extensions.get('block_cache')
+    blocks = split_blocks(text) if cache is not None else None
+    if blocks is None or len(blocks) < 2:
+        html = render_block(text)
+    else:
+        html = '\n'.join(cached_block(cache, block) for block in blocks)
+    # If the html was returned without using 'Markup()' it would be shown as
+    # text on the page instead of being rendered.
+    return Markup(html)
@@ -0,0 +1,274 @@
+"""Renders again the stored html of every post, page and content widget.
+
+Upgrading Markdown or Pygments, changing ``STYLE_EMBED`` or incrementing
+``RENDERER_REVISION`` makes every stored rendering stale. Each one would
+then be generated again by the first request showing it, which is far too
+slow for a large archive. ``rerender_all`` does the work up front:
+
+- The ids and contents of the stale entries are streamed from the database
+  with ``yield_per``, in windows of a few batches ordered by id.
+- The batches are converted by a pool of processes, each with its own app.
+- The results are written with one bulk update per batch, each batch in its
+  own transaction. An entry whose content was edited in the meantime is
+  left as is (see ``app.models.rendering_update``).
+
+An interrupted run loses at most the batches not written yet. Since the
+entries already written carry the current renderer version, running it again
+only renders the ones left. A run rendering every entry, stale or not,
+records instead the last entries it wrote in a checkpoint file and resumes
+from there.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import json
+import os
+from flask import current_app
+from sqlalchemy import or_
+from app import db, create_app
+from app.models import (Category, ContentWidget, Post,
+                        current_renderer_version, rendering_update)
+from app.page_cache import invalidate_pages
+
+MODELS = {'post': Post, 'widget': ContentWidget}
+
+# App context of the worker processes, created once per process.
+_worker_context = None
+
+
+def stale_query(model, columns=()):
+    """Entries of a model whose stored html is missing or stale.
+
+    Parameters
+    ----------
+    model : class
+        ``Post`` or ``ContentWidget``.
+    columns : tuple
+        Columns to select. The whole entries when empty.
+    """
+    query = db.session.query(*columns) if columns else model.query
+    return query.filter(or_(model.rendered_html.is_(None),
+                            model.renderer_version.is_(None),
+                            model.renderer_version !=
+                            current_renderer_version()))
+
+
+def entries_query(model, columns=(), force=False):
+    """Entries of a model to render: the stale ones, or all of them when
+    ``force`` is True. See ``stale_query`` for the parameters.
+    """
+    if not force:
+        return stale_query(model, columns)
+    return db.session.query(*columns) if columns else model.query
+
+
+def render_rows(name, rows):
+    """Renders the contents of some entries.
+
+    Parameters
+    ----------
+    name : str
+        Key of the model in ``MODELS``.
+    rows : list
+        ``(id, content)`` of the entries.
+
+    Returns
+    -------
+    list
+        Parameters of ``rendering_update`` for each entry.
+    """
+    model = MODELS[name]
+    params = []
+    for entry_id, content in rows:
+        # Transient entry, only used to run the renderer of the model.
+        entry = model(content=content)
+        entry.render_html()
+        values = entry.rendering_values()
+        values.update(_id=entry_id, _content=content)
+        params.append(values)
+    return params
+
+
+def _init_worker(config):
+    """Creates the app used by a worker process.
+
+    The workers don't read the database, but the renderer needs the
+    configuration and the extensions of an app.
+    """
+    global _worker_context
+    app = create_app(type('RerenderConfig', (), config))
+    _worker_context = app.app_context()
+    _worker_context.push()
+
+
+def read_window(model, last_id, batch_size, batches, force):
+    """Yields the ``(id, content)`` of the next entries to render.
+
+    Parameters
+    ----------
+    model : class
+        ``Post`` or ``ContentWidget``.
+    last_id : int
+        Only the entries with a greater id are read.
+    batch_size : int
+        Number of rows fetched at once.
+    batches : int
+        Number of batches in the window.
+    force : bool
+        If True every entry is read, not only the stale ones.
+    """
+    query = (entries_query(model, (model.id, model.content), force)
+             .filter(model.id > last_id).order_by(model.id)
+             .limit(batch_size * batches))
+    return iter(query.yield_per(batch_size))
+
+
+def write_batch(model, params):
+    """Stores the renderings of a batch with a single UPDATE executed for
+    every entry of the batch.
+
+    Only the rendering columns are written, so no page cache version is
+    incremented here. See ``rerender_all``.
+    """
+    db.session.execute(rendering_update(model), params)
+    db.session.commit()
+
+
+def read_checkpoint(path):
+    """Returns the last ids written by an interrupted run, by key of
+    ``MODELS``. Empty when there is no checkpoint.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_checkpoint(path, last_ids):
+    """Records the last ids written, replacing the file at once so an
+    interruption never leaves it half written.
+    """
+    with open(path + '.tmp', 'w') as f:
+        json.dump(last_ids, f)
+    os.replace(path + '.tmp', path)
+
+
+def rerender_model(name, pool, batch_size, window, force, last_id, written):
+    """Renders again the entries of a model found after an id.
+
+    See ``rerender_all`` for the other parameters.
+
+    Parameters
+    ----------
+    last_id : int
+        Id of the last entry already rendered, 0 to start from the first.
+    written : callable
+        Called after each batch with the number of entries written and the
+        id of the last one.
+
+    Returns
+    -------
+    int
+        Number of entries rendered.
+    """
+    model = MODELS[name]
+    rendered = 0
+    while True:
+        rows = read_window(model, last_id, batch_size, window, force)
+        jobs = []
+        # The window is read in full before anything is written, so the
+        # cursor is closed when the transactions of the batches start.
+        while True:
+            batch = [tuple(row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            if pool is None:
+                jobs.append(render_rows(name, batch))
+            else:
+                jobs.append(pool.submit(render_rows, name, batch))
+        if not jobs:
+            return rendered
+        for job in jobs:
+            params = job if pool is None else job.result()
+            write_batch(model, params)
+            rendered += len(params)
+            written(len(params), params[-1]['_id'])
+
+
+def rerender_all(workers=1, batch_size=100, force=False, progress=None,
+                 checkpoint=None):
+    """Renders again the stale html of every post, page and content widget.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes rendering the entries. With a single worker the
+        entries are rendered by the current process.
+    batch_size : int
+        Number of entries sent to a worker and written at once.
+    force : bool
+        If True every entry is rendered, not only the stale ones.
+    progress : callable
+        Called with the number of entries written after each batch.
+    checkpoint : str
+        Path of the file recording the last entries written when ``force``
+        is True. The run starts after them and removes the file once it
+        completes. Defaults to ``RERENDER_CHECKPOINT_PATH``.
+
+    Returns
+    -------
+    dict
+        Number of entries rendered, by key of ``MODELS``.
+    """
+    if checkpoint is None:
+        checkpoint = current_app.config['RERENDER_CHECKPOINT_PATH']
+    last_ids = read_checkpoint(checkpoint) if force else {}
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker,
+                                   initargs=(dict(current_app.config),))
+    counts = {}
+    try:
+        for name in MODELS:
+            def written(count, last_id, name=name):
+                if force:
+                    last_ids[name] = last_id
+                    write_checkpoint(checkpoint, last_ids)
+                if progress is not None:
+                    progress(count)
+            counts[name] = rerender_model(name, pool, batch_size,
+                                          workers * 2, force,
+                                          last_ids.get(name, 0), written)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if force and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    if any(counts.values()):
+        # Every page showing the layout carries the ``widgets`` tag. The
+        # feeds and the sitemap don't, hence the tags of the listings.
+        slugs = [slug for slug, in db.session.query(Category.slug)]
+        invalidate_pages('widgets', 'index', 'category:uncategorized',
+                         *[f'category:{slug}' for slug in slugs])
+        db.session.commit()
+    return counts
+
+
+def pending_count(force=False, checkpoint=None):
+    """Number of entries, all models included, ``rerender_all`` would
+    render. See it for the parameters.
+    """
+    if checkpoint is None:
+        checkpoint = current_app.config['RERENDER_CHECKPOINT_PATH']
+    last_ids = read_checkpoint(checkpoint) if force else {}
+    return sum(entries_query(model, force=force)
+               .filter(model.id > last_ids.get(name, 0)).count()
+               for name, model in MODELS.items())
+
+
+def stale_count():
+    """Number of entries, all models included, whose html is stale.
+    """
+    return sum(stale_query(model).count() for model in MODELS.values())
@@ -0,0 +1,147 @@
+"""Keeps the schema of an existing database in step with our models.
+
+``db.create_all()`` creates the tables that are missing but never modifies the
+ones already existing. The functions found here bring a database created by an
+older version of the app up to date. They are safe to run repeatedly and work
+with both SQLite and PostgreSQL.
+
+They are run by the ``flask upgrade-schema`` command, once per deploy rather
+than by every worker process, since they don't lock the tables they modify.
+"""
+from sqlalchemy import Integer, func, inspect
+from app import db
+
+
+def add_missing_columns():
+    """Adds to the existing tables the columns declared in our models but not
+    found in the database.
+
+    Returns
+    -------
+    added : list
+        Contains a ``table.column`` string for each added column.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = [c['name']
+                            for c in inspector.get_columns(table.name)]
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            statement = (f'ALTER TABLE {preparer.format_table(table)} '
+                         f'ADD COLUMN {preparer.format_column(column)} '
+                         f'{column_type}')
+            if column.server_default is not None:
+                statement += f' DEFAULT {column.server_default.arg}'
+            db.engine.execute(statement)
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def add_missing_indexes():
+    """Creates the indexes declared in our models but not found in the
+    database.
+
+    Returns
+    -------
+    added : list
+        Contains the name of each created index.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = [i['name'] for i in
+                            inspector.get_indexes(table.name)]
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+                added.append(index.name)
+    return added
+
+
+def convert_widget_positions():
+    """Converts the ``position`` column of the ``widget_order`` table from
+    the string it used to be to an integer.
+
+    SQLite can't change the type of a column so the table is rebuilt. The
+    existing positions are kept.
+
+    Returns
+    -------
+    bool
+        True when the column had to be converted.
+    """
+    inspector = inspect(db.engine)
+    if 'widget_order' not in inspector.get_table_names():
+        return False
+    columns = {c['name']: c['type'] for c in
+               inspector.get_columns('widget_order')}
+    if isinstance(columns['position'], Integer):
+        return False
+    table = db.metadata.tables['widget_order']
+    with db.engine.begin() as connection:
+        if db.engine.dialect.name == 'sqlite':
+            connection.execute('ALTER TABLE widget_order '
+                               'RENAME TO widget_order_old')
+            table.create(connection)
+            connection.execute('INSERT INTO widget_order (id, name, position) '
+                               'SELECT id, name, CAST(position AS INTEGER) '
+                               'FROM widget_order_old')
+            connection.execute('DROP TABLE widget_order_old')
+        else:
+            connection.execute('ALTER TABLE widget_order ALTER COLUMN '
+                               'position TYPE INTEGER '
+                               'USING CAST(position AS INTEGER)')
+    return True
+
+
+def remove_duplicate_post_categories():
+    """Deletes the rows of the ``post_category`` table associating a post
+    with a category it is already associated with.
+
+    Needed before the unique index on the pair can be created. The oldest row
+    of each pair is kept.
+
+    Returns
+    -------
+    int
+        Number of deleted rows.
+    """
+    from app.models import PostCategory
+    kept = (db.session.query(func.min(PostCategory.id))
+            .group_by(PostCategory.post_id, PostCategory.category_id))
+    deleted = (PostCategory.query.filter(~PostCategory.id.in_(kept))
+               .delete(synchronize_session=False))
+    db.session.commit()
+    return deleted
+
+
+def upgrade_schema():
+    """Applies all the schema changes the database is missing.
+
+    Counters added to an existing database are computed right away and the
+    duplicated associations between posts and categories are removed before
+    they get their unique index.
+    """
+    added = add_missing_columns()
+    if 'category.published_post_count' in added:
+        from app.models import update_published_post_counts
+        update_published_post_counts()
+        db.session.commit()
+    convert_widget_positions()
+    inspector = inspect(db.engine)
+    if 'post_category' in inspector.get_table_names():
+        existing_indexes = [i['name'] for i in
+                            inspector.get_indexes('post_category')]
+        if 'uq_post_category_post_id_category_id' not in existing_indexes:
+            remove_duplicate_post_categories()
+    add_missing_indexes()
@@ -10,10 +10,15 @@ from flask import request, url_for
 from app import db, create_app
 from unittest import TestCase
 import unittest
+import tempfile
 from config import Config
 from app.tests.utils import dummy_user, login
 
 
+# Removed, along with the sessions written by the tests, when they exit.
+session_dir = tempfile.TemporaryDirectory()
+
+
 class TestConfig(Config):
     """ Custom configuration for our tests.
 
@@ -33,10 +38,14 @@ class TestConfig(Config):
         Make SQLAlchemy to use an in-memory SQLite database during the tests,
         so this way we are not writing dummy test data to our production
         database.
+    SESSION_FILE_DIR : str
+        Write the sessions of the test client to a temporary directory,
+        removed once the tests are over, rather than to the root folder.
     """
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SESSION_FILE_DIR = session_dir.name
 
 
 class Registration(TestCase):
@@ -6,9 +6,12 @@ nose2 -v app.tests.categories.tests_template_helpers
 """
 from app import db, create_app
 import unittest
+from flask_sqlalchemy import get_debug_queries
 from unittest import TestCase
 from config import Config
 from app.tests.utils import dummy_post
+from app.models import Post, get_version, update_published_post_counts
+from app.categories.utils import disassociate_categories
 from app.categories.template_helpers import categories_w_post_count
 
 
@@ -61,6 +64,57 @@ class AppTemplateGlobal(TestCase):
                          "Total number of posts posted under our dummy "
                          "category is not what is expected")
 
+    def test_categories_w_post_count_uncategorized(self):
+        """Drafts must not be counted and posts without category must be
+        counted under ``uncategorized``.
+        """
+        dummy_post(categories=["birds"], slug="post_1")
+        dummy_post(categories=["birds"], slug="post_2", is_published=False)
+        dummy_post(slug="post_3")
+        dic = categories_w_post_count()
+        self.assertEqual(dic, {'birds': ('birds', 1),
+                               'uncategorized': ('uncategorized', 1)},
+                         "Counts returned are not what is expected.")
+
+    def test_categories_w_post_count_cache(self):
+        """Counts must be computed once and computed again after a post was
+        written.
+        """
+        post = dummy_post(categories=["birds"], slug="post_1")
+        categories_w_post_count()
+        version = get_version('posts')
+        post.html_content
+        self.assertEqual(get_version('posts'), version,
+                         "Storing the rendering of a post invalidated the "
+                         "counts.")
+        with self.app.test_request_context('/'):
+            before = len(get_debug_queries())
+            categories_w_post_count()
+            self.assertEqual(len(get_debug_queries()) - before, 1,
+                             "Counts were computed again while no post "
+                             "changed.")
+        post.is_published = False
+        update_published_post_counts()
+        db.session.commit()
+        self.assertEqual(categories_w_post_count(), {},
+                         "Counts were not invalidated when a post was "
+                         "unpublished.")
+        post.is_published = True
+        update_published_post_counts()
+        db.session.commit()
+        dummy_post(categories=["birds"], slug="post_2")
+        self.assertEqual(categories_w_post_count()['birds'][1], 2,
+                         "Counts were not invalidated when a post was "
+                         "published.")
+        p = Post.query.filter_by(slug="post_1")
+        disassociate_categories(p)
+        p.delete()
+        update_published_post_counts()
+        db.session.commit()
+        self.assertEqual(categories_w_post_count()['birds'][1], 1,
+                         "Counts were not invalidated when a post was "
+                         "deleted.")
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -8,9 +8,14 @@ from app import db, create_app
 import unittest
 from unittest import TestCase
 from config import Config
+from flask_sqlalchemy import get_debug_queries
 from app.content_widgets.template_helpers import (content_widget_exists,
-                                                  get_content_widget)
-from app.tests.utils import dummy_content_widget
+                                                  get_content_widget,
+                                                  sidebar_content_widgets,
+                                                  sidebar_html)
+from app.models import ContentWidget
+from app.tests.utils import (dummy_content_widget,
+                             set_widgets_positions_in_sidebar)
 
 
 class TestConfig(Config):
@@ -66,6 +71,60 @@ class TemplateHelpers(TestCase):
         self.assertEqual(self.dcw, gcw, "Function did not return the content "
                                         "widget object we were looking for")
 
+    def test_sidebar_content_widgets(self):
+        """All the widgets of the sidebar must be fetched with one query.
+        """
+        dummy_content_widget(title='Second Widget', content='**second**',
+                             slug='second_widget')
+        dummy_content_widget(title='Draft Widget', slug='draft_widget',
+                             is_published=False)
+        set_widgets_positions_in_sidebar({'Dummy Content Widget': 1,
+                                          'Second Widget': 2,
+                                          'Draft Widget': 3})
+        for cw in ContentWidget.query.all():
+            cw.html_content
+        # Loads the settings snapshot holding the order of the widgets.
+        sidebar_content_widgets()
+        with self.app.test_request_context('/'):
+            before = len(get_debug_queries())
+            widgets = sidebar_content_widgets()
+            queries = len(get_debug_queries()) - before
+        self.assertEqual(list(widgets), ['Dummy Content Widget',
+                                         'Second Widget'],
+                         "Published widgets of the sidebar were not all "
+                         "returned.")
+        self.assertIn('<strong>second</strong>', widgets['Second Widget'],
+                      "Html of the widget was not returned.")
+        self.assertEqual(queries, 2, "Widgets were not fetched in a single "
+                                     "query.")
+
+    def test_sidebar_html(self):
+        """Sidebar html must be kept until a widget or the order change.
+        """
+        set_widgets_positions_in_sidebar({'Dummy Content Widget': 1})
+        with self.app.test_request_context('/'):
+            html = sidebar_html()
+        self.assertIn('Dummy Content', html, "Widget is not in the sidebar.")
+        with self.app.test_request_context('/'):
+            before = len(get_debug_queries())
+            sidebar_html()
+            self.assertEqual(len(get_debug_queries()) - before, 1,
+                             "Sidebar was rendered again while nothing "
+                             "changed.")
+        self.dcw.content = 'Edited Content'
+        db.session.commit()
+        with self.app.test_request_context('/'):
+            html = sidebar_html()
+        self.assertIn('Edited Content', html,
+                      "Sidebar was not rendered again after a widget was "
+                      "edited.")
+        set_widgets_positions_in_sidebar({'Search Bar Widget': 2})
+        with self.app.test_request_context('/'):
+            html = sidebar_html()
+        self.assertIn('name="q"', html,
+                      "Sidebar was not rendered again after a widget was "
+                      "added.")
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
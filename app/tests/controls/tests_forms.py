@@ -67,7 +67,7 @@ class Forms(TestCase):
 
     def test_position_choices(self):
         choices = position_choices()
-        expected = [('1', '1'), ('2', '2')]
+        expected = [(1, '1'), (2, '2')]
         self.assertEqual(expected, choices,
                          "Function did not return the right tuples of "
                          "(value, label) pairs.")
@@ -81,7 +81,7 @@ class BeforeFirstRequest(TestCase):
                          "The value indicating where categories should be "
                          "displayed on the page was not found in the db.")
         query = WidgetOrder.query.filter_by(name="Category Widget").first()
-        self.assertEqual(query.position, "1",
+        self.assertEqual(query.position, 1,
                          "Default position in the sidebar was not assigned to "
                          "our widget.")
         db.drop_all()
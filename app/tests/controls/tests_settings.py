@@ -0,0 +1,107 @@
+"""Contains tests for the settings snapshot found in ``controls/settings.py``
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.controls.tests_settings
+"""
+from app import db, create_app
+import unittest
+from unittest import TestCase
+from flask_sqlalchemy import get_debug_queries
+from config import Config
+from app.tests.utils import (control_search_bar, control_categories,
+                             add_three_dummy_widget_positions)
+from app.models import SearchBarControls, bump_version, get_version
+from app.controls.settings import site_settings
+
+
+class TestConfig(Config):
+    """ Custom configuration for our tests.
+
+    Attributes
+    ----------
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    """
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class SettingsSnapshot(TestCase):
+    """Contains tests for the ``site_settings`` function.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        control_categories("no_posts")
+        control_search_bar('navbar')
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_snapshot_loaded_once(self):
+        """Snapshot must not be read from the db again while its version is
+        unchanged.
+        """
+        site_settings()
+        with self.app.test_request_context('/'):
+            before = len(get_debug_queries())
+            settings = site_settings()
+            self.assertEqual(len(get_debug_queries()) - before, 1,
+                             "Settings were read again from the db.")
+        self.assertEqual(settings.search_bar_placement, 'navbar',
+                         "Snapshot does not contain the search bar "
+                         "placement.")
+        self.assertEqual(settings.categories_presence, 'no_posts',
+                         "Snapshot does not contain the categories "
+                         "presence.")
+
+    def test_write_invalidates_snapshot(self):
+        """Writing any of the settings models must bump the version and make
+        the snapshot reload.
+        """
+        version = site_settings().version
+        SearchBarControls.query.first().placement = 'sidebar'
+        db.session.commit()
+        self.assertGreater(get_version('settings'), version,
+                           "Version was not bumped by the write.")
+        self.assertEqual(site_settings().search_bar_placement, 'sidebar',
+                         "Snapshot was not reloaded after a write.")
+        add_three_dummy_widget_positions()
+        self.assertEqual(site_settings().widgets,
+                         ('Search Bar Widget', 'Category Widget',
+                          'Dummy Content Widget'),
+                         "Snapshot was not reloaded after a widget was "
+                         "placed in the sidebar.")
+
+    def test_change_from_other_process(self):
+        """Change committed by another worker process, without using our
+        session, must be seen once it bumped the version.
+        """
+        site_settings()
+        with db.engine.begin() as connection:
+            connection.execute(SearchBarControls.__table__.update()
+                               .values(placement='no_search'))
+            bump_version('settings', connection)
+        self.assertEqual(site_settings().search_bar_placement, 'no_search',
+                         "Change made by another process was not seen.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -4,16 +4,23 @@ To run this particular test file use the following command line:
 
 nose2 -v app.tests.main.tests_routes
 """
-from flask import request, url_for
+from flask import request, session, url_for
 from app import db, create_app
 from unittest import TestCase
 import unittest
+import gzip
+import tempfile
 from config import Config
 from app.tests.utils import dummy_post, posting
-from app.models import Post
+from app.models import Post, Category
+from flask_sqlalchemy import get_debug_queries
 from datetime import datetime
 
 
+# Removed, along with the sessions written by the tests, when they exit.
+session_dir = tempfile.TemporaryDirectory()
+
+
 class TestConfig(Config):
     """Custom configuration for our tests.
 
@@ -43,6 +50,9 @@ class TestConfig(Config):
     POSTS_PER_PAGE : int
         Set the maximum number of post per page. A small number will suffice
         for our tests.
+    SESSION_FILE_DIR : str
+        Write the sessions of the test client to a temporary directory,
+        removed once the tests are over, rather than to the root folder.
     """
     TESTING = True
     LOGIN_DISABLED = True
@@ -50,6 +60,7 @@ class TestConfig(Config):
     WHOOSHEE_MEMORY_STORAGE = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     POSTS_PER_PAGE = 2
+    SESSION_FILE_DIR = session_dir.name
 
 
 class Pagination(TestCase):
@@ -94,6 +105,53 @@ class Pagination(TestCase):
                       "Can't find the last dummy post on the second page of "
                       "the /index.")
 
+    def test_offset_pages(self):
+        """Links must start from the page actually shown, and posts sharing
+        a timestamp must be ordered by id.
+        """
+        for i in range(1, 4):
+            dummy_post(title=f'Dummy post{i}', slug=f'dummy_post{i}')
+        timestamp = Post.query.filter_by(slug='dummy_post3').first().timestamp
+        Post.query.update({Post.timestamp: timestamp},
+                          synchronize_session=False)
+        db.session.commit()
+        for route in ['/index?page=0', '/index?page=-3']:
+            html = self.tester.get(route).get_data(as_text=True)
+            self.assertIn('page=2', html,
+                          f"{route} does not link to the second page.")
+            self.assertNotIn('page=1', html,
+                             f"{route} links to the page shown.")
+        html = self.tester.get('/index?page=1').get_data(as_text=True)
+        self.assertTrue(html.index('Dummy post3') < html.index('Dummy post2'),
+                        "Posts sharing a timestamp were not ordered by id.")
+        html = self.tester.get('/index?page=2').get_data(as_text=True)
+        self.assertIn('Dummy post1', html,
+                      "Oldest post is not on the second page.")
+
+    def test_categories_loaded_in_one_query(self):
+        """Number of queries needed by the /index page must not grow with
+        the number of posts listed.
+        """
+        def queries_for_index(posts_per_page):
+            self.app.config['POSTS_PER_PAGE'] = posts_per_page
+            self.tester.get('/')
+            before = len(get_debug_queries())
+            response = self.tester.get('/')
+            return len(get_debug_queries()) - before, response
+
+        dummy_post(title='Dummy post1', slug="dummy_post1",
+                   categories=['tiger', 'bird'])
+        dummy_post(title='Dummy post2', slug="dummy_post2",
+                   categories=['dog'])
+        dummy_post(title='Dummy post3', slug="dummy_post3")
+        one_post, response = queries_for_index(1)
+        two_posts, response = queries_for_index(2)
+        self.assertEqual(one_post, two_posts,
+                         "Categories were queried once per post.")
+        for name in [b'tiger', b'bird', b'dog']:
+            self.assertIn(name, response.data,
+                          "A category of the posts was not displayed.")
+
     def test_pagination_for_drafts(self):
         """Will test pagination for our /drafts route.
         """
@@ -242,6 +300,25 @@ class Posting(TestCase):
                       "Content of the edited post can't be found"
                       " on the /drafts page.")
 
+    def test_category_counters(self):
+        """Published post counters of the categories must follow the
+        creation, editing and deletion of posts.
+        """
+        def counts():
+            return {c.name: c.published_post_count
+                    for c in Category.query.all()}
+        posting(self.tester, '/create_post', categories_field_0='tiger')
+        self.assertEqual(counts(), {'tiger': 2, 'bird': 1, 'dog': 1},
+                         "Counters were not updated when a post was "
+                         "created.")
+        posting(self.tester, '/dummy_post/edit_post', title_field='dummy post',
+                categories_field_0='bird', publish='')
+        self.assertEqual(counts(), {'tiger': 1, 'bird': 0},
+                         "Counters were not updated when a post was edited.")
+        self.tester.post('/test_title/delete_post')
+        self.assertEqual(counts(), {'bird': 0},
+                         "Counters were not updated when a post was deleted.")
+
     def test_prepopulate_edit_posts(self):
         """Testing that the input fields of the /<slug>/edit_post route are
         pre-populated.
@@ -334,6 +411,22 @@ class PreviewPosts(TestCase):
             self.assertTrue(match,
                             "A category does not appear in the preview.")
 
+    def test_preview_payload(self):
+        """The session must only hold plain values for the preview, and the
+        categories must be shown without being saved.
+        """
+        with self.app.test_client() as tester:
+            response = posting(tester, '/dummy_post/edit_post',
+                               categories_field_0='lion', preview='Preview')
+            data = session['preview']
+            self.assertIsInstance(data, dict, "Preview is not a plain dict.")
+            self.assertEqual(data['categories'], ['lion'],
+                             "Categories are missing from the preview data.")
+            self.assertIn(b'lion.', response.data,
+                          "Category does not appear in the preview.")
+            self.assertIsNone(Category.query.filter_by(name='lion').first(),
+                              "Category of the preview was saved.")
+
 
 class DeletePosts(TestCase):
     """Contains test to verify that we are capable to delete posts.
@@ -427,6 +520,169 @@ class Sitemap(TestCase):
         self.assertIn(b'dummy_post', response.data,
                       "Test post can't be found in the sitemap.")
 
+    def test_content_not_loaded(self):
+        """The body of the posts must not be read to build the sitemap.
+        """
+        with self.app.app_context():
+            response = self.tester.get('/sitemap.xml')
+            self.assertTrue(response.is_streamed, "Sitemap was not streamed.")
+            self.assertNotIn(b'dummy_draft', response.data,
+                             "Draft was found in the sitemap.")
+            statements = [q.statement for q in get_debug_queries()]
+        self.assertFalse(any('post.content' in s for s in statements),
+                         "Content of the posts was loaded.")
+
+
+class Feeds(TestCase):
+    """Contains tests for the Atom feeds.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.tester = self.app.test_client()
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            dummy_post(title='Bird post', slug='bird_post',
+                       content='**Birds**', categories=['birds'])
+            dummy_post(title='Dog post', slug='dog_post', categories=['dogs'])
+            dummy_post(title='Dummy Draft Post', slug='dummy_draft',
+                       is_published=False, categories=['birds'])
+            dummy_post(title='Dummy page', slug='dummy_page', is_page=True)
+
+    def test_feed(self):
+        """The feed of the blog must list the published posts, with their
+        html escaped.
+        """
+        response = self.tester.get('/feed')
+        data = response.get_data(as_text=True)
+        self.assertEqual(response.content_type, 'application/atom+xml',
+                         "Feed was not sent as Atom.")
+        self.assertIn('http://localhost/bird_post', data,
+                      "Post is missing from the feed.")
+        self.assertIn('&lt;strong&gt;Birds&lt;/strong&gt;', data,
+                      "Html of the post was not escaped in the feed.")
+        self.assertNotIn('dummy_draft', data, "Draft was found in the feed.")
+        self.assertNotIn('dummy_page', data, "Page was found in the feed.")
+
+    def test_category_feed(self):
+        """The feed of a category must only list its posts.
+        """
+        data = self.tester.get('/birds/category/feed').get_data(as_text=True)
+        self.assertIn('bird_post', data, "Post is missing from the feed.")
+        self.assertNotIn('dog_post', data,
+                         "Post of another category was found in the feed.")
+        self.assertEqual(self.tester.get('/cats/category/feed').status_code,
+                         404, "Feed of a missing category was found.")
+
+    def test_feed_id(self):
+        """The id of a feed must not change with the query string.
+        """
+        for route in ['/feed', '/birds/category/feed']:
+            data = self.tester.get(route + '?utm_source=x').get_data(
+                as_text=True)
+            self.assertIn(f'<id>http://localhost{route}</id>', data,
+                          f"Id of {route} depends on the query string.")
+
+    def test_content_not_loaded(self):
+        """The Markdown of the posts must not be read when their html is
+        stored.
+        """
+        with self.app.app_context():
+            # The first request stores the html of the dummy posts.
+            self.tester.get('/feed')
+            before = len(get_debug_queries())
+            self.tester.get('/feed')
+            statements = [q.statement for q in get_debug_queries()[before:]]
+        # The stored html comes with the ``post.content_hash`` column.
+        self.assertFalse(any('post.content AS' in s for s in statements),
+                         "Content of the posts was loaded.")
+
+
+class ReadMore(TestCase):
+    """Contains tests for the excerpts of the posts holding a [read_more]
+    tag.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.tester = self.app.test_client()
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            post = dummy_post(content='Excerpt.\n\n[read_more]\n\nThe rest.')
+            post.refresh_html()
+            db.session.commit()
+
+    def test_listing(self):
+        """Listings must show the excerpt and a link to the post, without
+        reading the bodies of the posts.
+        """
+        with self.app.app_context():
+            data = self.tester.get('/index').get_data(as_text=True)
+            # The COUNT of the pagination reads no column.
+            statements = [q.statement for q in get_debug_queries()
+                          if 'count(' not in q.statement]
+        self.assertIn('Excerpt.', data, "Excerpt is missing.")
+        self.assertIn('Read more...', data, "Link to the post is missing.")
+        self.assertNotIn('The rest.', data, "Whole post was shown.")
+        self.assertFalse(any('post.content AS' in s or
+                             'post.rendered_html AS' in s
+                             for s in statements),
+                         "Body of the post was loaded.")
+
+    def test_detail(self):
+        """The post must be shown in full, without the tag.
+        """
+        data = self.tester.get('/dummy_post').get_data(as_text=True)
+        self.assertIn('The rest.', data, "Post was not shown in full.")
+        self.assertNotIn('[read_more]', data, "Tag was shown.")
+
+
+class SitemapIndex(TestCase):
+    """Contains tests for the sitemap divided into chunks.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.config['SITEMAP_CHUNK_SIZE'] = 2
+        self.tester = self.app.test_client()
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            for i in range(1, 4):
+                dummy_post(title=f'Dummy post{i}', slug=f'dummy_post{i}')
+
+    def test_sitemap_index(self):
+        """The sitemap must point at its chunks once it holds more entries
+        than a chunk.
+        """
+        data = self.tester.get('/sitemap.xml').get_data(as_text=True)
+        self.assertIn('<sitemapindex', data, "Sitemap index was not sent.")
+        self.assertIn('/sitemap-2.xml<', data,
+                      "Second chunk is missing from the sitemap index.")
+        self.assertNotIn('/sitemap-3.xml', data,
+                         "Sitemap index points at an empty chunk.")
+        self.app.config['SITEMAP_GZIP'] = True
+        data = self.tester.get('/sitemap.xml').get_data(as_text=True)
+        self.assertIn('/sitemap-1.xml.gz<', data,
+                      "Sitemap index does not point at compressed chunks.")
+
+    def test_chunks(self):
+        """Each chunk must hold its own entries, compressed or not.
+        """
+        first = self.tester.get('/sitemap-1.xml').get_data(as_text=True)
+        second = self.tester.get('/sitemap-2.xml').get_data(as_text=True)
+        self.assertIn('dummy_post2', first, "Entry missing from the chunk.")
+        self.assertNotIn('dummy_post3', first,
+                         "Entry of the next chunk found in the chunk.")
+        self.assertIn('dummy_post3', second, "Entry missing from the chunk.")
+        response = self.tester.get('/sitemap-2.xml.gz')
+        self.assertEqual(response.content_type, 'application/gzip',
+                         "Compressed chunk was not sent as gzip.")
+        self.assertEqual(gzip.decompress(response.data).decode(), second,
+                         "Compressed chunk differs from the plain one.")
+        for route in ['/sitemap-3.xml', '/sitemap-0.xml']:
+            self.assertEqual(self.tester.get(route).status_code, 404,
+                             f"{route} did not return 404.")
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
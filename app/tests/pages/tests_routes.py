@@ -7,10 +7,15 @@ nose2 -v app.tests.pages.tests_routes
 from app import db, create_app
 import unittest
 from unittest import TestCase
+import tempfile
 from config import Config
 from app.tests.utils import dummy_post, posting
 
 
+# Removed, along with the sessions written by the tests, when they exit.
+session_dir = tempfile.TemporaryDirectory()
+
+
 class TestConfig(Config):
     """ Custom configuration for our tests.
 
@@ -37,12 +42,16 @@ class TestConfig(Config):
         When set to False all CSRF protection are disabled. We have to
         disable that because no CSRF token are generated when executing a POST
         request directly in our test.
+    SESSION_FILE_DIR : str
+        Write the sessions of the test client to a temporary directory,
+        removed once the tests are over, rather than to the root folder.
     """
     TESTING = True
     LOGIN_DISABLED = True
     WHOOSHEE_MEMORY_STORAGE = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     WTF_CSRF_ENABLED = False
+    SESSION_FILE_DIR = session_dir.name
 
 
 class Routes(TestCase):
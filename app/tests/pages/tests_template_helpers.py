@@ -62,7 +62,8 @@ class TemplateHelpers(TestCase):
 
     def test_published_pages(self):
         pp = published_pages()
-        self.assertIn(self.post, pp["published_pages"],
+        self.assertIn((self.post.slug, self.post.title),
+                      [tuple(p) for p in pp["published_pages"]],
                       "Function did not return the dictionary we were "
                       "looking for.")
 
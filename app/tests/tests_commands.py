@@ -0,0 +1,195 @@
+"""Testing of the commands added to the ``flask`` command line interface.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_commands
+"""
+
+from app import db, create_app
+from unittest import TestCase
+import unittest
+import os
+import tempfile
+from sqlalchemy import inspect
+from app.models import Category, ContentWidget, Post
+from app.rerender import (pending_count, render_rows, rerender_all,
+                          stale_count, write_batch)
+from app.tests.utils import dummy_content_widget, dummy_post
+from config import Config
+
+
+class TestConfig(Config):
+    """ Custom configuration for our tests.
+
+    Attributes
+    ----------
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+
+
+class Commands(TestCase):
+    """Contains the tests for the commands found in ``app/commands.py``.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        self.runner = self.app.test_cli_runner()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmp_dir.name, 'rerender.json')
+        self.app.config['RERENDER_CHECKPOINT_PATH'] = self.checkpoint
+
+    def tearDown(self):
+        self.app_context.pop()
+        self.tmp_dir.cleanup()
+
+    def test_repair_counters(self):
+        """Counters that drifted must be recomputed.
+        """
+        dummy_post(categories=['birds', 'dogs'], slug='post_1')
+        dummy_post(categories=['birds'], slug='post_2')
+        dummy_post(categories=['dogs'], slug='post_3', is_published=False)
+        Category.query.update({Category.published_post_count: 7})
+        db.session.commit()
+        result = self.runner.invoke(args=['repair-counters'])
+        self.assertEqual(result.exit_code, 0, "Command failed.")
+        counts = {c.name: c.published_post_count
+                  for c in Category.query.all()}
+        self.assertEqual(counts, {'birds': 2, 'dogs': 1},
+                         "Counters were not recomputed.")
+
+    def test_upgrade_schema(self):
+        """Indexes missing from an older database must be added.
+        """
+        db.engine.execute('DROP INDEX ix_post_listing')
+        result = self.runner.invoke(args=['upgrade-schema'])
+        self.assertEqual(result.exit_code, 0, "Command failed.")
+        indexes = [i['name'] for i in inspect(db.engine).get_indexes('post')]
+        self.assertIn('ix_post_listing', indexes, "Index was not added.")
+
+    def test_export_static(self):
+        """Published posts must be exported to the given directory.
+        """
+        dummy_post(slug='post_1')
+        with tempfile.TemporaryDirectory() as directory:
+            result = self.runner.invoke(args=['export-static', directory,
+                                              '--workers', '1'])
+            self.assertEqual(result.exit_code, 0, "Command failed.")
+            self.assertTrue(os.path.exists(os.path.join(directory,
+                                                        'post_1.html')),
+                            "Post was not exported.")
+
+    def test_rerender(self):
+        """Stale renderings of posts and widgets must be written again.
+        """
+        dummy_post(slug='post_1', content='Intro[read_more]Rest')
+        dummy_post(slug='post_2', content='**Bold**')
+        dummy_content_widget(content='*Widget*')
+        result = self.runner.invoke(args=['rerender', '--workers', '1',
+                                          '--batch-size', '1'])
+        self.assertEqual(result.exit_code, 0, "Command failed.")
+        self.assertIn('2 posts and pages, 1 content widgets', result.output,
+                      "Rendered entries were not counted.")
+        db.session.expire_all()
+        post = Post.query.filter_by(slug='post_1').first()
+        self.assertTrue(post.excerpt_html.startswith('<p>Intro'),
+                        "Excerpt was not stored.")
+        self.assertFalse(post.html_is_stale(), "Post is still stale.")
+        self.assertFalse(ContentWidget.query.first().html_is_stale(),
+                         "Widget is still stale.")
+        self.assertEqual(stale_count(), 0, "Stale entries are left.")
+        result = self.runner.invoke(args=['rerender', '--workers', '1'])
+        self.assertIn('0 posts and pages', result.output,
+                      "Up to date entries were rendered again.")
+
+    def test_rerender_resumed(self):
+        """An interrupted run must keep the batches already written.
+        """
+        for i in range(5):
+            dummy_post(slug=f'post_{i}')
+
+        def interrupt(count):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            rerender_all(batch_size=2, progress=interrupt)
+        self.assertEqual(stale_count(), 3,
+                         "First batch was not written before the "
+                         "interruption.")
+        counts = rerender_all(batch_size=2)
+        self.assertEqual(counts['post'], 3,
+                         "Resumed run did not render only the rest.")
+
+    def test_rerender_all_resumed(self):
+        """Rendering every entry must leave the stored html usable and resume
+        from the last entry written.
+        """
+        for i in range(5):
+            dummy_post(slug=f'post_{i}')
+        rerender_all()
+
+        def interrupt(count):
+            self.assertEqual(stale_count(), 0,
+                             "Entries were marked stale during the run.")
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            rerender_all(batch_size=2, force=True, progress=interrupt)
+        self.assertEqual(pending_count(force=True), 3,
+                         "Checkpoint does not follow the first batch.")
+        counts = rerender_all(batch_size=2, force=True)
+        self.assertEqual(counts['post'], 3,
+                         "Resumed run did not render only the rest.")
+        self.assertFalse(os.path.exists(self.checkpoint),
+                         "Checkpoint was kept after the run completed.")
+        counts = rerender_all(batch_size=2, force=True)
+        self.assertEqual(counts['post'], 5, "Forced run skipped some posts.")
+
+    def test_rerender_edited_meanwhile(self):
+        """A rendering must not be written over a content edited after it
+        was read.
+        """
+        post = dummy_post(slug='post_1', content='Old')
+        params = render_rows('post', [(post.id, 'Old')])
+        post.content = 'New'
+        post.refresh_html()
+        db.session.commit()
+        write_batch(Post, params)
+        db.session.expire_all()
+        post = Post.query.first()
+        self.assertIn('New', post.rendered_html,
+                      "Rendering of the old content was written.")
+        self.assertFalse(post.html_is_stale(), "Post became stale.")
+
+    def test_rerender_workers(self):
+        """Entries must be rendered the same way by a pool of processes.
+        """
+        dummy_post(slug='post_1', content='**Bold**')
+        counts = rerender_all(workers=2, batch_size=1)
+        self.assertEqual(counts['post'], 1, "Post was not rendered.")
+        db.session.expire_all()
+        self.assertIn('<strong>Bold</strong>',
+                      Post.query.first().rendered_html,
+                      "Post was not rendered by the workers.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
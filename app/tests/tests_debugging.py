@@ -10,10 +10,15 @@ nose2 -v app.tests.tests_debugging
 """
 
 from app import create_app
+import os
+import tempfile
 import unittest
 from unittest import TestCase
 from config import Config
 
+# Removed, along with the oEmbed cache of the tests, when they exit.
+cache_dir = tempfile.TemporaryDirectory()
+
 
 class TestConfig(Config):
     """ Custom configuration for our tests.
@@ -26,8 +31,12 @@ class TestConfig(Config):
         only used in production environment when DEBUG is set to false and
         could be inconvenient to use during the development phase, a time where
         debug is often set to TRUE.
+    OEMBED_CACHE_PATH : str
+        Outside of testing mode the oEmbed cache is a SQLite file, kept here
+        out of the root folder.
     """
     DEBUG = False
+    OEMBED_CACHE_PATH = os.path.join(cache_dir.name, 'oembed_cache.db')
 
 
 class Debugging(TestCase):
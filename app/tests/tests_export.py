@@ -0,0 +1,166 @@
+"""Testing of the export of the blog to static files.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_export
+"""
+from unittest import TestCase
+import unittest
+import os
+import tempfile
+from app import db, create_app
+from app.export import export_path, export_site
+from app.models import Post
+from app.tests.utils import dummy_post
+from config import Config
+
+
+class TestConfig(Config):
+    """Custom configuration for our tests.
+
+    Attributes
+    ----------
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    POSTS_PER_PAGE : int
+        Set the maximum number of post per page. A small number will suffice
+        for our tests.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+    POSTS_PER_PAGE = 2
+
+
+class Export(TestCase):
+    """Contains the tests for the functions of ``app/export.py``.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, 'export')
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        dummy_post(title='First', slug='first', categories=['birds'])
+        dummy_post(title='Second', slug='second', categories=['dogs'])
+        dummy_post(title='Third', slug='third')
+        dummy_post(title='About', slug='about', is_page=True)
+        dummy_post(title='Draft', slug='draft', is_published=False)
+
+    def tearDown(self):
+        self.app_context.pop()
+        self.tmp_dir.cleanup()
+
+    def read(self, path):
+        with open(os.path.join(self.directory, path)) as f:
+            return f.read()
+
+    def test_export_path(self):
+        """URLs must be mapped to the files nginx will serve.
+        """
+        paths = {'/': 'index.html',
+                 '/index': 'index.html',
+                 '/index?page=2': 'index/page/2.html',
+                 '/blog/first': 'first.html',
+                 '/blog/birds/category?page=3': 'birds/category/page/3.html',
+                 '/blog/sitemap.xml': 'sitemap.xml',
+                 '/blog/sitemap-2.xml.gz': 'sitemap-2.xml.gz'}
+        for url, path in paths.items():
+            self.assertEqual(export_path(url, '/blog'), path,
+                             f"{url} was not mapped to {path}.")
+
+    def test_full_export(self):
+        """Every public page must be written.
+        """
+        full, written = export_site(self.directory)
+        self.assertTrue(full, "Whole blog was not exported.")
+        for path in ['index.html', 'index/page/1.html', 'index/page/2.html',
+                     'first.html', 'about.html', 'sitemap.xml',
+                     'birds/category.html', 'uncategorized/category.html',
+                     'static/main.css']:
+            self.assertTrue(os.path.exists(os.path.join(self.directory, path)),
+                            f"{path} was not exported.")
+        self.assertNotIn('draft.html', written, "Draft was exported.")
+        self.assertIn('First', self.read('first.html'),
+                      "Post was not rendered.")
+
+    def test_incremental_export(self):
+        """Only the pages showing a modified post must be written again,
+        unless the sidebar changed.
+        """
+        export_site(self.directory)
+        post = Post.query.filter_by(slug='first').first()
+        post.content = 'Modified content'
+        post.refresh_html()
+        db.session.commit()
+        full, written = export_site(self.directory, slugs=['first'])
+        self.assertFalse(full, "Whole blog was exported again.")
+        self.assertIn('first.html', written, "Post was not exported.")
+        self.assertIn('birds/category.html', written,
+                      "Category of the post was not exported.")
+        self.assertNotIn('second.html', written,
+                         "Unrelated post was exported.")
+        self.assertIn('Modified content', self.read('first.html'),
+                      "Modified post was not rendered again.")
+        post.is_published = False
+        db.session.commit()
+        full, written = export_site(self.directory, slugs=['first'])
+        self.assertTrue(full, "Whole blog was not exported after the post "
+                              "was unpublished.")
+        self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                     'first.html')),
+                         "Unpublished post was not removed.")
+
+
+class WorkerProcesses(TestCase):
+    """Contains the test of the export made by a pool of processes.
+
+    The worker processes can't reach an in-memory database, so a SQLite file
+    is used.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, 'export')
+
+        class FileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = ('sqlite:///' +
+                                       os.path.join(self.tmp_dir.name,
+                                                    'blog.db'))
+        self.app = create_app(FileConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        self.app_context.pop()
+        self.tmp_dir.cleanup()
+
+    def test_worker_processes(self):
+        """Pages must be rendered the same way by a pool of processes.
+        """
+        dummy_post(title='First', slug='first')
+        full, written = export_site(self.directory, workers=2)
+        self.assertIn('first.html', written,
+                      "Post was not exported by the workers.")
+        with open(os.path.join(self.directory, 'first.html')) as f:
+            self.assertIn('First', f.read(),
+                          "Post was not rendered by the workers.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,110 @@
+"""Testing of the request-scoped memoization of our template helpers.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_memo
+"""
+
+from app import db, create_app
+from unittest import TestCase
+import unittest
+from flask import g
+from flask_sqlalchemy import get_debug_queries
+from app.controls.template_helpers import search_bar_placement
+from app.memo import request_memoized, clear_memo
+from app.tests.utils import control_search_bar
+from config import Config
+
+
+class TestConfig(Config):
+    """ Custom configuration for our tests.
+
+    Attributes
+    ----------
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+
+
+class Memo(TestCase):
+    """Contains the tests for the ``memo`` module.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_request_memoized(self):
+        """Testing of the ``request_memoized`` decorator.
+
+        Function must run once per request and set of arguments.
+        """
+        calls = []
+
+        @request_memoized
+        def double(number):
+            calls.append(number)
+            return number * 2
+
+        with self.app.test_request_context('/'):
+            self.assertEqual([double(1), double(1), double(2)], [2, 2, 4],
+                             "Memoized function returned wrong results.")
+            self.assertEqual(calls, [1, 2], "Result was not memoized.")
+            self.assertEqual(g.memo_hits, 1, "Saved call was not counted.")
+            clear_memo()
+            double(1)
+            self.assertEqual(calls, [1, 2, 1], "Memo was not cleared.")
+        double(1)
+        double(1)
+        self.assertEqual(calls, [1, 2, 1, 1, 1],
+                         "Result was memoized outside of a request.")
+
+    def test_template_helper_queries(self):
+        """Template helpers must query the db only once per request.
+
+        Once the settings snapshot is loaded the only query left is the check
+        of its version.
+        """
+        control_search_bar('navbar')
+        search_bar_placement()
+        with self.app.test_request_context('/'):
+            before = len(get_debug_queries())
+            for i in range(3):
+                self.assertEqual(search_bar_placement(), 'navbar',
+                                 "Wrong search bar placement returned.")
+            self.assertEqual(len(get_debug_queries()) - before, 1,
+                             "Helper queried the db more than once.")
+
+    def test_memo_reset_between_requests(self):
+        """Every request must start with an empty memo.
+        """
+        control_search_bar('navbar')
+        self.app.config['DEBUG'] = True
+        response = self.app.test_client().get('/')
+        self.assertGreater(int(response.headers['X-Queries-Saved']), 0,
+                           "No query was saved while rendering a page.")
+        self.assertNotIn('memo', g, "Memo has leaked out of the request.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -12,8 +12,12 @@ import unittest
 from app.models import (Post, User, Category, load_user, util_html_content,
                         reorder_widgets, add_to_or_remove_from_sidebar_util,
                         SearchBarControls, CategoriesControls, ContentWidget,
-                        WidgetOrder, Social)
+                        WidgetOrder, Social, content_hash,
+                        current_renderer_version)
 from config import Config
+from flask_sqlalchemy import get_debug_queries
+from sqlalchemy import inspect, select
+from sqlalchemy.orm.attributes import set_committed_value
 from app.tests.utils import (dummy_user, dummy_post,
                              set_widgets_positions_in_sidebar,
                              dict_of_widgets_positions_in_sidebar)
@@ -161,7 +165,7 @@ class Models(TestCase):
     def test_widget_order(self):
         """Testing of the ``WidgetOrder`` class model.
         """
-        wo = WidgetOrder(name='Category Widget', position='1')
+        wo = WidgetOrder(name='Category Widget', position=1)
         db.session.add(wo)
         db.session.commit()
         query = WidgetOrder.query.get(1)
@@ -189,6 +193,42 @@ class FunctionsOutsideModels(TestCase):
         loaded_user = load_user('1')
         self.assertEqual(user, loaded_user, "Adding new category failed.")
 
+    def test_cached_admin(self):
+        """The admin must be loaded without querying the database until its
+        password changes.
+        """
+        user = dummy_user()
+        load_user('1')
+        before = len(get_debug_queries())
+        loaded_user = load_user('1')
+        self.assertEqual(len(get_debug_queries()), before,
+                         "Cached admin was read from the database.")
+        self.assertTrue(loaded_user.check_password('pass'),
+                        "Cached admin has the wrong password.")
+        self.assertIsNone(load_user('2'), "Unknown user was loaded.")
+        user = User.query.first()
+        user.set_password('new')
+        db.session.commit()
+        self.assertTrue(load_user('1').check_password('new'),
+                        "Cached admin was kept after a password change.")
+
+    def test_read_more_split(self):
+        """The excerpt of a post must be stored along with its html, without
+        the tag, and discarded when its content changes.
+        """
+        post = dummy_post(content='Excerpt.[read_more] The rest.')
+        post.refresh_html()
+        db.session.commit()
+        self.assertEqual(post.excerpt_html, '<p>Excerpt.',
+                         "Excerpt was not stored.")
+        self.assertEqual(post.rendered_html, '<p>Excerpt. The rest.</p>',
+                         "Tag was kept in the html.")
+        post.content = 'No more tag.'
+        self.assertIsNone(post.excerpt_html,
+                          "Excerpt was kept after the content changed.")
+        self.assertEqual(post.listing_content('Link'), '<p>No more tag.</p>',
+                         "Listing shows an outdated html.")
+
     def test_util_html_content(self):
         """Testing of the ``util_html_content`` function.
 
@@ -217,14 +257,87 @@ class FunctionsOutsideModels(TestCase):
                       util_html_content(p),
                       "Url was not converted to an hyperlink by the function.")
 
+    def test_rendered_content(self):
+        """Testing of the ``RenderedContentMixin`` class.
+
+        Here we will be testing 3 things:
+        - That the html is rendered once and then served from the db.
+        - That changing the content discards the stored html.
+        - That entries without stored html are rendered on first access.
+        """
+        p = dummy_post(content="this written in **bold**.")
+        self.assertIsNone(p.rendered_html, "Html was unexpectedly rendered.")
+        self.assertIn('<strong>bold</strong>', p.html_content,
+                      "Html for the bold markdown has not been returned.")
+        query = Post.query.get(1)
+        self.assertIn('<strong>bold</strong>', query.rendered_html,
+                      "Html lazily rendered has not been saved to the db.")
+        self.assertEqual(query.content_hash,
+                         content_hash("this written in **bold**."),
+                         "Hash of the content has not been saved to the db.")
+        self.assertEqual(query.renderer_version, current_renderer_version(),
+                         "Version of the renderer has not been saved.")
+        query.content = "this written in *italic*."
+        self.assertTrue(query.html_is_stale(),
+                        "Html was not discarded after the content changed.")
+        query.refresh_html()
+        db.session.commit()
+        self.assertIn('<em>italic</em>', Post.query.get(1).html_content,
+                      "Html was not rendered again after an edit.")
+        query.content = "this written in *italic*."
+        self.assertFalse(query.html_is_stale(),
+                         "Html was discarded while the content is the same.")
+        cw = ContentWidget(title='dummy title', content='**widget**')
+        cw.refresh_html()
+        self.assertIn('<strong>widget</strong>', cw.rendered_html,
+                      "Html of the content widget has not been rendered.")
+
+    def test_stored_rendering(self):
+        """Html rendered on access must be written apart from the session,
+        and only if the content is still the one rendered.
+        """
+        post = dummy_post(content='Some **bold**')
+        table = Post.__table__
+        db.session.add(Category(name='pending'))
+        self.assertIn('<strong>bold</strong>', post.html_content,
+                      "Html has not been returned.")
+        self.assertEqual(len(db.session.new), 1,
+                         "Pending changes of the session were committed.")
+        self.assertNotIn('rendered_html', inspect(post).unloaded,
+                         "Post was expired.")
+        stored = db.engine.execute(select([table.c.rendered_html])).scalar()
+        self.assertIn('<strong>bold</strong>', stored,
+                      "Html has not been saved to the db.")
+        db.session.rollback()
+        self.assertEqual(Category.query.count(), 0,
+                         "Pending changes of the session were committed.")
+        db.engine.execute(table.update().values(content='Edited',
+                                                rendered_html=None))
+        # The post still holds the content read before the edit.
+        set_committed_value(post, 'rendered_html', None)
+        set_committed_value(post, 'content', 'Some **bold**')
+        self.assertIn('<strong>bold</strong>', post.html_content,
+                      "Html has not been returned.")
+        stored = db.engine.execute(select([table.c.rendered_html])).scalar()
+        self.assertIsNone(stored, "Html of an outdated content was saved.")
+        db.session.expire_all()
+        post = Post.query.first()
+        post.refresh_html()
+        db.session.commit()
+        db.engine.execute(table.update().values(content='Edited again'))
+        db.session.expire_all()
+        self.assertTrue(Post.query.first().html_is_stale(),
+                        "Html of another content was not stale.")
+
     def test_reorder_widgets(self):
         """Testing of the ``reorder_widgets`` function.
 
         This function assign a new position to the widgets in the
         ``WidgetOrder`` model.
         """
-        widgets_positions = {"widget1": "1", "widget2": "3", "widget3": "4"}
-        expected = {'widget1': '1', 'widget2': '2', 'widget3': '3'}
+        widgets_positions = {"widget1": 1, "widget2": 3, "widget3": 12,
+                             "widget4": 10}
+        expected = {'widget1': 1, 'widget2': 2, 'widget4': 3, 'widget3': 4}
         set_widgets_positions_in_sidebar(widgets_positions)
         reorder_widgets()
         dic_of_query = dict_of_widgets_positions_in_sidebar()
@@ -240,29 +353,29 @@ class FunctionsOutsideModels(TestCase):
         """
         # We will first test that a widget already positioned in the sidebar
         # is ignored by the function.
-        widgets_positions = {"widget1": "1",
-                             "widget2": "2",
-                             "Category Widget": "3"}
+        widgets_positions = {"widget1": 1,
+                             "widget2": 2,
+                             "Category Widget": 3}
         set_widgets_positions_in_sidebar(widgets_positions)
         add_to_or_remove_from_sidebar_util('sidebar_and_posts',
                                            'sidebar_and_posts',
                                            'Category Widget')
         dic_of_query = dict_of_widgets_positions_in_sidebar()
-        expected = {'widget1': '1', 'widget2': '2', "Category Widget": "3"}
+        expected = {'widget1': 1, 'widget2': 2, "Category Widget": 3}
         self.assertEqual(dic_of_query, expected,
                          "Initial widget order was unexpectedly modified.")
         db.drop_all()
         db.create_all()
         # We will then test that a widget newly inserted into the sidebar
         # is assigned the last position.
-        widgets_positions = {"widget1": "1",
-                             "widget2": "2"}
+        widgets_positions = {"widget1": 1,
+                             "widget2": 2}
         set_widgets_positions_in_sidebar(widgets_positions)
         add_to_or_remove_from_sidebar_util('sidebar_and_posts',
                                            'sidebar_and_posts',
                                            'Category Widget')
         dic_of_query = dict_of_widgets_positions_in_sidebar()
-        expected = {'widget1': '1', 'widget2': '2', 'Category Widget': '3'}
+        expected = {'widget1': 1, 'widget2': 2, 'Category Widget': 3}
         self.assertEqual(dic_of_query, expected,
                          "Widget position is not the right one. The position"
                          " is supposed to be third and last.")
@@ -270,15 +383,15 @@ class FunctionsOutsideModels(TestCase):
         db.create_all()
         # We will finally test that a widget that is not supposed to be placed
         # in the sidebar stay excluded.
-        widgets_positions = {"widget1": "1",
-                             "Category Widget": "2",
-                             "widget2": "3"}
+        widgets_positions = {"widget1": 1,
+                             "Category Widget": 2,
+                             "widget2": 3}
         set_widgets_positions_in_sidebar(widgets_positions)
         add_to_or_remove_from_sidebar_util('sidebar_and_posts',
                                            'no_categories',
                                            'Category Widget')
         dic_of_query = dict_of_widgets_positions_in_sidebar()
-        expected = {'widget1': '1', 'widget2': '2'}
+        expected = {'widget1': 1, 'widget2': 2}
         self.assertEqual(dic_of_query, expected,
                          "Widgets positions are not what is expected.")
 
@@ -0,0 +1,263 @@
+"""Testing of the caches used for the responses of the oEmbed providers.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_oembed
+"""
+
+from unittest import TestCase
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import json
+import os
+import tempfile
+import threading
+import time
+from micawber_bs4_classes import Provider
+from micawber_bs4_classes.exceptions import ProviderException
+from app import db, create_app
+from app.models import Post
+from app.oembed import (MemoryCache, SQLiteCache, CachingProviderRegistry,
+                        NEGATIVE_RESULT)
+from app.tests.utils import dummy_post
+from config import Config
+
+
+class TestConfig(Config):
+    """ Custom configuration for our tests.
+
+    Attributes
+    ----------
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    OEMBED_ASYNC : bool
+        Resolve the embeds in background threads.
+    OEMBED_TIMEOUT : float
+        Short delay so the test of an unresponsive provider runs quickly.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+    OEMBED_ASYNC = True
+    OEMBED_TIMEOUT = 0.5
+
+
+class StubOEmbedHandler(BaseHTTPRequestHandler):
+    """Answers like an oEmbed provider would. Requests for URLs containing
+    ``slow`` are answered after the timeout of our tests.
+    """
+    def do_GET(self):
+        if 'slow' in self.path:
+            time.sleep(1.5)
+        body = json.dumps({'type': 'video', 'title': 'Stub video',
+                           'provider_name': 'Stub',
+                           'html': '<iframe src="stub"></iframe>'})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeClock:
+    """Clock whose time only moves when we tell it to.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProvider:
+    """Provider counting the requests it receives instead of contacting a
+    remote server.
+
+    Parameters
+    ----------
+    fail : bool
+        If True every request raises a ``ProviderException``.
+    """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def request(self, url, **params):
+        self.calls += 1
+        if self.fail:
+            raise ProviderException('Provider is unreachable.')
+        return {'type': 'link', 'url': url, 'title': 'dummy title'}
+
+
+class Caches(TestCase):
+    """Contains the tests for the ``MemoryCache`` and ``SQLiteCache`` classes.
+    """
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'oembed.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_cache(self, cache):
+        """Runs the checks shared by both kind of caches.
+        """
+        cache.set('a', {'html': 'a'})
+        cache.set('b', {'html': 'b'}, ttl=5)
+        self.assertEqual(cache.get('a'), {'html': 'a'},
+                         "Value was not returned from the cache.")
+        self.clock.now += 10
+        self.assertIsNone(cache.get('b'), "Expired entry was returned.")
+        self.clock.now += 1
+        cache.set('c', {'html': 'c'})
+        self.clock.now += 1
+        cache.get('a')
+        self.clock.now += 1
+        cache.set('d', {'html': 'd'})
+        self.assertIsNone(cache.get('c'), "Least recently used entry was not "
+                                          "evicted.")
+        self.assertEqual(cache.get('a'), {'html': 'a'},
+                         "Recently used entry was evicted.")
+        self.assertEqual(cache.hits, 3, "Hits were not counted.")
+        self.assertEqual(cache.misses, 2, "Misses were not counted.")
+
+    def test_memory_cache(self):
+        """Testing of the ``MemoryCache`` class.
+        """
+        self.check_cache(MemoryCache(maxsize=2, ttl=60, clock=self.clock))
+
+    def test_sqlite_cache(self):
+        """Testing of the ``SQLiteCache`` class.
+
+        Entries must also be shared between instances using the same file.
+        """
+        self.check_cache(SQLiteCache(self.path, maxsize=2, ttl=60,
+                                     clock=self.clock))
+        other_worker = SQLiteCache(self.path, maxsize=2, ttl=60,
+                                   clock=self.clock)
+        self.assertEqual(other_worker.get('a'), {'html': 'a'},
+                         "Entry is not shared between processes.")
+
+
+class Registry(TestCase):
+    """Contains the tests for the ``CachingProviderRegistry`` class.
+    """
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = MemoryCache(ttl=60, clock=self.clock)
+        self.registry = CachingProviderRegistry(self.cache, negative_ttl=10)
+
+    def test_successful_lookup(self):
+        """Provider must be contacted only once for the same URL.
+        """
+        provider = FakeProvider()
+        self.registry.register(r'https://video\.test/\S+', provider)
+        for i in range(3):
+            response = self.registry.request('https://video.test/1')
+        self.assertEqual(response['title'], 'dummy title',
+                         "Response of the provider was not returned.")
+        self.assertEqual(provider.calls, 1, "Provider was contacted again.")
+        self.assertEqual(self.registry.stats()['hits'], 2,
+                         "Hits were not counted.")
+
+    def test_negative_caching(self):
+        """A failed lookup must be remembered until its delay expires.
+        """
+        provider = FakeProvider(fail=True)
+        self.registry.register(r'https://video\.test/\S+', provider)
+        for i in range(3):
+            with self.assertRaises(ProviderException):
+                self.registry.request('https://video.test/1')
+        self.assertEqual(provider.calls, 1,
+                         "Failing provider was contacted again.")
+        self.assertEqual(self.registry.cached('https://video.test/1'),
+                         NEGATIVE_RESULT, "Failure was not cached.")
+        self.assertEqual(self.registry.stats()['negative_hits'], 2,
+                         "Hits on failed lookups were not counted.")
+        self.clock.now += 11
+        provider.fail = False
+        self.registry.request('https://video.test/1')
+        self.assertEqual(provider.calls, 2,
+                         "Provider was not contacted after the failure "
+                         "expired.")
+
+
+class AsyncResolution(TestCase):
+    """Contains the tests for the resolution of the embeds in background
+    threads, using a local stub of an oEmbed provider.
+    """
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubOEmbedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        self.registry = self.app.extensions['oembed']
+        self.registry.register(
+            r'http://127\.0\.0\.1:\d+/video/\S+',
+            Provider(f'{self.base_url}/oembed', timeout=0.5))
+
+    def tearDown(self):
+        self.registry.executor.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+        self.app_context.pop()
+
+    def test_memory_cache_in_testing(self):
+        """The responses must be kept in memory in testing mode, although
+        ``OEMBED_CACHE_TYPE`` is "sqlite" by default.
+        """
+        self.assertIsInstance(self.registry.cache, MemoryCache,
+                              "Testing app does not cache in memory.")
+
+    def test_embed_resolved_in_background(self):
+        """Media URL must first be rendered as a plain link and then as an
+        embed once resolved.
+        """
+        url = f'{self.base_url}/video/1'
+        dummy_post(content=url)
+        html = Post.query.get(1).html_content
+        self.assertIn(f'<a href="{url}">', html,
+                      "URL was not rendered as a plain link.")
+        self.registry.join(timeout=5)
+        post = Post.query.get(1)
+        self.assertTrue(post.html_is_stale(),
+                        "Rendering containing the plain link was kept.")
+        self.assertIn('<iframe src="stub"></iframe>', post.html_content,
+                      "Embed was not rendered once resolved.")
+
+    def test_unresponsive_provider(self):
+        """An unresponsive provider must not stall the rendering and its
+        failure must be remembered.
+        """
+        url = f'{self.base_url}/video/slow'
+        dummy_post(content=url)
+        start = time.time()
+        Post.query.get(1).html_content
+        self.assertLess(time.time() - start, 0.5,
+                        "Rendering waited for the provider.")
+        self.registry.join(timeout=5)
+        self.assertEqual(self.registry.cached(url), NEGATIVE_RESULT,
+                         "Timeout of the provider was not cached.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
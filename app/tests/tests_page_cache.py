@@ -0,0 +1,371 @@
+"""Testing of the cache of the pages served to anonymous visitors.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_page_cache
+"""
+from unittest import TestCase
+import unittest
+import gzip
+import os
+import tempfile
+from flask import template_rendered
+from app import db, create_app
+from app.models import ContentWidget
+from app.oembed import MemoryCache
+from app.page_cache import (FilesystemPageCache, RedisPageCache,
+                            files_version)
+from app.tests.utils import dummy_post, dummy_user, login, posting
+from config import Config
+
+
+class TestConfig(Config):
+    """Custom configuration for our tests.
+
+    Attributes
+    ----------
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    LOGIN_DISABLED : bool
+        When set to True the /routes protected by Flask-login become
+        accessible without having to log into the app.
+    WTF_CSRF_ENABLED : bool
+        When set to False all CSRF protection are disabled. We have to
+        disable that because no CSRF token are generated when executing a POST
+        request directly in our test.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    """
+    TESTING = True
+    LOGIN_DISABLED = True
+    WTF_CSRF_ENABLED = False
+    WHOOSHEE_MEMORY_STORAGE = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class FakeRedis:
+    """Keeps the values in a dict instead of a Redis server.
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, k):
+        return self.data.get(k)
+
+    def set(self, k, v, ex=None):
+        self.data[k] = v.encode('utf-8')
+
+    def delete(self, k):
+        self.data.pop(k, None)
+
+
+class PageCache(TestCase):
+    """Contains the tests for the ``cached_page`` decorator and the
+    invalidation of the cached pages.
+
+    The cache is disabled in testing mode, so it is enabled here by setting
+    the backend ourselves.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.extensions['page_cache'] = MemoryCache()
+        self.tester = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def get(self, route):
+        """Returns the value of the ``X-Page-Cache`` header of the response
+        and its body.
+        """
+        response = self.tester.get(route)
+        return (response.headers.get('X-Page-Cache'),
+                response.get_data(as_text=True))
+
+    def test_new_templates(self):
+        """Pages cached before a deploy changing the templates must not be
+        served, nor validated, afterwards.
+        """
+        dummy_post(title='First', slug='first')
+        response = self.tester.get('/first')
+        self.assertEqual(self.get('/first')[0], 'HIT', "Page was not cached.")
+        self.app.extensions['page_cache_version'] = 'new templates'
+        self.assertEqual(self.get('/first')[0], 'MISS',
+                         "Page cached with the old templates was served.")
+        self.assertNotEqual(self.tester.get('/first').headers['ETag'],
+                            response.headers['ETag'],
+                            "ETag did not change with the templates.")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'base.html')
+            with open(path, 'w') as f:
+                f.write('Old')
+            version = files_version(directory)
+            os.utime(path, ns=(0, 0))
+            self.assertNotEqual(files_version(directory), version,
+                                "Modified template kept the version.")
+
+    def test_cache_hit(self):
+        """Second request of a page must be served from the cache.
+        """
+        dummy_post(title='First', slug='first', categories=['cat'])
+        for route in ['/index', '/first', '/cat/category']:
+            self.assertEqual(self.get(route)[0], 'MISS',
+                             f"{route} was served from an empty cache.")
+            self.assertEqual(self.get(route)[0], 'HIT',
+                             f"{route} was not served from the cache.")
+
+    def test_streamed_page_cached(self):
+        """The sitemap is streamed and must be stored once it was sent.
+        """
+        dummy_post(title='First', slug='first')
+        self.get('/sitemap.xml')
+        status, body = self.get('/sitemap.xml')
+        self.assertEqual(status, 'HIT', "Streamed page was not cached.")
+        self.assertIn('first', body, "Post is missing from the sitemap.")
+
+    def test_compressed_page_cached(self):
+        """Compressed chunks of the sitemap must be stored by the backends
+        saving the entries as JSON.
+        """
+        self.app.config['SITEMAP_CHUNK_SIZE'] = 1
+        dummy_post(title='First', slug='first')
+        dummy_post(title='Second', slug='second')
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.extensions['page_cache'] = FilesystemPageCache(directory)
+            # The body is stored once the client has read all of it.
+            first = self.tester.get('/sitemap-2.xml.gz').get_data()
+            second = self.tester.get('/sitemap-2.xml.gz')
+        self.assertEqual(second.headers.get('X-Page-Cache'), 'HIT',
+                         "Compressed page was not cached.")
+        self.assertEqual(second.get_data(), first,
+                         "Cached compressed page was altered.")
+        self.assertIn(b'second', gzip.decompress(second.get_data()),
+                      "Post is missing from the cached sitemap.")
+
+    def test_feed_invalidated(self):
+        """Publishing a post must invalidate the cached feeds.
+        """
+        dummy_user()
+        login(self.tester)
+        posting(self.tester, '/create_post', title_field='First',
+                categories_field_0='birds')
+        self.tester.post('/logout')
+        for route in ['/feed', '/birds/category/feed']:
+            self.get(route)
+            self.assertEqual(self.get(route)[0], 'HIT',
+                             f"{route} was not served from the cache.")
+        login(self.tester)
+        posting(self.tester, '/create_post', title_field='Second',
+                categories_field_0='birds')
+        self.tester.post('/logout')
+        for route in ['/feed', '/birds/category/feed']:
+            status, body = self.get(route)
+            self.assertEqual(status, 'MISS', f"Stale {route} was served.")
+            self.assertIn('Second', body, f"New post is missing from {route}.")
+
+    def test_missing_page_not_cached(self):
+        """A 404 must not be cached.
+        """
+        self.tester.get('/not_a_post')
+        self.assertNotEqual(self.get('/not_a_post')[0], 'HIT',
+                            "Missing page was cached.")
+
+    def test_invalidation_on_edit(self):
+        """Editing a post must invalidate the pages showing it and only them.
+        """
+        dummy_post(title='First', slug='first', categories=['cat'])
+        dummy_post(title='Second', slug='second')
+        for route in ['/index', '/first', '/second', '/cat/category']:
+            self.get(route)
+        posting(self.tester, '/first/edit_post', title_field='First',
+                content_field='Edited content', categories_field_0='cat')
+        status, body = self.get('/first')
+        self.assertEqual(status, 'MISS', "Edited post was not invalidated.")
+        self.assertIn('Edited content', body, "Outdated post was served.")
+        self.assertEqual(self.get('/index')[0], 'MISS',
+                         "Index was not invalidated.")
+        self.assertEqual(self.get('/cat/category')[0], 'MISS',
+                         "Category of the post was not invalidated.")
+        self.assertEqual(self.get('/second')[0], 'HIT',
+                         "Unrelated post was invalidated.")
+
+    def test_invalidation_of_sidebar(self):
+        """Changing the categories of a post must invalidate every page
+        showing the sidebar.
+        """
+        dummy_post(title='First', slug='first', categories=['cat'])
+        dummy_post(title='Second', slug='second')
+        self.get('/second')
+        posting(self.tester, '/first/edit_post', title_field='First',
+                categories_field_0='other')
+        status, body = self.get('/second')
+        self.assertEqual(status, 'MISS', "Sidebar was not invalidated.")
+        self.assertIn('other', body, "Outdated sidebar was served.")
+
+    def test_invalidation_of_layout(self):
+        """Editing a content widget must invalidate every page.
+        """
+        dummy_post(title='First', slug='first')
+        self.get('/first')
+        cw = ContentWidget(title='cw', content='x', slug='cw',
+                           is_published=True)
+        db.session.add(cw)
+        db.session.commit()
+        self.assertEqual(self.get('/first')[0], 'MISS',
+                         "Layout was not invalidated.")
+
+    def test_logged_in_user_bypasses_cache(self):
+        """Pages must neither be served from the cache nor stored in it for
+        the admin.
+        """
+        dummy_post(title='First', slug='first')
+        dummy_user()
+        login(self.tester)
+        self.assertIsNone(self.get('/first')[0],
+                          "Page of the admin went through the cache.")
+        self.tester.post('/logout')
+        self.assertEqual(self.get('/first')[0], 'MISS',
+                         "Page of the admin was cached.")
+
+
+class ConditionalGet(TestCase):
+    """Contains the tests for the ``ETag`` and ``Last-Modified`` validators
+    of the pages.
+
+    The page cache stays disabled, as in testing mode.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.tester = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        # Created by the route so the versions of its tags are set.
+        posting(self.tester, '/create_post', title_field='First')
+        self.rendered = []
+        template_rendered.connect(self.record, self.app)
+
+    def tearDown(self):
+        template_rendered.disconnect(self.record, self.app)
+        self.app_context.pop()
+
+    def record(self, sender, template, context, **extra):
+        self.rendered.append(template.name)
+
+    def test_validators(self):
+        """Pages of anonymous visitors must have validators.
+        """
+        for route in ['/index', '/first', '/sitemap.xml']:
+            response = self.tester.get(route)
+            self.assertIsNotNone(response.headers.get('ETag'),
+                                 f"{route} has no ETag.")
+            self.assertIsNotNone(response.headers.get('Last-Modified'),
+                                 f"{route} has no Last-Modified header.")
+
+    def test_not_modified(self):
+        """Matching validators must be answered with a 304, without rendering
+        any template once the page is in the cache.
+        """
+        response = self.tester.get('/first')
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+        response = self.tester.get('/first',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304,
+                         "Matching ETag was not answered with a 304.")
+        response = self.tester.get('/first', headers={
+            'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304,
+                         "Unmodified page was not answered with a 304.")
+        self.app.extensions['page_cache'] = MemoryCache()
+        self.tester.get('/first')
+        self.rendered.clear()
+        response = self.tester.get('/first',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304,
+                         "Cached page was not answered with a 304.")
+        self.assertEqual(self.rendered, [], "Template was rendered.")
+
+    def test_missing_page_not_modified(self):
+        """Validators of an URL that doesn't exist must not get a 304.
+        """
+        dummy_post(title='Draft', slug='draft', is_published=False)
+        headers = {'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+        for route in ['/draft', '/missing']:
+            response = self.tester.get(route, headers=headers)
+            self.assertEqual(response.status_code, 404,
+                             f"{route} was answered with a 304.")
+
+    def test_modified(self):
+        """Editing a post must change the validators of its page.
+        """
+        etag = self.tester.get('/first').headers['ETag']
+        posting(self.tester, '/first/edit_post', title_field='First',
+                content_field='Edited content')
+        response = self.tester.get('/first', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200,
+                         "Outdated ETag was answered with a 304.")
+        self.assertIn('Edited content', response.get_data(as_text=True),
+                      "Outdated post was served.")
+
+    def test_logged_in_user_gets_no_validators(self):
+        """Pages of the admin must not have validators.
+        """
+        dummy_user()
+        login(self.tester)
+        response = self.tester.get('/first')
+        self.assertIsNone(response.headers.get('ETag'),
+                          "Page of the admin has an ETag.")
+
+
+class Backends(TestCase):
+    """Contains the tests for the ``FilesystemPageCache`` and
+    ``RedisPageCache`` classes.
+    """
+    def check_backend(self, cache, other_worker):
+        """Runs the checks shared by both backends.
+        """
+        self.assertIsNone(cache.get('a'), "Missing entry was returned.")
+        cache.set('a', {'body': 'a'})
+        self.assertEqual(other_worker.get('a'), {'body': 'a'},
+                         "Entry is not shared between processes.")
+        cache.delete('a')
+        self.assertIsNone(other_worker.get('a'), "Entry was not deleted.")
+
+    def test_filesystem_backend(self):
+        """Testing of the ``FilesystemPageCache`` class.
+        """
+        now = [1000]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FilesystemPageCache(directory, ttl=60,
+                                        clock=lambda: now[0])
+            self.check_backend(cache, FilesystemPageCache(
+                directory, clock=lambda: now[0]))
+            cache.set('b', {'body': 'b'})
+            now[0] += 61
+            self.assertIsNone(cache.get('b'), "Expired entry was returned.")
+
+    def test_redis_backend(self):
+        """Testing of the ``RedisPageCache`` class.
+        """
+        client = FakeRedis()
+        self.check_backend(RedisPageCache(client), RedisPageCache(client))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
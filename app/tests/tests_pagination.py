@@ -0,0 +1,140 @@
+"""Testing of the keyset pagination of the listings.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_pagination
+"""
+from unittest import TestCase
+import unittest
+import re
+from flask_sqlalchemy import get_debug_queries
+from app import db, create_app
+from app.models import Post
+from app.tests.utils import dummy_post
+from config import Config
+
+
+class TestConfig(Config):
+    """Custom configuration for our tests.
+
+    Attributes
+    ----------
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    LOGIN_DISABLED : bool
+        When set to True the /routes protected by Flask-login become
+        accessible without having to log into the app.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    POSTS_PER_PAGE : int
+        Set the maximum number of post per page. A small number will suffice
+        for our tests.
+    PAGINATION : str
+        Paginate the listings with cursors.
+    """
+    TESTING = True
+    LOGIN_DISABLED = True
+    WHOOSHEE_MEMORY_STORAGE = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    POSTS_PER_PAGE = 2
+    PAGINATION = 'keyset'
+
+
+class KeysetPagination(TestCase):
+    """Contains the tests for the listings paginated with cursors.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.tester = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        for i in range(1, 6):
+            dummy_post(title=f'Dummy post{i}', slug=f'dummy_post{i}',
+                       categories=['birds'])
+        # Posts 2 and 3 share a timestamp, their id decides of their order.
+        timestamp = Post.query.filter_by(slug='dummy_post3').first().timestamp
+        Post.query.filter_by(slug='dummy_post2') \
+            .update({Post.timestamp: timestamp}, synchronize_session=False)
+        db.session.commit()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def browse(self, route):
+        """Follows the links to the next pages of a listing, returning the
+        titles of the posts found on each page and the links followed.
+        """
+        pages, urls = [], []
+        while route:
+            html = self.tester.get(route).get_data(as_text=True)
+            pages.append(re.findall(r'Dummy post\d', html))
+            urls.append(route)
+            found = re.search(r'href="([^"]*after=[^"]*)"', html)
+            route = found.group(1).replace('&amp;', '&') if found else None
+        return pages, urls
+
+    def test_walk_through_listing(self):
+        """Every post must be listed once, from the newest to the oldest.
+        """
+        expected = [['Dummy post5', 'Dummy post4'],
+                    ['Dummy post3', 'Dummy post2'], ['Dummy post1']]
+        for route in ['/index', '/birds/category']:
+            pages, urls = self.browse(route)
+            self.assertEqual(pages, expected,
+                             f"Posts of {route} were not listed in order.")
+            self.assertIn('after=', urls[1],
+                          f"Links of {route} don't hold a cursor.")
+
+    def test_no_count_nor_offset(self):
+        """Pages read from a cursor must need neither COUNT nor OFFSET.
+        """
+        html = self.tester.get('/index').get_data(as_text=True)
+        route = re.search(r'href="([^"]*after=[^"]*)"', html).group(1)
+        before = len(get_debug_queries())
+        html = self.tester.get(route).get_data(as_text=True)
+        queries = get_debug_queries()[before:]
+        self.assertFalse(any('count(' in q.statement.lower() for q in queries),
+                         "COUNT query was sent.")
+        # SQLite always gets an OFFSET along with the LIMIT, zero if unused.
+        self.assertFalse(any(q.parameters[-1] for q in queries
+                             if 'OFFSET' in q.statement),
+                         "OFFSET was used.")
+        self.assertEqual(re.findall(r'Dummy post\d', html),
+                         ['Dummy post3', 'Dummy post2'],
+                         "Posts sharing a timestamp were not ordered by id.")
+
+    def test_previous_page(self):
+        """The previous page must list the posts shown before.
+        """
+        html = self.tester.get('/index').get_data(as_text=True)
+        route = re.search(r'href="([^"]*after=[^"]*)"', html).group(1)
+        html = self.tester.get(route).get_data(as_text=True)
+        route = re.search(r'href="([^"]*before=[^"]*)"', html).group(1)
+        html = self.tester.get(route).get_data(as_text=True)
+        self.assertEqual(re.findall(r'Dummy post\d', html)[:2],
+                         ['Dummy post5', 'Dummy post4'],
+                         "Previous page does not list the newer posts.")
+
+    def test_old_page_links(self):
+        """``?page=N`` links must keep working.
+        """
+        html = self.tester.get('/index?page=3').get_data(as_text=True)
+        self.assertIn('Dummy post1', html,
+                      "Can't find the last dummy post on the third page.")
+        self.assertIn('before=', html, "Link to the previous page is missing.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
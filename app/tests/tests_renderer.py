@@ -0,0 +1,193 @@
+"""Testing of the markdown converters kept by ``app/renderer.py``.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_renderer
+"""
+from unittest import TestCase
+import unittest
+import os
+import tempfile
+import threading
+from flask import Flask
+from markdown import Markdown
+from app import create_app
+from app.oembed import MemoryCache
+from app.renderer import (convert, make_highlight_cache, render,
+                          split_blocks, thread_markdown)
+from config import Config
+
+
+class Renderer(TestCase):
+    """Contains the tests for the ``convert`` function.
+    """
+    def test_instance_reused(self):
+        """Each thread must keep a single converter.
+        """
+        md = thread_markdown()
+        convert('Some *text*.')
+        self.assertIs(thread_markdown(), md, "Converter was built again.")
+        others = []
+        thread = threading.Thread(target=lambda: others.append(
+            thread_markdown()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], md,
+                         "Converter was shared between threads.")
+
+    def test_documents_isolated(self):
+        """Nothing from a document must leak into the next one.
+        """
+        html = convert('A note[^1].\n\n[^1]: The note.')
+        self.assertIn('The note.', html, "Footnote was not rendered.")
+        html = convert('No note here.')
+        self.assertNotIn('The note.', html,
+                         "Footnote of a previous document was rendered.")
+        self.assertEqual(convert('Some **bold**.'),
+                         '<p>Some <strong>bold</strong>.</p>',
+                         "Markdown was not converted.")
+
+
+class HighlightCache(TestCase):
+    """Contains the tests for the cache of the highlighted code blocks.
+    """
+    code = 'Some code:\n\n    :::python\n    def f(x):\n        return x\n'
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_block_cached(self):
+        """A code block must be highlighted only once.
+        """
+        cache = self.app.extensions['highlight_cache'] = MemoryCache()
+        html = convert(self.code)
+        self.assertEqual((cache.hits, len(cache)), (0, 1),
+                         "Code block was not stored in the cache.")
+        self.assertEqual(convert(self.code + '\nAn edited paragraph.'
+                                 )[:len(html)], html,
+                         "Cached code block was altered.")
+        self.assertEqual(cache.hits, 1, "Code block was highlighted again.")
+        convert(self.code.replace(':::python', ':::ruby'))
+        self.assertEqual(len(cache), 2,
+                         "Block in another language shared its entry.")
+
+    def test_fenced_block_cached(self):
+        """Fenced code blocks must be highlighted once too, into the html
+        Markdown gives without the cache.
+        """
+        code = 'Some code:\n\n```python\ndef f(x):\n    return x\n```\n'
+        expected = Markdown(extensions=['codehilite', 'extra'],
+                            extension_configs={'codehilite': {
+                                'linenums': False}}).convert(code)
+        cache = self.app.extensions['highlight_cache'] = MemoryCache()
+        self.assertEqual(convert(code), expected,
+                         "Fenced code block was not highlighted the same.")
+        self.assertEqual(convert(code), expected,
+                         "Cached fenced code block was altered.")
+        self.assertEqual((cache.hits, len(cache)), (1, 1),
+                         "Fenced code block was highlighted again.")
+
+    def test_persistent_cache(self):
+        """With the "sqlite" type the blocks must be kept across restarts.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            config = {'HIGHLIGHT_CACHE_TYPE': 'sqlite',
+                      'HIGHLIGHT_CACHE_PATH': os.path.join(directory, 'h.db'),
+                      'HIGHLIGHT_CACHE_MAXSIZE': 10}
+            self.app.extensions['highlight_cache'] = \
+                make_highlight_cache(config)
+            html = convert(self.code)
+            cache = self.app.extensions['highlight_cache'] = \
+                make_highlight_cache(config)
+            self.assertEqual(convert(self.code), html,
+                             "Cached code block was altered.")
+            self.assertEqual(cache.hits, 1,
+                             "Code block was not read from the file.")
+
+
+class TestConfig(Config):
+    """Custom configuration for our tests.
+
+    Attributes
+    ----------
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WHOOSHEE_MEMORY_STORAGE = True
+
+
+class BlockRendering(TestCase):
+    """Contains the tests for the rendering of the documents block by block.
+    """
+    documents = [
+        '# Title\n\nA paragraph\non two lines.\n\n- a\n- b\n\n- c\n',
+        '\n1. one\n2. two\n\n    indented\n\n> quote\n\n> more\n\n***\n',
+        'Code:\n\n```python\ndef f():\n\n    pass\n```\n\nAfter the code.',
+        '    :::python\n    x = 1\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n'
+        '* item\n\n    paragraph of the item\n\nhttp://example.com/page',
+    ]
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_same_html(self):
+        """Rendering block by block must give the html of a full render.
+        """
+        for text in self.documents:
+            self.assertGreater(len(split_blocks(text)), 1,
+                               f"{text!r} was not split.")
+            html = render(text)
+            self.app.extensions['block_cache'] = None
+            self.assertEqual(html, render(text),
+                             f"{text!r} rendered differently by blocks.")
+            self.app.extensions['block_cache'] = MemoryCache()
+
+    def test_linked_blocks(self):
+        """Documents whose blocks are linked must be rendered at once.
+        """
+        for text in ['A [link][1].\n\n[1]: http://example.com',
+                     'A note[^1].\n\n[^1]: The note.',
+                     'The HTML.\n\n*[HTML]: Hyper Text Markup Language',
+                     'Term\n\n:   Definition', '<div>\n\nText\n\n</div>',
+                     '```\nUnclosed fence\n\nText']:
+            self.assertIsNone(split_blocks(text),
+                              f"{text!r} was split into blocks.")
+
+    def test_changed_block_only(self):
+        """Only the edited block must be rendered again.
+        """
+        cache = self.app.extensions['block_cache']
+        text = self.documents[0]
+        render(text)
+        hits = cache.hits
+        render(text.replace('A paragraph', 'An edited paragraph'))
+        self.assertEqual(cache.hits - hits, len(split_blocks(text)) - 1,
+                         "Unchanged blocks were rendered again.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,150 @@
+"""Testing of the functions upgrading the schema of an existing database.
+
+To run this particular test file use the following command line:
+
+nose2 -v app.tests.tests_schema
+"""
+
+from app import db, create_app
+from unittest import TestCase
+import unittest
+from sqlalchemy import Integer, inspect
+from sqlalchemy.exc import IntegrityError
+from app.schema import (add_missing_columns, upgrade_schema,
+                        convert_widget_positions)
+from app.tests.utils import dummy_post
+from config import Config
+
+
+class TestConfig(Config):
+    """ Custom configuration for our tests.
+
+    Attributes
+    ----------
+    SQLALCHEMY_DATABASE_URI : str
+        Make SQLAlchemy to use an in-memory SQLite database during the tests,
+        so this way we are not writing dummy test data to our production
+        database.
+    TESTING : bool
+        Enable testing mode. Exceptions are propagated rather than handled by
+        the app’s error handlers.
+
+        Must be set to True to prevent the mail logger from sending email
+        warnings.
+    WHOOSHEE_MEMORY_STORAGE : bool
+        When set to True use the memory as storage. We need that during our
+        tests so the data that we write in the in-memory SQLite database do
+        not become indexed.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+    WHOOSHEE_MEMORY_STORAGE = True
+
+
+class Schema(TestCase):
+    """Contains the tests for the upgrade of an existing database.
+    """
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_add_missing_columns(self):
+        """Testing of the ``add_missing_columns`` function.
+
+        We recreate the ``content_widget`` table as it was before html
+        renderings were stored and make sure the missing columns are added
+        without losing the existing rows.
+        """
+        db.engine.execute('DROP TABLE content_widget')
+        db.engine.execute('CREATE TABLE content_widget ('
+                          'id INTEGER PRIMARY KEY, title VARCHAR(75), '
+                          'slug VARCHAR(75), content VARCHAR(5000), '
+                          'is_published BOOLEAN, timestamp DATETIME)')
+        db.engine.execute("INSERT INTO content_widget (title, content) "
+                          "VALUES ('old widget', '**old**')")
+        added = add_missing_columns()
+        self.assertIn('content_widget.rendered_html', added,
+                      "Missing column was not added to the table.")
+        columns = [c['name'] for c in
+                   inspect(db.engine).get_columns('content_widget')]
+        for name in ['rendered_html', 'content_hash', 'renderer_version']:
+            self.assertIn(name, columns, f"Column {name} is missing.")
+        self.assertEqual(add_missing_columns(), [],
+                         "Running the upgrade twice should change nothing.")
+        title = db.engine.execute('SELECT title FROM content_widget').scalar()
+        self.assertEqual(title, 'old widget', "Existing row was lost.")
+
+    def test_counters_backfilled(self):
+        """Post counters added to an existing ``category`` table must be
+        computed by ``upgrade_schema``.
+        """
+        dummy_post(categories=['birds'])
+        db.session.remove()
+        db.engine.execute('CREATE TABLE old_category AS '
+                          'SELECT id, name, slug FROM category')
+        db.engine.execute('DROP TABLE category')
+        db.engine.execute('ALTER TABLE old_category RENAME TO category')
+        upgrade_schema()
+        count = db.engine.execute('SELECT published_post_count '
+                                  'FROM category').scalar()
+        self.assertEqual(count, 1, "Counter was not computed.")
+
+    def test_convert_widget_positions(self):
+        """Positions stored as strings must be converted to integers and the
+        missing index created.
+        """
+        db.engine.execute('DROP TABLE widget_order')
+        db.engine.execute('CREATE TABLE widget_order ('
+                          'id INTEGER PRIMARY KEY, name VARCHAR(75), '
+                          'position VARCHAR(2))')
+        db.engine.execute("INSERT INTO widget_order (name, position) "
+                          "VALUES ('widget1', '10'), ('widget2', '9')")
+        upgrade_schema()
+        column = [c for c in inspect(db.engine).get_columns('widget_order')
+                  if c['name'] == 'position'][0]
+        self.assertIsInstance(column['type'], Integer,
+                              "Column was not converted to an integer.")
+        indexes = [i['name'] for i in
+                   inspect(db.engine).get_indexes('widget_order')]
+        self.assertIn('ix_widget_order_position', indexes,
+                      "Index of the positions was not created.")
+        names = db.engine.execute('SELECT name FROM widget_order '
+                                  'ORDER BY position').fetchall()
+        self.assertEqual([n for n, in names], ['widget2', 'widget1'],
+                         "Positions were not kept as numbers.")
+        self.assertFalse(convert_widget_positions(),
+                         "Converted column was converted again.")
+
+    def test_post_category_indexes(self):
+        """Duplicated associations must be removed before the unique index
+        of the ``post_category`` table is created.
+        """
+        db.engine.execute('DROP TABLE post_category')
+        db.engine.execute('CREATE TABLE post_category ('
+                          'id INTEGER PRIMARY KEY, post_id INTEGER, '
+                          'category_id INTEGER)')
+        db.engine.execute('INSERT INTO post_category (post_id, category_id) '
+                          'VALUES (1, 1), (1, 1), (1, 2), (2, 1)')
+        upgrade_schema()
+        indexes = [i['name'] for i in
+                   inspect(db.engine).get_indexes('post_category')]
+        for name in ['uq_post_category_post_id_category_id',
+                     'ix_post_category_category_id_post_id']:
+            self.assertIn(name, indexes, f"Index {name} was not created.")
+        pairs = db.engine.execute('SELECT post_id, category_id '
+                                  'FROM post_category ORDER BY id').fetchall()
+        self.assertEqual([tuple(p) for p in pairs], [(1, 1), (1, 2), (2, 1)],
+                         "Duplicated association was not removed.")
+        with self.assertRaises(IntegrityError):
+            db.engine.execute('INSERT INTO post_category (post_id, '
+                              'category_id) VALUES (1, 2)')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -3,7 +3,8 @@
 
 from app import db
 from app.models import (Post, User, ContentWidget, CategoriesControls, Social,
-                        SearchBarControls, WidgetOrder, Category)
+                        SearchBarControls, WidgetOrder, Category,
+                        update_published_post_counts)
 from app.categories.utils import set_categories
 
 
@@ -40,6 +41,8 @@ def dummy_post(title='Dummy post', content="Dummy Content", slug="dummy_post",
                 categories=c,
                 is_published=is_published)
     db.session.add(post)
+    db.session.flush()
+    update_published_post_counts(c)
     db.session.commit()
     return post
 
@@ -258,9 +261,9 @@ def dict_of_widgets_positions_in_sidebar():
 def add_three_dummy_widget_positions():
     """Will add 3 dummy widgets in the sidebar in a specific order.
     """
-    wo1 = WidgetOrder(name='Search Bar Widget', position='1')
-    wo2 = WidgetOrder(name='Dummy Content Widget', position='3')
-    wo3 = WidgetOrder(name='Category Widget', position='2')
+    wo1 = WidgetOrder(name='Search Bar Widget', position=1)
+    wo2 = WidgetOrder(name='Dummy Content Widget', position=3)
+    wo3 = WidgetOrder(name='Category Widget', position=2)
     db.session.add_all([wo1, wo2, wo3])
     db.session.commit()
 
@@ -0,0 +1,113 @@
+"""Measures the time spent converting a markdown document to html.
+
+Each document is converted three times: as ``util_html_content`` used to,
+building the extensions and a ``markdown.Markdown`` instance every time, with
+the instance kept by ``app.renderer``, and with the cache of the highlighted
+code blocks as well, as when a post is previewed again after an edit. The
+embeds are left out, they are the same in all cases.
+
+Then a long post, embeds included, is rendered again after one of its
+paragraphs is edited, at once and block by block.
+
+Run it from the root folder of the app:
+
+python benchmarks/markdown_render.py
+python benchmarks/markdown_render.py --documents 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from markdown import markdown  # noqa: E402
+from markdown.extensions.codehilite import CodeHiliteExtension  # noqa: E402
+from markdown.extensions.extra import ExtraExtension  # noqa: E402
+from app import create_app  # noqa: E402
+from app.oembed import MemoryCache  # noqa: E402
+from app.renderer import convert, render  # noqa: E402
+from config import Config  # noqa: E402
+
+DOCUMENTS = {
+    'short widget': ('Follow me on *Twitter*, or send an '
+                     '[email](mailto:a@b.c).'),
+    'post': ('## A title\n\nSome **bold** text, a [link](http://example.com)'
+             ' and a list:\n\n- one\n- two\n- three\n\n'
+             '| a | b |\n|---|---|\n| 1 | 2 |\n\nA footnote[^1].\n\n'
+             '[^1]: The note.\n') * 5,
+    'post with code': ('Some code:\n\n    :::python\n    def f(x):\n'
+                       '        return x * 2\n\nAnd some text.\n\n') * 5,
+    'post with fenced code': ('Some code:\n\n```python\ndef f(x):\n'
+                              '    return x * 2\n```\n\n'
+                              'And some text.\n\n') * 5,
+}
+
+# A long post without footnotes, which would force rendering it at once.
+LONG_POST = ('## A title\n\nSome **bold** text and a list:\n\n- one\n- two\n\n'
+             '| a | b |\n|---|---|\n| 1 | 2 |\n\n'
+             'Some code:\n\n    :::python\n    def f(x):\n'
+             '        return x * 2\n\nAnd http://example.com.\n\n') * 40
+
+
+def per_call(text):
+    """The conversion as done before ``app.renderer``.
+    """
+    return markdown(text, extensions=[CodeHiliteExtension(linenums=False),
+                                      ExtraExtension()])
+
+
+def measure(function, text, documents):
+    """Returns the microseconds spent on each document.
+    """
+    start = time.perf_counter()
+    for _ in range(documents):
+        function(text)
+    return (time.perf_counter() - start) / documents * 1e6
+
+
+def measure_edit(edits):
+    """Returns the microseconds spent rendering a long post after each edit,
+    without and with the cache of the blocks.
+    """
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        WHOOSHEE_MEMORY_STORAGE = True
+        OEMBED_CACHE_TYPE = 'memory'
+        TESTING = True
+
+    results = []
+    for maxsize in (0, 5000):
+        BenchmarkConfig.BLOCK_CACHE_MAXSIZE = maxsize
+        with create_app(BenchmarkConfig).app_context():
+            render(LONG_POST)
+            start = time.perf_counter()
+            for i in range(edits):
+                render(LONG_POST + f'\n\nEdit number {i}.')
+            results.append((time.perf_counter() - start) / edits * 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--documents', type=int, default=500)
+    args = parser.parse_args()
+    # The highlight cache is only used inside an app context.
+    app = Flask(__name__)
+    app.extensions['highlight_cache'] = MemoryCache()
+    for name, text in DOCUMENTS.items():
+        assert per_call(text) == convert(text), f'{name} renders differently'
+        before = measure(per_call, text, args.documents)
+        after = measure(convert, text, args.documents)
+        with app.app_context():
+            cached = measure(convert, text, args.documents)
+        print(f'{name:>21}: {before:8.0f} us before, {after:8.0f} us reused, '
+              f'{cached:8.0f} us with the highlight cache')
+    at_once, by_block = measure_edit(max(args.documents // 20, 1))
+    print(f'{"edited post":>21}: {at_once:8.0f} us at once, '
+          f'{by_block:8.0f} us block by block')
+
+
+if __name__ == '__main__':
+    main()
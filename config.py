@@ -9,117 +9,310 @@ load_dotenv(os.path.join(basedir, '.env'))
 
 
 class Config:
-"""
-FlaskyPress Configuration Settings
-----------------------------------
-
-This file contains all configuration variables for the FlaskyPress application.
-
-Core Settings:
-    SECRET_KEY (str)
-        A unique, secret value used to:
-        - Protect web forms from CSRF attacks.
-        - Cryptographically sign cookies for added security.
-
-    SQLALCHEMY_DATABASE_URI (str)
-        The database connection URL.
-        Defaults to SQLite but can be configured to use PostgreSQL, MySQL,
-        or any database supported by SQLAlchemy.
-
-    SQLALCHEMY_TRACK_MODIFICATIONS (bool)
-        Enables or disables SQLAlchemy's event notification system.
-        This feature consumes extra resources and is generally unnecessary,
-        so it should typically be set to False.
-
-Site and Content Settings:
-    SITE_NAME (str)
-        The name of your site:
-        - Displayed as branding in the navigation menu.
-        - Used by the mail logger to identify the app in error reports.
-
-    POSTS_PER_PAGE (int)
-        The maximum number of posts displayed per page on the /index, /drafts,
-        and /search pages.
-
-    STYLE_EMBED (bool)
-        When set to True, embeds are wrapped with Bootstrap 4 classes to make
-        them responsive.
-
-    COPYRIGHT (str)
-        The copyright information displayed in the site footer.
-
-    URL_PREFIX (str)
-        Required only when running FlaskyPress from a subdirectory of your domain.
-        Example:
-            Root domain: www.mywebsite.com
-            Subdirectory: www.mywebsite.com/subfolder/
-
-Session Settings:
-    SESSION_TYPE (str)
-        Specifies the session interface type used by Flask-Session.
-        Example: "filesystem", "redis", etc.
-
-Search Configuration (Whooshee):
-    WHOOSHEE_DIR (str)
-        Directory where the search index is stored.
-        Defaults to: app_root_folder/whooshee
-
-    WHOOSHEE_MIN_STRING_LEN (int)
-        Minimum number of characters required for a search query.
-        Default: 3
-
-    WHOOSHEE_WRITER_TIMEOUT (int)
-        Time (in seconds) Whooshee will try to acquire a write lock.
-        Default: 2
-
-    WHOOSHEE_MEMORY_STORAGE (bool)
-        Stores the search index in memory instead of writing it to a file.
-        Typically set to True only during testing.
-        Default: False
-
-    WHOOSHEE_ENABLE_INDEXING (bool)
-        Enables or disables search indexing operations.
-        Default: True
-
-Email Configuration (Error Reporting):
-    These settings are only required if you want to receive email notifications
-    when the application encounters errors. If MAIL_SERVER is not set, the mail
-    logger will be disabled.
-
-    MAIL_SERVER (str)
-        The SMTP server address used to send error reports.
-        Example: smtp.googlemail.com
-
-    MAIL_PORT (int)
-        The SMTP port used by your email service provider.
-        Refer to your provider's documentation for the correct value.
-
-    MAIL_USE_TLS (bool)
-        Enables TLS encryption for outgoing emails to prevent eavesdropping.
-
-    MAIL_USERNAME (str)
-        The username for the email account that sends error reports.
-
-    MAIL_PASSWORD (str)
-        The password for the email account that sends error reports.
-
-    ADMINS (list)
-        A list of email addresses that should receive error notifications.
-        Include your own address to ensure you receive alerts.
-
-    FROM_ADDRESS (str)
-        The email address displayed as the sender of error reports.
-"""
+    """
+    FlaskyPress Configuration Settings
+    ----------------------------------
+
+    This file contains all configuration variables for the FlaskyPress application.
+
+    Core Settings:
+        SECRET_KEY (str)
+            A unique, secret value used to:
+            - Protect web forms from CSRF attacks.
+            - Cryptographically sign cookies for added security.
+
+        SQLALCHEMY_DATABASE_URI (str)
+            The database connection URL.
+            Defaults to SQLite but can be configured to use PostgreSQL, MySQL,
+            or any database supported by SQLAlchemy.
+
+        SQLALCHEMY_TRACK_MODIFICATIONS (bool)
+            Enables or disables SQLAlchemy's event notification system.
+            This feature consumes extra resources and is generally unnecessary,
+            so it should typically be set to False.
+
+    Site and Content Settings:
+        SITE_NAME (str)
+            The name of your site:
+            - Displayed as branding in the navigation menu.
+            - Used by the mail logger to identify the app in error reports.
+
+        POSTS_PER_PAGE (int)
+            The maximum number of posts displayed per page on the /index, /drafts,
+            and /search pages.
+
+        PAGINATION (str)
+            How the listings of posts are paginated:
+            - "offset": with ?page=N links. Every page needs a COUNT query
+              and an OFFSET growing with the page number.
+            - "keyset": with links holding the timestamp and id of the last
+              post shown. Deep pages are read as fast as the first one.
+              The search results, kept in order of relevance, still use
+              ?page=N. Not suited to the static export, which only maps
+              ?page=N to files.
+            ?page=N links keep working in both modes.
+            Default: "offset"
+
+        STYLE_EMBED (bool)
+            When set to True, embeds are wrapped with Bootstrap 4 classes to make
+            them responsive.
+
+        COPYRIGHT (str)
+            The copyright information displayed in the site footer.
+
+        URL_PREFIX (str)
+            Required only when running FlaskyPress from a subdirectory of your domain.
+            Example:
+                Root domain: www.mywebsite.com
+                Subdirectory: www.mywebsite.com/subfolder/
+
+    Sitemap:
+        SITEMAP_CHUNK_SIZE (int)
+            Maximum number of URLs per sitemap. Past it, /sitemap.xml becomes
+            a sitemap index pointing at /sitemap-1.xml, /sitemap-2.xml, etc.
+            Default: 50000 (the limit of the sitemaps protocol)
+
+        SITEMAP_GZIP (bool)
+            When set to True, the sitemap index points at the compressed
+            chunks, /sitemap-1.xml.gz, etc. Both forms are always served.
+            Default: False
+
+    Feeds:
+        FEED_SIZE (int)
+            Number of posts listed in the Atom feeds, /feed for the whole blog
+            and /<category>/category/feed for each category.
+            Default: 20
+
+    Session Settings:
+        SESSION_TYPE (str)
+            Specifies the session interface type used by Flask-Session.
+            Example: "filesystem", "redis", etc.
+
+        SESSION_FILE_THRESHOLD (int)
+            Maximum number of session files kept by the "filesystem" session
+            type. Past it, the oldest are removed. Same value as the default
+            of Flask-Session, only made explicit here: the session of the
+            admin is one of the files, so a lower value logs them out sooner
+            on a busy blog.
+            Default: 500
+
+        ADMIN_CACHE_TTL (int)
+            Number of seconds the admin is kept in the memory of each worker
+            process, so the requests of a logged in admin don't query the
+            database. A new password is seen at once by the process where it
+            was set, by the others after this delay.
+            Default: 60
+
+    Embeds Cache (oEmbed):
+        OEMBED_CACHE_TYPE (str)
+            Where the responses of the oEmbed providers are cached:
+            - "sqlite": in a SQLite file shared by all the worker processes.
+            - "memory": in the memory of each process.
+            The "memory" cache is always used in testing mode.
+            Default: "sqlite"
+
+        OEMBED_CACHE_PATH (str)
+            Location of the SQLite file used by the "sqlite" cache.
+            Defaults to: app_root_folder/oembed_cache.db
+
+        OEMBED_CACHE_MAXSIZE (int)
+            Number of responses kept before the least recently used are
+            evicted.
+            Default: 2000
+
+        OEMBED_CACHE_TTL (int)
+            Number of seconds a response stays in the cache.
+            Default: 604800 (one week)
+
+        OEMBED_NEGATIVE_TTL (int)
+            Number of seconds a failed lookup is remembered before the
+            provider is contacted again.
+            Default: 3600
+
+        OEMBED_TIMEOUT (float)
+            Number of seconds to wait for the answer of a provider.
+            Default: 3
+
+        OEMBED_ASYNC (bool)
+            When set to True, providers are never contacted while a page is
+            rendered. Media URLs missing from the cache are shown as plain
+            links until a background thread resolves their embed.
+            Default: False
+
+        OEMBED_WORKERS (int)
+            Number of background threads resolving embeds in asynchronous
+            mode. It is the maximum of providers contacted at the same time.
+            Default: 2
+
+        OEMBED_MAX_PENDING (int)
+            Maximum number of URLs waiting to be resolved in asynchronous
+            mode.
+            Default: 100
+
+    Rendering Caches:
+        HIGHLIGHT_CACHE_TYPE (str)
+            Where the html of the highlighted code blocks is cached, so that
+            a block already seen is not highlighted by Pygments again:
+            - "memory": in the memory of each process.
+            - "sqlite": in a SQLite file shared by all the worker processes
+              and kept across restarts.
+            - "none": the code blocks are always highlighted.
+            Default: "memory"
+
+        HIGHLIGHT_CACHE_PATH (str)
+            Location of the SQLite file used by the "sqlite" cache.
+            Defaults to: app_root_folder/highlight_cache.db
+
+        HIGHLIGHT_CACHE_MAXSIZE (int)
+            Number of code blocks kept before the least recently used are
+            evicted.
+            Default: 2000
+
+        BLOCK_CACHE_MAXSIZE (int)
+            Number of rendered blocks of the posts (paragraphs, lists, code
+            blocks, etc.) kept in the memory of each process, so that only
+            the blocks that changed are rendered again when an edited post
+            is previewed or saved. 0 renders the documents at once.
+            Default: 5000
+
+        RERENDER_CHECKPOINT_PATH (str)
+            File where ``flask rerender --all`` records the last entries it
+            wrote, so an interrupted run resumes from there. Removed once the
+            run completes.
+            Defaults to: app_root_folder/.rerender.json
+
+    Page Cache:
+        Pages are cached only for anonymous visitors and never in debug or
+        testing mode.
+
+        PAGE_CACHE_TYPE (str)
+            Where the rendered pages are cached:
+            - "memory": in the memory of each process.
+            - "filesystem": in files of PAGE_CACHE_DIR shared by all the
+              worker processes.
+            - "redis": in the Redis server at PAGE_CACHE_REDIS_URL. Requires
+              the redis package.
+            - "null": pages are not cached.
+            Default: "memory"
+
+        PAGE_CACHE_DIR (str)
+            Directory used by the "filesystem" cache.
+            Defaults to: app_root_folder/page_cache
+
+        PAGE_CACHE_REDIS_URL (str)
+            Address of the server used by the "redis" cache.
+            Default: redis://localhost:6379/0
+
+        PAGE_CACHE_MAXSIZE (int)
+            Number of pages kept by the "memory" cache before the least
+            recently used are evicted.
+            Default: 500
+
+        PAGE_CACHE_TTL (int)
+            Number of seconds a page stays in the cache, even if nothing it
+            shows has changed.
+            Default: 86400 (one day)
+
+        PAGE_CACHE_VERSION (str)
+            Part of the keys and the ETags of the pages, to be changed by
+            every deploy modifying the templates or the static files. When
+            empty, a hash of the modification times of these files is used.
+            Servers sharing a "redis" cache should set it, since their files
+            don't have the same modification times.
+            Default: None
+
+    Search Configuration (Whooshee):
+        WHOOSHEE_DIR (str)
+            Directory where the search index is stored.
+            Defaults to: app_root_folder/whooshee
+
+        WHOOSHEE_MIN_STRING_LEN (int)
+            Minimum number of characters required for a search query.
+            Default: 3
+
+        WHOOSHEE_WRITER_TIMEOUT (int)
+            Time (in seconds) Whooshee will try to acquire a write lock.
+            Default: 2
+
+        WHOOSHEE_MEMORY_STORAGE (bool)
+            Stores the search index in memory instead of writing it to a file.
+            Typically set to True only during testing.
+            Default: False
+
+        WHOOSHEE_ENABLE_INDEXING (bool)
+            Enables or disables search indexing operations.
+            Default: True
+
+    Email Configuration (Error Reporting):
+        These settings are only required if you want to receive email notifications
+        when the application encounters errors. If MAIL_SERVER is not set, the mail
+        logger will be disabled.
+
+        MAIL_SERVER (str)
+            The SMTP server address used to send error reports.
+            Example: smtp.googlemail.com
+
+        MAIL_PORT (int)
+            The SMTP port used by your email service provider.
+            Refer to your provider's documentation for the correct value.
+
+        MAIL_USE_TLS (bool)
+            Enables TLS encryption for outgoing emails to prevent
+            eavesdropping.
+
+        MAIL_USERNAME (str)
+            The username for the email account that sends error reports.
+
+        MAIL_PASSWORD (str)
+            The password for the email account that sends error reports.
+
+        ADMINS (list)
+            A list of email addresses that should receive error notifications.
+            Include your own address to ensure you receive alerts.
+
+        FROM_ADDRESS (str)
+            The email address displayed as the sender of error reports.
+    """
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL') or
                                'sqlite:///' + os.path.join(basedir, 'blog.db'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SITE_NAME = os.environ.get('SITE_NAME') or 'FlaskyPress'
     POSTS_PER_PAGE = 10
+    PAGINATION = os.environ.get('PAGINATION') or 'offset'
     STYLE_EMBED = True
     COPYRIGHT = os.environ.get('COPYRIGHT') or 'FlaskyPress, &copy; 2019'
     URL_PREFIX = os.environ.get('URL_PREFIX') or ''
+    SITEMAP_CHUNK_SIZE = 50000
+    SITEMAP_GZIP = False
+    FEED_SIZE = 20
     SESSION_TYPE = 'filesystem'
+    SESSION_FILE_THRESHOLD = 500
+    ADMIN_CACHE_TTL = 60
+    # config for the cache of the oEmbed providers responses
+    OEMBED_CACHE_TYPE = 'sqlite'
+    OEMBED_CACHE_PATH = os.path.join(basedir, 'oembed_cache.db')
+    OEMBED_CACHE_MAXSIZE = 2000
+    OEMBED_CACHE_TTL = 7 * 24 * 3600
+    OEMBED_NEGATIVE_TTL = 3600
+    OEMBED_TIMEOUT = 3
+    OEMBED_ASYNC = False
+    OEMBED_WORKERS = 2
+    OEMBED_MAX_PENDING = 100
+    # config for the cache of the highlighted code blocks
+    HIGHLIGHT_CACHE_TYPE = os.environ.get('HIGHLIGHT_CACHE_TYPE') or 'memory'
+    HIGHLIGHT_CACHE_PATH = os.path.join(basedir, 'highlight_cache.db')
+    HIGHLIGHT_CACHE_MAXSIZE = 2000
+    BLOCK_CACHE_MAXSIZE = 5000
+    RERENDER_CHECKPOINT_PATH = os.path.join(basedir, '.rerender.json')
+    # config for the cache of the pages served to anonymous visitors
+    PAGE_CACHE_TYPE = os.environ.get('PAGE_CACHE_TYPE') or 'memory'
+    PAGE_CACHE_DIR = os.path.join(basedir, 'page_cache')
+    PAGE_CACHE_REDIS_URL = (os.environ.get('PAGE_CACHE_REDIS_URL') or
+                            'redis://localhost:6379/0')
+    PAGE_CACHE_MAXSIZE = 500
+    PAGE_CACHE_TTL = 24 * 3600
+    PAGE_CACHE_VERSION = os.environ.get('PAGE_CACHE_VERSION')
     # config for whooshee search module
     WHOOSHEE_DIR = os.path.join(basedir, 'whooshee')
     WHOOSHEE_MIN_STRING_LEN = 3